@@ -0,0 +1,137 @@
+"""
+In-process latency metrics, exposed in the Prometheus text format on the metrics view.
+
+A player action is timed with `action_timer`, and the phases inside it with `span`. Spans may nest, each phase is
+recorded without the time of the spans nested in it, so the phases of an action add up to its total. `span` can be
+used anywhere, e.g. in model code, and records nothing when no action is being timed in the current context. Code
+run in another thread for the action, e.g. with `database_sync_to_async`, is timed after binding the timer with `bind`.
+"""
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Tuple
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+REGISTRY: List["Histogram"] = []
+
+
+class Histogram:
+
+    def __init__(self, name, documentation, label_names: Tuple[str, ...], buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._series: Dict[tuple, list] = {}  # label values -> [bucket counts..., sum, count]
+        REGISTRY.append(self)
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels.get(label_name, '')) for label_name in self.label_names)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * len(self.buckets) + [0.0, 0]
+            for index, upper_bound in enumerate(self.buckets):
+                if value <= upper_bound:
+                    series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def expose(self) -> List[str]:
+        lines = [
+            '# HELP {} {}'.format(self.name, self.documentation),
+            '# TYPE {} histogram'.format(self.name),
+        ]
+        with self._lock:
+            series_items = sorted((key, list(series)) for key, series in self._series.items())
+        for key, series in series_items:
+            labels = ','.join('{}="{}"'.format(name, _escape(value)) for name, value in zip(self.label_names, key))
+            for upper_bound, count in zip(self.buckets, series):
+                lines.append('{}_bucket{{{},le="{}"}} {}'.format(self.name, labels, upper_bound, count))
+            lines.append('{}_bucket{{{},le="+Inf"}} {}'.format(self.name, labels, series[-1]))
+            lines.append('{}_sum{{{}}} {}'.format(self.name, labels, series[-2]))
+            lines.append('{}_count{{{}}} {}'.format(self.name, labels, series[-1]))
+        return lines
+
+
+def _escape(label_value: str):
+    return label_value.replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def expose() -> str:
+    return '\n'.join(line for histogram in REGISTRY for line in histogram.expose()) + '\n'
+
+
+ACTION_PHASE_SECONDS = Histogram(
+    'elva_action_phase_seconds',
+    'Seconds spent in each phase of a player action, excluding nested phases',
+    label_names=('action', 'phase'),
+)
+ACTION_SECONDS = Histogram('elva_action_seconds', 'Seconds to handle a player action', label_names=('action',))
+
+
+class ActionTimer:
+
+    def __init__(self, action, match_id):
+        self.action = action
+        self.match_id = match_id
+        self.phases: Dict[str, float] = {}
+        self._nested_seconds = [0.0]  # Time of the finished spans nested in each open span
+
+    def add(self, phase, seconds):
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+
+_timer: ContextVar = ContextVar('action_timer', default=None)
+
+
+@contextmanager
+def bind(timer: ActionTimer):
+    token = _timer.set(timer)
+    try:
+        yield timer
+    finally:
+        _timer.reset(token)
+
+
+@contextmanager
+def span(phase):
+    timer: ActionTimer = _timer.get()
+    if timer is None:
+        yield
+        return
+    timer._nested_seconds.append(0.0)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        timer.add(phase, seconds - timer._nested_seconds.pop())
+        timer._nested_seconds[-1] += seconds
+
+
+@contextmanager
+def action_timer(action, match_id):
+    """Times an action in the current context, records its phases and logs it if slower than ELVA_SLOW_ACTION_SECONDS"""
+    timer = ActionTimer(action=action, match_id=match_id)
+    start = time.perf_counter()
+    try:
+        with bind(timer):
+            yield timer
+    finally:
+        seconds = time.perf_counter() - start
+        timer.add('other', seconds - timer._nested_seconds[0])
+        for phase, phase_seconds in timer.phases.items():
+            ACTION_PHASE_SECONDS.observe(phase_seconds, action=action, phase=phase)
+        ACTION_SECONDS.observe(seconds, action=action)
+        if seconds >= settings.ELVA_SLOW_ACTION_SECONDS:
+            logger.warning('Slow action %s in match %s took %.3fs: %s', action, match_id, seconds, ', '.join(
+                '{}={:.3f}s'.format(phase, phase_seconds) for phase, phase_seconds in sorted(timer.phases.items())))
@@ -0,0 +1,43 @@
+import time
+
+from elva import metrics
+
+
+def test_histogram_expose():
+    histogram = metrics.Histogram('test_seconds', 'Test', label_names=('phase',), buckets=(0.1, 1.0))
+    metrics.REGISTRY.remove(histogram)
+    histogram.observe(0.05, phase='a')
+    histogram.observe(0.5, phase='a')
+    histogram.observe(5, phase='b"')
+    assert histogram.expose() == [
+        '# HELP test_seconds Test',
+        '# TYPE test_seconds histogram',
+        'test_seconds_bucket{phase="a",le="0.1"} 1',
+        'test_seconds_bucket{phase="a",le="1.0"} 2',
+        'test_seconds_bucket{phase="a",le="+Inf"} 2',
+        'test_seconds_sum{phase="a"} 0.55',
+        'test_seconds_count{phase="a"} 2',
+        'test_seconds_bucket{phase="b\\"",le="0.1"} 0',
+        'test_seconds_bucket{phase="b\\"",le="1.0"} 0',
+        'test_seconds_bucket{phase="b\\"",le="+Inf"} 1',
+        'test_seconds_sum{phase="b\\""} 5.0',
+        'test_seconds_count{phase="b\\""} 1',
+    ]
+
+
+def test_nested_spans_are_excluded(settings, caplog):
+    settings.ELVA_SLOW_ACTION_SECONDS = 0.02
+    with metrics.action_timer(action='play card', match_id='m') as timer:
+        with metrics.span('outer'):
+            time.sleep(0.01)
+            with metrics.span('inner'):
+                time.sleep(0.02)
+    assert sorted(timer.phases) == ['inner', 'other', 'outer']
+    assert 0.01 <= timer.phases['outer'] < 0.02 <= timer.phases['inner']
+    assert 'Slow action play card in match m' in caplog.text
+    assert 'elva_action_phase_seconds_count{action="play card",phase="inner"}' in metrics.expose()
+
+
+def test_span_without_action():
+    with metrics.span('outer'):
+        pass
@@ -1,13 +1,27 @@
 from channels.auth import AuthMiddlewareStack
-from channels.routing import ProtocolTypeRouter, URLRouter
+from channels.routing import ProtocolTypeRouter, URLRouter, ChannelNameRouter
+from django.conf.urls import url
 
 import ws.routing
+from ws.bot_worker import BotWorker
+from ws.lobby import LOBBY_CHANNEL_NAME, LobbyWorker
+from ws.match_actor import MatchActorWorker
+from ws.pasur_actions import BOT_CHANNEL_NAME, MATCH_ACTOR_CHANNEL_NAME
+from ws.spectators import SPECTATOR_CHANNEL_NAME, SpectatorRelay
 
 application = ProtocolTypeRouter({
     # (http->django views is added by default)
-    'websocket': AuthMiddlewareStack(
-        URLRouter(
-            ws.routing.websocket_urlpatterns
-        )
-    ),
+    'websocket': URLRouter(ws.routing.spectator_urlpatterns + [
+        url(r'', AuthMiddlewareStack(
+            URLRouter(
+                ws.routing.websocket_urlpatterns
+            )
+        )),
+    ]),
+    'channel': ChannelNameRouter({
+        BOT_CHANNEL_NAME: BotWorker,
+        MATCH_ACTOR_CHANNEL_NAME: MatchActorWorker,
+        LOBBY_CHANNEL_NAME: LobbyWorker,
+        SPECTATOR_CHANNEL_NAME: SpectatorRelay,
+    }),
 })
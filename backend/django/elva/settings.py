@@ -140,3 +140,44 @@ CHANNEL_LAYERS = {
         },
     },
 }
+
+# Cache shared by all processes, e.g. for the lobby snapshot
+CACHES = {
+    'default': {
+        'BACKEND': 'django_redis.cache.RedisCache',
+        'LOCATION': 'redis://{}:{}/1'.format(os.getenv('CACHE_HOST', os.getenv('CHANNEL_LAYERS_HOST', 'localhost')),
+                                             os.getenv('CACHE_PORT', os.getenv('CHANNEL_LAYERS_PORT', '6379'))),
+    },
+}
+
+# Pasur game state codec used for the database and channel layer messages, 'json' or 'binary'.
+# Both are always readable, so the codec can be switched without migrating existing games.
+PASUR_STATE_CODEC = os.getenv('PASUR_STATE_CODEC', 'json')
+
+# Number of logged game actions between full snapshots of the game state, a snapshot is also written at game end.
+GAME_SNAPSHOT_INTERVAL = int(os.getenv('GAME_SNAPSHOT_INTERVAL', '10'))
+
+# Wall-clock seconds a bot may think about each move
+ELVA_BOT_MOVE_BUDGET = float(os.getenv('ELVA_BOT_MOVE_BUDGET', '1.0'))
+# Bot moves searched at the same time by each bot worker process, the rest are queued
+ELVA_BOT_WORKER_CONCURRENCY = int(os.getenv('ELVA_BOT_WORKER_CONCURRENCY', '2'))
+
+# Player actions taking longer than this many seconds are logged with a breakdown of where the time went
+ELVA_SLOW_ACTION_SECONDS = float(os.getenv('ELVA_SLOW_ACTION_SECONDS', '0.5'))
+
+# Let one in-memory actor per match handle its actions and write the game behind, see ws/match_actor.py. Needs exactly
+# one `manage.py runworker pasur-match` process.
+ELVA_MATCH_ACTOR = os.getenv('ELVA_MATCH_ACTOR', '').lower() in ('1', 'true', 'yes')
+# Longest delay before a match actor writes the played actions to the database
+ELVA_MATCH_FLUSH_SECONDS = float(os.getenv('ELVA_MATCH_FLUSH_SECONDS', '1.0'))
+# Seconds without actions after which a match actor writes its game and stops
+ELVA_MATCH_ACTOR_IDLE_SECONDS = float(os.getenv('ELVA_MATCH_ACTOR_IDLE_SECONDS', '300'))
+
+# Seconds the lobby worker waits to collect match changes before rebuilding and broadcasting the lobby snapshot
+ELVA_LOBBY_DEBOUNCE_SECONDS = float(os.getenv('ELVA_LOBBY_DEBOUNCE_SECONDS', '0.5'))
+
+# Seconds spectators are kept behind the players
+ELVA_SPECTATOR_DELAY_SECONDS = float(os.getenv('ELVA_SPECTATOR_DELAY_SECONDS', '0'))
+
+# Seconds the public view of a match stays cached for new spectators after its latest change
+ELVA_SPECTATOR_SNAPSHOT_SECONDS = int(os.getenv('ELVA_SPECTATOR_SNAPSHOT_SECONDS', '86400'))
@@ -0,0 +1,293 @@
+"""
+Times the hot paths of the Pasur engine and compares the results with a saved baseline.
+
+    python -m game_engine.benchmark --save baseline.json
+    python -m game_engine.benchmark --compare baseline.json --threshold 0.1
+
+Every benchmark reports the fastest mean time per call over a few repeats. With `--compare` the run exits with status 1
+if any benchmark got slower than the baseline by more than the threshold. Baselines are only comparable on the same
+machine.
+"""
+import argparse
+import json
+import random
+import sys
+import time
+from typing import Callable, Dict
+
+from game_engine.lib.card_holders import Player
+from game_engine.lib.endgame import EndgameSolver
+from game_engine.lib.knowledge import KnowledgeTracker
+from game_engine.lib.pasur import Pasur, STATUS, legal_collect_masks
+from game_engine.lib.policies import RandomPolicy
+from game_engine.lib.simulation import play_game
+from ws.game_views import game_delta_texts, game_status_texts, visible_state
+
+MIN_REPEAT_SECONDS = 0.2
+REPEAT_COUNT = 5
+DEFAULT_THRESHOLD = 0.1
+SEED = 0
+
+
+def _new_game(player_count=2) -> Pasur:
+    pasur = Pasur.create_new_game(seed=SEED)
+    for index in range(player_count):
+        pasur.add_player(Player(player_id=str(index)))
+    return pasur
+
+
+def _midgame(player_count=4) -> Pasur:
+    """A game after the first deal and one card played by the first player"""
+    pasur = _new_game(player_count=player_count)
+    pasur.deal_cards()
+    player = pasur.player_in_turn
+    pasur.play_card(player, *RandomPolicy(seed=SEED).choose_move(pasur=pasur, player=player))
+    return pasur
+
+
+def _large_board() -> Pasur:
+    """A game with 12 numeral cards on the board, more than normal play leaves but the worst case for collecting"""
+    pasur = _new_game()
+    pasur.deal_cards()
+    for card in pasur.deck.list_all_cards():
+        if pasur.board.card_count == 12:
+            break
+        if card.number < 11:
+            pasur.give_card_from_deck(to_card_holder=pasur.board, card_id=card.id)
+    return pasur
+
+
+def _all_cards_played() -> Pasur:
+    """A game where every card is played, ready for counting points"""
+    pasur = _new_game()
+    policy = RandomPolicy(seed=SEED)
+    while pasur.status in [STATUS.pending, STATUS.ongoing]:
+        if pasur.no_player_has_cards_on_hand:
+            if pasur.deck.remaining_cards() == 0:
+                return pasur
+            pasur.deal_cards()
+        else:
+            player = pasur.player_in_turn
+            pasur.play_card(player, *policy.choose_move(pasur=pasur, player=player))
+    raise RuntimeError('Benchmark game was cancelled, pick another seed')
+
+
+def _last_round() -> Pasur:
+    """A game right after the last deal"""
+    pasur = _new_game()
+    policy = RandomPolicy(seed=SEED)
+    while pasur.deck.card_count > 0 or pasur.no_player_has_cards_on_hand:
+        if pasur.no_player_has_cards_on_hand:
+            pasur.deal_cards()
+        else:
+            player = pasur.player_in_turn
+            pasur.play_card(player, *policy.choose_move(pasur=pasur, player=player))
+    return pasur
+
+
+def _validate_moves(pasur: Pasur, cold_cache=False):
+    """Times validating every legal move of the player in turn"""
+    moves = pasur.legal_moves()
+
+    def run(count):
+        start = time.perf_counter()
+        for _ in range(count):
+            if cold_cache:
+                legal_collect_masks.cache_clear()
+            for card, collect_cards in moves:
+                pasur.validate_move(card=card, collect_cards=collect_cards)
+        return time.perf_counter() - start
+    return run
+
+
+def bench_dump_json(count):
+    pasur = _midgame()
+    start = time.perf_counter()
+    for _ in range(count):
+        pasur.dump_json()
+    return time.perf_counter() - start
+
+
+def bench_load_json(count):
+    data = _midgame().dump_json()
+    start = time.perf_counter()
+    for _ in range(count):
+        Pasur.load_json(data)
+    return time.perf_counter() - start
+
+
+def bench_json_round_trip(count):
+    data = _midgame().dump_json()
+    start = time.perf_counter()
+    for _ in range(count):
+        data = Pasur.load_json(data).dump_json()
+    return time.perf_counter() - start
+
+
+def bench_binary_round_trip(count):
+    data = _midgame().dump_binary()
+    start = time.perf_counter()
+    for _ in range(count):
+        data = Pasur.load_binary(data).dump_binary()
+    return time.perf_counter() - start
+
+
+def bench_validate_move_small_board(count):
+    return _validate_moves(_midgame())(count)
+
+
+def bench_validate_move_large_board(count):
+    return _validate_moves(_large_board())(count)
+
+
+def bench_validate_move_large_board_cold(count):
+    return _validate_moves(_large_board(), cold_cache=True)(count)
+
+
+def bench_player_in_turn(count):
+    pasur = _midgame()
+    start = time.perf_counter()
+    for _ in range(count):
+        pasur.player_in_turn
+    return time.perf_counter() - start
+
+
+def bench_count_points(count):
+    data = _all_cards_played().dump_binary()
+    games = [Pasur.load_binary(data) for _ in range(count)]
+    start = time.perf_counter()
+    for pasur in games:
+        pasur.count_points()
+    return time.perf_counter() - start
+
+
+def bench_game_status_texts(count):
+    pasur = _midgame()
+    start = time.perf_counter()
+    for _ in range(count):
+        game_status_texts(pasur=pasur, player_points={}, message='Player played a card')
+    return time.perf_counter() - start
+
+
+def bench_game_delta_texts(count):
+    pasur = _new_game(player_count=4)
+    pasur.deal_cards()
+    before = visible_state(pasur)
+    player = pasur.player_in_turn
+    pasur.play_card(player, *RandomPolicy(seed=SEED).choose_move(pasur=pasur, player=player))
+    start = time.perf_counter()
+    for _ in range(count):
+        game_delta_texts(before=before, pasur=pasur, player_points={}, message='Player played a card', game_id=1,
+                         version=2)
+    return time.perf_counter() - start
+
+
+def bench_endgame_solve(count):
+    pasur = _last_round()
+    solver = EndgameSolver()
+    start = time.perf_counter()
+    for _ in range(count):
+        solver.solve(pasur)
+    return time.perf_counter() - start
+
+
+def bench_knowledge_sample(count):
+    pasur = _midgame()
+    tracker = KnowledgeTracker(pasur)
+    observer = pasur.player_in_turn.identifier
+    rng = random.Random(SEED)
+    start = time.perf_counter()
+    for _ in range(count):
+        tracker.sample(observer, rng)
+    return time.perf_counter() - start
+
+
+def bench_random_game(count):
+    policies = [RandomPolicy(seed=SEED), RandomPolicy(seed=SEED + 1)]
+    games = [_new_game(player_count=len(policies)) for _ in range(count)]
+    start = time.perf_counter()
+    for pasur in games:
+        play_game(policies=policies, pasur=pasur)
+    return time.perf_counter() - start
+
+
+BENCHMARKS: Dict[str, Callable[[int], float]] = {
+    'dump_json': bench_dump_json,
+    'load_json': bench_load_json,
+    'json_round_trip': bench_json_round_trip,
+    'binary_round_trip': bench_binary_round_trip,
+    'validate_move_small_board': bench_validate_move_small_board,
+    'validate_move_large_board': bench_validate_move_large_board,
+    'validate_move_large_board_cold': bench_validate_move_large_board_cold,
+    'player_in_turn': bench_player_in_turn,
+    'count_points': bench_count_points,
+    'game_status_texts': bench_game_status_texts,
+    'game_delta_texts': bench_game_delta_texts,
+    'endgame_solve': bench_endgame_solve,
+    'knowledge_sample': bench_knowledge_sample,
+    'random_game': bench_random_game,
+}
+
+
+def measure(benchmark: Callable[[int], float], min_seconds=MIN_REPEAT_SECONDS, repeat=REPEAT_COUNT) -> float:
+    """Seconds per call, the best of `repeat` runs each lasting at least `min_seconds`"""
+    count = 1
+    while True:
+        elapsed = benchmark(count)
+        if elapsed >= min_seconds:
+            break
+        count = count * 10 if elapsed < min_seconds / 10 else count * 2
+    best = elapsed / count
+    for _ in range(repeat - 1):
+        best = min(best, benchmark(count) / count)
+    return best
+
+
+def run(names=None, min_seconds=MIN_REPEAT_SECONDS, repeat=REPEAT_COUNT) -> Dict[str, float]:
+    return {
+        name: measure(BENCHMARKS[name], min_seconds=min_seconds, repeat=repeat)
+        for name in (names or BENCHMARKS)
+    }
+
+
+def compare(results: Dict[str, float], baseline: Dict[str, float], threshold=DEFAULT_THRESHOLD) -> Dict[str, float]:
+    """Relative change against the baseline of the benchmarks that got slower by more than `threshold`"""
+    changes = {name: seconds / baseline[name] - 1 for name, seconds in results.items() if name in baseline}
+    return {name: change for name, change in changes.items() if change > threshold}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the Pasur engine')
+    parser.add_argument('--only', help='Comma separated benchmarks to run, among: {}'.format(', '.join(BENCHMARKS)))
+    parser.add_argument('--save', metavar='PATH', help='Save the results as a baseline')
+    parser.add_argument('--compare', metavar='PATH', help='Compare the results with a saved baseline')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='Relative slowdown counted as a regression, default %(default)s')
+    parser.add_argument('--repeat', type=int, default=REPEAT_COUNT)
+    args = parser.parse_args()
+
+    names = args.only.split(',') if args.only else list(BENCHMARKS)
+    if any(name not in BENCHMARKS for name in names):
+        parser.error('Benchmarks must be among: {}'.format(', '.join(BENCHMARKS)))
+    baseline = {}
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+    results = run(names=names, repeat=args.repeat)
+    for name, seconds in results.items():
+        change = ' {:+.1%}'.format(seconds / baseline[name] - 1) if name in baseline else ''
+        print('{name:<32} {us:>12.2f} us{change}'.format(name=name, us=seconds * 1e6, change=change))
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    regressions = compare(results, baseline, threshold=args.threshold)
+    if regressions:
+        print('Regressions over {:.0%}: {}'.format(args.threshold, ', '.join(sorted(regressions))))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,26 @@
+import pytest
+
+from game_engine.benchmark import BENCHMARKS, compare, measure
+
+
+@pytest.mark.parametrize('name', sorted(BENCHMARKS))
+def test_benchmark_runs(name):
+    assert BENCHMARKS[name](2) > 0
+
+
+def test_measure():
+    calls = []
+
+    def benchmark(count):
+        calls.append(count)
+        return count * 0.01
+
+    assert measure(benchmark, min_seconds=0.05, repeat=3) == pytest.approx(0.01)
+    assert calls == [1, 2, 4, 8, 8, 8]
+
+
+def test_compare():
+    baseline = {'fast': 1.0, 'slow': 1.0, 'removed': 1.0}
+    results = {'fast': 0.5, 'slow': 1.5, 'new': 2.0}
+    assert compare(results, baseline, threshold=0.1) == {'slow': pytest.approx(0.5)}
+    assert compare(results, baseline, threshold=0.6) == {}
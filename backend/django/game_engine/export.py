@@ -0,0 +1,195 @@
+"""
+Export of the finished games for offline analysis, in chunks of gzip NDJSON or NumPy `.npz` files, run with
+
+    python manage.py export_games /data/games --format npz --chunk-size 100000
+
+Games are streamed in (modified, id) order with a server-side cursor, as plain values instead of models, and decoded
+one at a time, so the memory used is bounded by the chunk size whatever the number of games. Each chunk is written to a
+temporary file and renamed when complete, after which the checkpoint file records the modification time and id of the
+last exported game. Running the export again continues from there, which also picks up the games that finished since,
+whatever their id, as finishing a game updates its modification time.
+
+Every game is exported counted, with the cards left on the board given to the last collector. Cards have the owner
+indexes of `game_engine.lib.pasur_batch`, points and surs are by seat. The `.npz` chunks pad the seats of games with
+less than MAX_PLAYER_COUNT players with -1.
+"""
+import gzip
+import json
+import os
+from collections import defaultdict
+from datetime import datetime
+from itertools import chain, islice
+from typing import Dict, Iterator, List
+
+import numpy as np
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+from game_engine import models
+from game_engine.lib.pasur import MAX_PLAYER_COUNT, Pasur, STATUS
+from game_engine.lib.pasur_batch import BOARD_OWNER, DECK_OWNER, FIRST_PLAYER_OWNER
+
+CHECKPOINT_FILE = 'checkpoint.json'
+DEFAULT_CHUNK_SIZE = 100000
+DEFAULT_BATCH_SIZE = 2000
+NEW_CHECKPOINT = {'last_modified': None, 'last_game_id': 0, 'chunk_count': 0, 'game_count': 0}
+
+
+def card_owners(pasur: Pasur) -> List[int]:
+    owners = [DECK_OWNER] * 52
+    for card in pasur.board.list_all_cards():
+        owners[card.id] = BOARD_OWNER
+    for seat, player in enumerate(pasur.players):
+        for card in player.list_all_cards():
+            owners[card.id] = FIRST_PLAYER_OWNER + seat
+    return owners
+
+
+def game_record(game_id, match_id, modified, pasur: Pasur) -> dict:
+    points = pasur.player_points()
+    players = [player.identifier for player in pasur.players]
+    return {
+        'game_id': game_id,
+        'match_id': match_id,
+        'modified': modified.isoformat(),
+        'players': players,
+        'owners': card_owners(pasur),
+        'points': [points[name] for name in players],
+        'surs': [sum(1 for player in pasur.surs if player.identifier == name) for name in players],
+    }
+
+
+def _actions_to_replay(rows) -> Dict[int, list]:
+    """Actions logged after the snapshot of the games in `rows`, for the few finished games without a final one"""
+    snapshot_sequences = {row[0]: row[5] for row in rows if row[4] > row[5]}
+    if not snapshot_sequences:
+        return {}
+    actions = defaultdict(list)
+    game_actions = models.GameAction.objects.filter(game_id__in=snapshot_sequences).order_by('game_id', 'sequence')
+    for game_id, sequence, action, payload in game_actions.values_list('game_id', 'sequence', 'action', 'payload'):
+        if sequence > snapshot_sequences[game_id]:
+            actions[game_id].append((action, payload))
+    return actions
+
+
+def finished_games(after_modified: datetime = None, after_game_id=0, batch_size=DEFAULT_BATCH_SIZE) -> Iterator[dict]:
+    """Records of the finished games after (`after_modified`, `after_game_id`), in (modified, id) order"""
+    games = models.Game.objects.filter(status=STATUS.finished)
+    if after_modified is not None:
+        games = games.filter(Q(modified__gt=after_modified) | Q(modified=after_modified, pk__gt=after_game_id))
+    rows = games.order_by('modified', 'pk').values_list(
+        'pk', 'match_id', 'modified', 'pasur', 'action_sequence', 'snapshot_sequence',
+    ).iterator(chunk_size=batch_size)
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            return
+        replays = _actions_to_replay(batch)
+        for game_id, match_id, modified, state, _, _ in batch:
+            pasur = Pasur.load(state)
+            for action, payload in replays.get(game_id, []):
+                pasur.apply_action(action=action, payload=payload)
+            yield game_record(game_id=game_id, match_id=match_id, modified=modified, pasur=pasur)
+
+
+class NdjsonChunkWriter:
+    extension = '.ndjson.gz'
+
+    def __init__(self, path, chunk_size):
+        self.file = gzip.open(path, 'wt', encoding='utf-8')
+
+    def write(self, record: dict):
+        self.file.write(json.dumps(record) + '\n')
+
+    def close(self):
+        self.file.close()
+
+
+class NpzChunkWriter:
+    extension = '.npz'
+
+    def __init__(self, path, chunk_size):
+        self.path = path
+        self.count = 0
+        self.arrays = {
+            'game_id': np.zeros(chunk_size, dtype=np.int64),
+            'match_id': np.zeros(chunk_size, dtype=np.int64),
+            'player_count': np.zeros(chunk_size, dtype=np.int8),
+            'owners': np.zeros((chunk_size, 52), dtype=np.int8),
+            'points': np.full((chunk_size, MAX_PLAYER_COUNT), -1, dtype=np.int16),
+            'surs': np.full((chunk_size, MAX_PLAYER_COUNT), -1, dtype=np.int16),
+        }
+
+    def write(self, record: dict):
+        index = self.count
+        player_count = len(record['players'])
+        self.arrays['game_id'][index] = record['game_id']
+        self.arrays['match_id'][index] = record['match_id']
+        self.arrays['player_count'][index] = player_count
+        self.arrays['owners'][index] = record['owners']
+        self.arrays['points'][index, :player_count] = record['points']
+        self.arrays['surs'][index, :player_count] = record['surs']
+        self.count += 1
+
+    def close(self):
+        with open(self.path, 'wb') as f:  # A file object, so numpy does not add its own extension to the path
+            np.savez_compressed(f, **{name: array[:self.count] for name, array in self.arrays.items()})
+
+
+WRITERS = {
+    'ndjson': NdjsonChunkWriter,
+    'npz': NpzChunkWriter,
+}
+
+
+def read_checkpoint(output_dir) -> dict:
+    path = os.path.join(output_dir, CHECKPOINT_FILE)
+    if not os.path.exists(path):
+        return dict(NEW_CHECKPOINT)
+    with open(path) as f:
+        return json.load(f)
+
+
+def checkpoint_position(checkpoint: dict) -> dict:
+    """Keyword arguments of `finished_games` continuing after the checkpoint"""
+    last_modified = checkpoint.get('last_modified')
+    return {
+        'after_modified': parse_datetime(last_modified) if last_modified else None,
+        'after_game_id': checkpoint['last_game_id'],
+    }
+
+
+def write_checkpoint(output_dir, checkpoint: dict):
+    path = os.path.join(output_dir, CHECKPOINT_FILE)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(checkpoint, f)
+    os.replace(path + '.tmp', path)
+
+
+def export_games(records: Iterator[dict], output_dir, file_format, checkpoint: dict,
+                 chunk_size=DEFAULT_CHUNK_SIZE) -> dict:
+    """Writes the records in chunks after those of `checkpoint`, returns the checkpoint of the last chunk"""
+    if checkpoint.get('format', file_format) != file_format:
+        raise ValueError('The export in {} is in {} format'.format(output_dir, checkpoint['format']))
+    writer_class = WRITERS[file_format]
+    records = iter(records)
+    while True:
+        first = next(records, None)
+        if first is None:
+            return checkpoint
+        path = os.path.join(output_dir, 'games-{:05d}{}'.format(checkpoint['chunk_count'], writer_class.extension))
+        writer = writer_class(path + '.tmp', chunk_size)
+        count = 0
+        for record in chain([first], islice(records, chunk_size - 1)):
+            writer.write(record)
+            count += 1
+        writer.close()
+        os.replace(path + '.tmp', path)
+        checkpoint = {
+            'format': file_format,
+            'last_modified': record['modified'],
+            'last_game_id': record['game_id'],
+            'chunk_count': checkpoint['chunk_count'] + 1,
+            'game_count': checkpoint['game_count'] + count,
+        }
+        write_checkpoint(output_dir, checkpoint)
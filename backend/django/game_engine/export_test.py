@@ -0,0 +1,98 @@
+import datetime
+import gzip
+import json
+
+import numpy as np
+import pytest
+
+from django.utils import timezone
+
+from game_engine import models
+from game_engine.export import NEW_CHECKPOINT, checkpoint_position, export_games, finished_games, game_record, \
+    read_checkpoint
+from game_engine.lib.card_holders import Player
+from game_engine.lib.pasur import Pasur, STATUS
+from game_engine.lib.pasur_batch import FIRST_PLAYER_OWNER
+from game_engine.lib.policies import RandomPolicy
+from game_engine.lib.simulation import play_game
+
+
+def finished_pasur(seed) -> Pasur:
+    pasur = Pasur.create_new_game(seed=seed)
+    for name in ['Anna', 'Bob', 'Cyrus']:
+        pasur.add_player(Player(player_id=name))
+    play_game(policies=[RandomPolicy(seed=seed)] * 3, pasur=pasur)
+    return pasur
+
+
+def records(game_ids):
+    for game_id in game_ids:
+        pasur = finished_pasur(seed=game_id)
+        if pasur.status == STATUS.finished:
+            yield game_record(game_id=game_id, match_id=1, modified=datetime.datetime(2020, 1, 1), pasur=pasur)
+
+
+def test_game_record():
+    pasur = Pasur.create_new_game(seed=1)
+    for name in ['Anna', 'Bob', 'Cyrus']:
+        pasur.add_player(Player(player_id=name))
+    expected_points = play_game(policies=[RandomPolicy(seed=1)] * 3, pasur=pasur).points
+    record = game_record(game_id=5, match_id=2, modified=datetime.datetime(2020, 1, 1), pasur=pasur)
+    assert record['players'] == ['Anna', 'Bob', 'Cyrus']
+    assert record['points'] == [expected_points[name] for name in record['players']]
+    assert all(FIRST_PLAYER_OWNER <= owner < FIRST_PLAYER_OWNER + 3 for owner in record['owners'])
+    assert sum(record['surs']) == len(pasur.surs)
+
+
+def test_export_ndjson_in_chunks_and_resume(tmp_path):
+    checkpoint = export_games(records(range(1, 6)), output_dir=str(tmp_path), file_format='ndjson',
+                              checkpoint=dict(NEW_CHECKPOINT), chunk_size=2)
+    assert checkpoint == read_checkpoint(str(tmp_path))
+    game_count = checkpoint['game_count']
+    assert checkpoint['chunk_count'] == (game_count + 1) // 2
+
+    checkpoint = export_games(records(range(checkpoint['last_game_id'] + 1, 12)), output_dir=str(tmp_path),
+                              file_format='ndjson', checkpoint=checkpoint, chunk_size=2)
+    exported = []
+    for chunk in range(checkpoint['chunk_count']):
+        with gzip.open(str(tmp_path / 'games-{:05d}.ndjson.gz'.format(chunk)), 'rt') as f:
+            exported += [json.loads(line) for line in f]
+    assert [record['game_id'] for record in exported] == [record['game_id'] for record in records(range(1, 12))]
+    assert len(exported) == checkpoint['game_count']
+    assert checkpoint['last_modified'] == exported[-1]['modified']
+
+    with pytest.raises(ValueError):
+        export_games(records([]), output_dir=str(tmp_path), file_format='npz', checkpoint=checkpoint)
+
+
+def test_export_npz(tmp_path):
+    expected = list(records(range(1, 6)))
+    export_games(iter(expected), output_dir=str(tmp_path), file_format='npz', checkpoint=dict(NEW_CHECKPOINT),
+                 chunk_size=10)
+    arrays = np.load(str(tmp_path / 'games-00000.npz'))
+    assert arrays['game_id'].tolist() == [record['game_id'] for record in expected]
+    assert arrays['owners'].tolist() == [record['owners'] for record in expected]
+    assert arrays['points'].tolist() == [record['points'] + [-1] for record in expected]
+    assert (arrays['player_count'] == 3).all()
+
+
+def test_checkpoint_position():
+    assert checkpoint_position(dict(NEW_CHECKPOINT)) == {'after_modified': None, 'after_game_id': 0}
+    checkpoint = dict(NEW_CHECKPOINT, last_modified='2020-01-01T00:00:00+00:00', last_game_id=4)
+    assert checkpoint_position(checkpoint) == {
+        'after_modified': datetime.datetime(2020, 1, 1, tzinfo=datetime.timezone.utc), 'after_game_id': 4}
+
+
+@pytest.mark.django_db
+def test_resume_includes_lower_ids_finished_later():
+    match = models.Match()
+    match.save()
+    first, second = [models.Game(match=match, pasur=finished_pasur(seed=seed), status=STATUS.finished)
+                     for seed in [1, 2]]
+    first.save()
+    second.save()
+    models.Game.objects.filter(pk=first.pk).update(modified=timezone.now() + datetime.timedelta(minutes=1))
+
+    assert [record['game_id'] for record in finished_games()] == [second.pk, first.pk]  # The lower id finished later
+    checkpoint = {'last_modified': next(finished_games())['modified'], 'last_game_id': second.pk}
+    assert [record['game_id'] for record in finished_games(**checkpoint_position(checkpoint))] == [first.pk]
@@ -0,0 +1,189 @@
+"""
+AI player choosing moves with single-observer information set Monte Carlo tree search (SO-ISMCTS).
+
+Each iteration samples a determinization: the cards the bot has not seen (opponent hands and the deck) are dealt at
+random, consistent with the number of cards each of them holds and the locations the bot knows, see
+`game_engine.lib.knowledge`. The sampled game is then played down one shared tree
+with the `Pasur` rules and finished with random moves. Tree nodes are keyed by move, so a node is only selectable in
+the determinizations where its move is legal.
+
+Once the deck is empty and the bot can deduce every hand, the last round is solved exactly by
+`game_engine.lib.endgame.EndgameSolver` instead of sampled.
+"""
+import math
+import time
+from typing import Dict, Tuple
+
+from game_engine.lib.card_holders import Player
+from game_engine.lib.endgame import EndgameSolver, is_perfect_information
+from game_engine.lib.knowledge import KnowledgeTracker
+from game_engine.lib.pasur import Pasur, STATUS
+from game_engine.lib.policies import Move, Policy
+
+MoveKey = Tuple[int, int]  # (card id, collect mask)
+
+POINTS_SCALE = 30  # Point difference to the best opponent that is counted as a certain win
+
+
+def move_key(move: Move) -> MoveKey:
+    card, collect_cards = move
+    return card.id, sum(c.bit for c in collect_cards)
+
+
+def find_move(pasur: Pasur, key: MoveKey) -> Move:
+    for move in pasur.legal_moves():
+        if move_key(move) == key:
+            return move
+    raise KeyError('Move is not legal: {}'.format(key))
+
+
+class _Node:
+    __slots__ = ('parent', 'key', 'player_identifier', 'children', 'visits', 'availability', 'reward')
+
+    def __init__(self, parent: "_Node"=None, key: MoveKey=None, player_identifier=None):
+        self.parent = parent
+        self.key = key
+        self.player_identifier = player_identifier  # Player that made the move leading to this node
+        self.children: Dict[MoveKey, _Node] = {}
+        self.visits = 0
+        self.availability = 0
+        self.reward = 0.0
+
+    def ucb(self, exploration):
+        return self.reward / self.visits + exploration * math.sqrt(math.log(self.availability) / self.visits)
+
+
+class IsmctsPolicy(Policy):
+    """
+    Searches until `budget_seconds` has passed, then plays the most visited move. The last round is solved exactly
+    when `solve_endgame` is set and no hand is hidden.
+    """
+    name = 'ismcts'
+
+    def __init__(self, seed=None, budget_seconds=1.0, exploration=0.7, max_iterations=None, solve_endgame=True):
+        super(IsmctsPolicy, self).__init__(seed=seed)
+        self.budget_seconds = budget_seconds
+        self.exploration = exploration
+        self.max_iterations = max_iterations
+        self.endgame_solver = EndgameSolver() if solve_endgame else None
+        self.last_iteration_count = 0
+
+    def choose_move(self, pasur: Pasur, player: Player, knowledge: KnowledgeTracker = None) -> Move:
+        """`knowledge` is a tracker listening to `pasur`, created from its state if not given"""
+        deadline = time.monotonic() + self.budget_seconds
+        moves = pasur.legal_moves(player=player)
+        if len(moves) == 1:
+            return moves[0]
+        if self.endgame_solver is not None and is_perfect_information(pasur, observer_identifier=player.identifier):
+            self.last_iteration_count = 0
+            key, _ = self.endgame_solver.solve(pasur)
+            return find_move(pasur, key)
+
+        root = _Node()
+        observed = pasur.dump_binary()
+        if knowledge is None:
+            knowledge = KnowledgeTracker(Pasur.load_binary(observed))
+        iteration_count = 0
+        while time.monotonic() < deadline and (self.max_iterations is None or iteration_count < self.max_iterations):
+            state = self.determinize(observed, observer_identifier=player.identifier, knowledge=knowledge)
+            self._iterate(root=root, state=state)
+            iteration_count += 1
+        self.last_iteration_count = iteration_count
+
+        visited = [root.children[key] for key in map(move_key, moves) if key in root.children]
+        if not visited:
+            return moves[0]
+        return find_move(pasur, max(visited, key=lambda node: node.visits).key)
+
+    def determinize(self, observed: bytes, observer_identifier, knowledge: KnowledgeTracker = None) -> Pasur:
+        """
+        A copy of the game where the cards unseen by the observer are randomly redistributed, `knowledge` is the
+        tracker of the observed game, created from it if not given
+        """
+        state = Pasur.load_binary(observed)
+        if knowledge is None:
+            knowledge = KnowledgeTracker(Pasur.load_binary(observed))
+        hands, deck_order = knowledge.sample(observer_identifier, self.random)
+        for opponent_identifier in hands:
+            opponent = state.players.get(opponent_identifier)
+            for card in opponent.list_in_hand_cards():
+                opponent.move_card(card=card, to_card_holder=state.deck)
+        for opponent_identifier, card_ids in hands.items():
+            opponent = state.players.get(opponent_identifier)
+            for card_id in card_ids:
+                state.deck.pop_card(to_card_holder=opponent, card_id=card_id)
+        state.deck.reorder(deck_order)  # The real deck order is hidden too
+        return state
+
+    def _iterate(self, root: _Node, state: Pasur):
+        node = root
+        # Selection and expansion
+        while self._advance_chance(state):
+            player = state.player_in_turn
+            moves = {move_key(move): move for move in state.legal_moves()}
+            for key in moves:
+                if key in node.children:
+                    node.children[key].availability += 1
+            untried = [key for key in moves if key not in node.children]
+            if untried:
+                key = self.random.choice(untried)
+                child = _Node(parent=node, key=key, player_identifier=player.identifier)
+                child.availability = 1
+                node.children[key] = child
+                node = child
+                self._play(state, moves[key])
+                break
+            node = max(
+                (node.children[key] for key in moves),
+                key=lambda child: child.ucb(self.exploration),
+            )
+            self._play(state, moves[node.key])
+
+        # Simulation
+        while self._advance_chance(state):
+            self._play(state, self.random.choice(state.legal_moves()))
+        if state.status == STATUS.cancelled:  # A second knight redrawn to the board, counted as a draw
+            points = {player.identifier: 0 for player in state.players}
+        else:
+            points = state.count_points()
+
+        # Backpropagation
+        while node.parent is not None:
+            node.visits += 1
+            node.reward += self._reward(points, node.player_identifier)
+            node = node.parent
+
+    @staticmethod
+    def _play(state: Pasur, move: Move):
+        card, collect_cards = move
+        state.play_card(player=state.player_in_turn, card=card, collect_cards=collect_cards)
+
+    @staticmethod
+    def _advance_chance(state: Pasur) -> bool:
+        """Deals when all hands are played, returns False when the game is over and points should be counted"""
+        if state.status not in [STATUS.pending, STATUS.ongoing]:
+            return False
+        if state.no_player_has_cards_on_hand:
+            if state.deck.remaining_cards() == 0:
+                return False
+            state.deal_cards()
+        return True
+
+    @staticmethod
+    def _reward(points: Dict[str, int], player_identifier) -> float:
+        best_opponent = max(p for identifier, p in points.items() if identifier != player_identifier)
+        difference = points[player_identifier] - best_opponent
+        return min(1.0, max(0.0, 0.5 + difference / (2 * POINTS_SCALE)))
+
+
+def compute_bot_move(state: bytes, player_identifier, budget_seconds: float, seed=None,
+                     public_masks: Dict[str, int] = None) -> MoveKey:
+    """
+    Move of the player in a binary encoded game, picklable both ways to run in a process pool. `public_masks` are those
+    of the `KnowledgeTracker` following the game, if any.
+    """
+    pasur = Pasur.load_binary(state)
+    knowledge = KnowledgeTracker(pasur, public_masks=public_masks) if public_masks is not None else None
+    policy = IsmctsPolicy(seed=seed, budget_seconds=budget_seconds)
+    return move_key(policy.choose_move(pasur=pasur, player=pasur.card_holders.get(player_identifier),
+                                       knowledge=knowledge))
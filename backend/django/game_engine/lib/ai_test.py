@@ -0,0 +1,67 @@
+import time
+
+import pytest
+
+from game_engine.lib.ai import IsmctsPolicy, compute_bot_move, move_key
+from game_engine.lib.card_holders import Player
+from game_engine.lib.knowledge import KnowledgeTracker
+from game_engine.lib.pasur import Pasur
+
+
+@pytest.fixture()
+def dealt_pasur():
+    pasur = Pasur.create_new_game()
+    for identifier in ['1', '2', '3']:
+        pasur.add_player(Player(identifier))
+    pasur.deal_cards()
+    return pasur
+
+
+def test_determinize_keeps_observed_cards(dealt_pasur: Pasur):
+    observer = dealt_pasur.player_in_turn
+    policy = IsmctsPolicy(seed=1)
+    state = policy.determinize(dealt_pasur.dump_binary(), observer_identifier=observer.identifier)
+    assert state.players.get(observer.identifier).cards_mask == observer.cards_mask
+    assert state.board.cards_mask == dealt_pasur.board.cards_mask
+    for player in dealt_pasur.players:
+        assert state.players.get(player.identifier).cards_count_hand() == player.cards_count_hand()
+    assert state.deck.card_count == dealt_pasur.deck.card_count
+
+
+def test_choose_move_within_budget(dealt_pasur: Pasur):
+    policy = IsmctsPolicy(seed=1, budget_seconds=0.2)
+    start = time.monotonic()
+    move = policy.choose_move(pasur=dealt_pasur, player=dealt_pasur.player_in_turn)
+    assert time.monotonic() - start < 0.5
+    assert move_key(move) in [move_key(m) for m in dealt_pasur.legal_moves()]
+
+
+def test_choose_move_with_max_iterations(dealt_pasur: Pasur):
+    policy = IsmctsPolicy(seed=1, budget_seconds=60, max_iterations=20)
+    move = policy.choose_move(pasur=dealt_pasur, player=dealt_pasur.player_in_turn)
+    assert move_key(move) in [move_key(m) for m in dealt_pasur.legal_moves()]
+    assert policy.last_iteration_count in [0, 20]  # No search when there is a single legal move
+
+
+def test_compute_bot_move_from_binary_state(dealt_pasur: Pasur):
+    key = compute_bot_move(
+        state=dealt_pasur.dump_binary(),
+        player_identifier=dealt_pasur.player_in_turn.identifier,
+        budget_seconds=0.1,
+        seed=1,
+    )
+    assert key in [move_key(m) for m in dealt_pasur.legal_moves()]
+
+
+def test_choose_move_with_live_knowledge():
+    pasur = Pasur.create_new_game(seed=2)
+    for identifier in ['1', '2']:
+        pasur.add_player(Player(identifier))
+    knowledge = KnowledgeTracker(pasur)
+    pasur.deal_cards()
+    policy = IsmctsPolicy(seed=1, budget_seconds=60, max_iterations=20)
+    move = policy.choose_move(pasur=pasur, player=pasur.player_in_turn, knowledge=knowledge)
+    assert move_key(move) in [move_key(m) for m in pasur.legal_moves()]
+    key = compute_bot_move(state=pasur.dump_binary(), player_identifier=pasur.player_in_turn.identifier,
+                           budget_seconds=0.1, seed=1, public_masks=knowledge.public_masks)
+    assert key in [move_key(m) for m in pasur.legal_moves()]
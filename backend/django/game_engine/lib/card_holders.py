@@ -1,5 +1,5 @@
 import random
-from typing import List, Union, Type, Generic, TypeVar
+from typing import Dict, List, Union, Type, Generic, TypeVar
 
 # EXAMPLE DICT JSON:
 _example = [
@@ -17,6 +17,32 @@ HEARTS = 'hearts'
 SPADES = 'spades'
 COLORS = [SPADES, HEARTS, CLUBS, DIAMONDS]  # Same order as deck.js
 
+# Card sets are stored as 52-bit integer masks, bit `card_id` set if the card is in the set.
+ALL_CARDS_MASK = (1 << 52) - 1
+SUIT_MASKS = [((1 << 13) - 1) << (13 * suit) for suit in range(len(COLORS))]
+NUMBER_MASKS = {
+    number: sum(1 << (13 * suit + number - 1) for suit in range(len(COLORS)))
+    for number in range(1, 14)
+}
+
+
+def card_bit(card_id) -> int:
+    return 1 << card_id
+
+
+def mask_count(mask: int) -> int:
+    return bin(mask).count('1')
+
+
+def mask_card_ids(mask: int) -> List[int]:
+    """Card ids in the mask, lowest first"""
+    card_ids = []
+    while mask:
+        low_bit = mask & -mask
+        card_ids.append(low_bit.bit_length() - 1)
+        mask ^= low_bit
+    return card_ids
+
 
 class Card:
     def __init__(self, card_id, collected=False):
@@ -24,6 +50,7 @@ class Card:
             raise RuntimeError('Card is not valid: {}'.format(card_id))
         self.id = card_id
         self.collected = collected
+        self.holder: "CardHolder" = None
 
     def __eq__(self, other):
         return self.id == other.id
@@ -40,7 +67,14 @@ class Card:
 
     def set_collected(self):
         """Card is now collected by a player"""
-        self.collected = True
+        if not self.collected:
+            self.collected = True
+            if self.holder is not None:
+                self.holder.card_was_collected(self)
+
+    @property
+    def bit(self):
+        return 1 << self.id
 
     @property
     def color(self):
@@ -65,19 +99,39 @@ class Card:
 
 class CardHolder:
     def __init__(self, identifier):
-        self._cards: List[Card] = []
+        self._cards: Dict[int, Card] = {}  # card_id -> Card, in the order the cards were added
+        self._mask = 0
         self.identifier = identifier
 
     def add_card(self, card: Card):
-        if card not in self._cards:
-            self._cards.append(card)
-        else:
+        if self._mask & card.bit:
             raise RuntimeError('Card already in the deck: {}'.format(card))
+        self._cards[card.id] = card
+        self._mask |= card.bit
+        card.holder = self
+
+    def _remove_card(self, card: Card):
+        del self._cards[card.id]
+        self._mask &= ~card.bit
+        if card.holder is self:
+            card.holder = None
+
+    def card_was_collected(self, card: Card):
+        """Called by a card owned by this holder when it is set as collected"""
+        pass
 
     @property
     def card_count(self):
         return len(self._cards)
 
+    @property
+    def cards_mask(self) -> int:
+        return self._mask
+
+    def has_card(self, card: Union[Card, int]) -> bool:
+        card_id = card.id if isinstance(card, Card) else card
+        return bool(self._mask & (1 << card_id))
+
     def __eq__(self, other: Union[Type["CardHolder"], "CardHolder", str]):
         if isinstance(other, CardHolder):
             return self.identifier == other.identifier
@@ -87,26 +141,26 @@ class CardHolder:
             return self.identifier == other
 
     def move_card(self, card: Card, to_card_holder: "CardHolder"):
-        if card not in self._cards:
+        if not self._mask & card.bit:
             raise RuntimeError('CardHolder tried to play a card not owned')
+        card = self._cards[card.id]
+        self._remove_card(card)
         to_card_holder.add_card(card)
-        self._cards.remove(card)
 
     def list_all_cards(self):
-        return self._cards.copy()  # Do not allow tampering with _cards
+        return list(self._cards.values())  # Do not allow tampering with _cards
 
     def has_knight(self):
-        for card in self._cards:
-            if card.number == 11:
-                return True
-        return False
+        return bool(self._mask & NUMBER_MASKS[11])
+
+    def count_number(self, number) -> int:
+        return mask_count(self._mask & NUMBER_MASKS[number])
+
+    def count_suit(self, suit) -> int:
+        return mask_count(self._mask & SUIT_MASKS[suit])
 
     def clubs_count(self):
-        count = 0
-        for card in self.list_all_cards():
-            if card.color == CLUBS:
-                count += 1
-        return count
+        return self.count_suit(COLORS.index(CLUBS))
 
     def __str__(self):
         return f'<{self.__class__.__name__}: {self.identifier} ({self.card_count} cards)>'
@@ -115,30 +169,45 @@ class CardHolder:
         return str(self)
 
     def get(self, card_id):
-        for card in self._cards:
-            if card.id == card_id:
-                return card
+        return self._cards.get(card_id)
 
 
 class Player(CardHolder):
     def __init__(self, player_id):
         super(Player, self).__init__(identifier=player_id)
+        self._collected_mask = 0
+
+    def add_card(self, card: Card):
+        super(Player, self).add_card(card)
+        if card.collected:
+            self._collected_mask |= card.bit
+
+    def _remove_card(self, card: Card):
+        super(Player, self)._remove_card(card)
+        self._collected_mask &= ~card.bit
+
+    def card_was_collected(self, card: Card):
+        self._collected_mask |= card.bit
+
+    @property
+    def collected_mask(self) -> int:
+        return self._collected_mask
+
+    @property
+    def in_hand_mask(self) -> int:
+        return self._mask & ~self._collected_mask
 
     def cards_count_hand(self):
-        count = 0
-        for card in self._cards:
-            if not card.collected:
-                count += 1
-        return count
+        return mask_count(self.in_hand_mask)
 
     def card_count_collected(self):
-        return self.card_count - self.cards_count_hand()
+        return mask_count(self._collected_mask)
 
     def list_collected_cards(self):
-        return [c for c in self._cards if c.collected]
+        return [c for c in self._cards.values() if c.collected]
 
     def list_in_hand_cards(self):
-        return [c for c in self._cards if not c.collected]
+        return [c for c in self._cards.values() if not c.collected]
 
 
 class Board(CardHolder):
@@ -146,7 +215,7 @@ class Board(CardHolder):
         super(Board, self).__init__(identifier=self.__class__.__name__)
 
     def get_cards_on_board(self):
-        return self._cards
+        return self.list_all_cards()
 
 
 class Deck(CardHolder):
@@ -154,12 +223,15 @@ class Deck(CardHolder):
         super(Deck, self).__init__(identifier=self.__class__.__name__)
 
     @staticmethod
-    def generate_fresh_set_of_cards() -> "Deck":
+    def generate_fresh_set_of_cards(seed=None) -> "Deck":
+        """A full deck shuffled once by `seed`, cards are drawn from the end of `list_all_cards`"""
+        card_ids = list(range(52))
+        random.Random(seed).shuffle(card_ids)
         deck = Deck()
-        for it in range(52):
+        for card_id in card_ids:
             deck.add_card(
                 Card(
-                    card_id=it,
+                    card_id=card_id,
                     collected=False,
                 ))
         return deck
@@ -170,8 +242,33 @@ class Deck(CardHolder):
     def __str__(self):
         return "<Deck with {} cards remaining>".format(self.remaining_cards())
 
-    def pop_card(self, to_card_holder: CardHolder):
-        self.move_card(self._cards[random.randint(0, len(self._cards) - 1)], to_card_holder=to_card_holder)
+    def pop_card(self, to_card_holder: CardHolder, card_id=None) -> Card:
+        """Moves the top card, or the card `card_id` when replaying a recorded deal"""
+        if card_id is None:
+            if not self._cards:
+                raise RuntimeError('The deck is empty')
+            _, card = self._cards.popitem()  # Last added, the top of the deck
+            self._cards[card.id] = card
+        else:
+            card = self.get(card_id)
+            if card is None:
+                raise RuntimeError('Card is not in the deck: {}'.format(card_id))
+        self.move_card(card, to_card_holder=to_card_holder)
+        return card
+
+    def put_card_at_bottom(self, card: Card):
+        """Moves a card of the deck to the bottom, so it is drawn last"""
+        card = self._cards.pop(card.id)
+        self._cards = dict([(card.id, card)] + list(self._cards.items()))
+
+    def shuffle(self, rng: random.Random):
+        cards = self.list_all_cards()
+        rng.shuffle(cards)
+        self._cards = {card.id: card for card in cards}
+
+    def reorder(self, card_ids: List[int]):
+        """Puts the cards of the deck in the order of `card_ids`, bottom first"""
+        self._cards = {card_id: self._cards[card_id] for card_id in card_ids}
 
 
 T = TypeVar('T')
@@ -200,8 +297,7 @@ class CardHolderList(list, Generic[T]):
 
     def get_card(self, card_id):
         for p in self:
-            for c in p.list_all_cards():
-                if c.id == card_id:
-                    return c
+            if p.has_card(card_id):
+                return p.get(card_id)
         # raise RuntimeError('Did not find card that was supposed to be here')
         return None
@@ -0,0 +1,75 @@
+import pytest
+
+from game_engine.lib.card_holders import Card, Board, Deck, Player, CLUBS, COLORS, mask_card_ids, mask_count
+
+
+@pytest.fixture()
+def deck():
+    return Deck.generate_fresh_set_of_cards()
+
+
+def test_fresh_deck_mask(deck: Deck):
+    assert deck.card_count == 52
+    assert mask_count(deck.cards_mask) == 52
+    assert mask_card_ids(deck.cards_mask) == list(range(52))
+
+
+def test_move_card_updates_masks(deck: Deck):
+    board = Board()
+    card = deck.get(10)
+    deck.move_card(card=card, to_card_holder=board)
+    assert not deck.has_card(10)
+    assert board.has_card(card)
+    assert board.cards_mask == card.bit
+    assert deck.card_count == 51
+    with pytest.raises(RuntimeError):
+        deck.move_card(card=card, to_card_holder=board)
+    with pytest.raises(RuntimeError):
+        board.add_card(Card(10))
+
+
+def test_list_all_cards_keeps_insertion_order(deck: Deck):
+    board = Board()
+    for card_id in [40, 3, 17]:
+        deck.move_card(card=deck.get(card_id), to_card_holder=board)
+    assert [c.id for c in board.list_all_cards()] == [40, 3, 17]
+
+
+def test_suit_and_number_queries(deck: Deck):
+    board = Board()
+    assert not board.has_knight()
+    for card_id in [10, 13 * 2 + 4, 13 * 2 + 8, 51]:  # Jack of spades, two clubs, king of diamonds
+        deck.move_card(card=deck.get(card_id), to_card_holder=board)
+    assert board.has_knight()
+    assert board.clubs_count() == 2
+    assert board.count_suit(COLORS.index(CLUBS)) == 2
+    assert board.count_number(13) == 1
+    assert board.count_number(1) == 0
+
+
+def test_player_collected_split(deck: Deck):
+    player = Player('1')
+    board = Board()
+    for card_id in range(4):
+        deck.move_card(card=deck.get(card_id), to_card_holder=player)
+    assert player.cards_count_hand() == 4
+    assert player.card_count_collected() == 0
+
+    card = player.get(0)
+    player.move_card(card=card, to_card_holder=board)
+    board.move_card(card=card, to_card_holder=player)
+    card.set_collected()
+    assert player.cards_count_hand() == 3
+    assert player.card_count_collected() == 1
+    assert player.collected_mask == card.bit
+    assert [c.id for c in player.list_in_hand_cards()] == [1, 2, 3]
+    assert player.list_collected_cards() == [card]
+
+
+def test_player_add_collected_card(deck: Deck):
+    player = Player('1')
+    card = deck.get(5)
+    card.set_collected()
+    deck.move_card(card=card, to_card_holder=player)
+    assert player.card_count_collected() == 1
+    assert player.cards_count_hand() == 0
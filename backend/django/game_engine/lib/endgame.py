@@ -0,0 +1,169 @@
+"""
+Exact solver of the last round of a Pasur game, once the deck is empty and no cards are hidden from the player in turn.
+
+The search plays the round on card masks instead of `Pasur` objects: the hands, the board, the seat in turn, the last
+collector and the points and clubs collected since the search started. A finished round is valued as in
+`Pasur.count_points`, as the points of the searching player minus those of the best opponent. The searching player
+maximizes that difference and every opponent minimizes it, which is exact with two players.
+
+Positions reached by different move orders are looked up in a transposition table, keyed by the search state packed in
+one int and bounded to `max_table_entries`.
+"""
+from typing import Dict, List, Optional, Tuple
+
+from game_engine.lib.card_holders import CLUBS, Card, mask_card_ids
+from game_engine.lib.pasur import CLUBS_WIN_POINT, SUR_POINT, Pasur, legal_collect_masks
+from game_engine.lib.policies import card_points
+
+MoveKey = Tuple[int, int]  # (card id, collect mask), as `game_engine.lib.ai.move_key`
+
+DEFAULT_MAX_TABLE_ENTRIES = 200000
+
+_EXACT, _LOWER, _UPPER = 0, 1, 2
+
+
+_CARD_NUMBERS = [Card(card_id).number for card_id in range(52)]
+_CARD_POINTS = [card_points(Card(card_id)) for card_id in range(52)]
+_CLUBS_MASK = sum(1 << card_id for card_id in range(52) if Card(card_id).color == CLUBS)
+
+
+def mask_points(mask: int) -> int:
+    return sum(_CARD_POINTS[card_id] for card_id in mask_card_ids(mask))
+
+
+def is_perfect_information(pasur: Pasur, observer_identifier) -> bool:
+    """
+    Whether the observer can deduce every hand: the deck is empty and at most one opponent holds cards. With more
+    opponents holding cards the split of the unseen cards between them is unknown.
+    """
+    if pasur.deck.card_count > 0:
+        return False
+    return sum(1 for player in pasur.players
+               if player.identifier != observer_identifier and player.cards_count_hand() > 0) <= 1
+
+
+class EndgameSolver:
+    """Alpha-beta search of the last round, for the player in turn"""
+
+    def __init__(self, max_table_entries=DEFAULT_MAX_TABLE_ENTRIES):
+        self.max_table_entries = max_table_entries
+        self.table: Dict[int, Tuple[int, int]] = {}
+        self.last_node_count = 0
+        # Set by `solve`, by seat in play order
+        self.root = 0
+        self.seat_count = 0
+        self.base_points: List[int] = []
+        self.base_clubs: List[int] = []
+
+    def solve(self, pasur: Pasur) -> Tuple[MoveKey, int]:
+        """The best move of the player in turn and its value, the point difference to the best opponent"""
+        if pasur.deck.card_count > 0:
+            raise ValueError('The endgame solver needs an empty deck')
+        players = pasur.players_in_play_order
+        player_in_turn = pasur.player_in_turn
+        self.root = players.index(player_in_turn)
+        self.seat_count = len(players)
+        self.base_points = [mask_points(player.collected_mask) for player in players]
+        self.base_clubs = [bin(player.collected_mask & _CLUBS_MASK).count('1') for player in players]
+        surs = [sum(1 for p in pasur.surs if p.identifier == player.identifier) for player in players]
+        lowest_sur_count = min(surs)
+        for seat, sur_count in enumerate(surs):
+            self.base_points[seat] += (sur_count - lowest_sur_count) * SUR_POINT
+        last_collector = players.index(pasur.last_collector) if pasur.last_collector else -1
+        self.table.clear()
+        self.last_node_count = 0
+
+        hands = tuple(player.in_hand_mask for player in players)
+        best_key, best_value = None, None
+        alpha, beta = -10 ** 6, 10 ** 6
+        for key, child in self._children(hands, pasur.board.cards_mask, self.root, last_collector,
+                                         (0,) * self.seat_count, (0,) * self.seat_count):
+            value = self._search(*child, alpha=alpha, beta=beta)
+            if best_value is None or value > best_value:
+                best_key, best_value = key, value
+                alpha = max(alpha, value)
+        return best_key, best_value
+
+    def _children(self, hands: Tuple[int, ...], board: int, turn: int, last_collector: int,
+                  points: Tuple[int, ...], clubs: Tuple[int, ...]) -> List[Tuple[MoveKey, tuple]]:
+        """(move key, child state) of every legal move, collecting the most points first to prune early"""
+        next_turn = (turn + 1) % self.seat_count
+        children = []
+        for card_id in mask_card_ids(hands[turn]):
+            card_bit = 1 << card_id
+            child_hands = hands[:turn] + (hands[turn] & ~card_bit,) + hands[turn + 1:]
+            for collect_mask in legal_collect_masks(board_mask=board, number=_CARD_NUMBERS[card_id]):
+                if collect_mask:
+                    gained = collect_mask | card_bit
+                    gained_points = mask_points(gained)
+                    child_points = points[:turn] + (points[turn] + gained_points,) + points[turn + 1:]
+                    gained_clubs = bin(gained & _CLUBS_MASK).count('1')
+                    child_clubs = clubs[:turn] + (clubs[turn] + gained_clubs,) + clubs[turn + 1:]
+                    child = (child_hands, board & ~collect_mask, next_turn, turn, child_points, child_clubs)
+                    order = gained_points * 4 + gained_clubs + 1
+                else:
+                    child = (child_hands, board | card_bit, next_turn, last_collector, points, clubs)
+                    order = 0
+                children.append((order, (card_id, collect_mask), child))
+        children.sort(key=lambda item: item[0], reverse=True)
+        return [(key, child) for _, key, child in children]
+
+    def _value(self, board: int, last_collector: int, points: Tuple[int, ...], clubs: Tuple[int, ...]) -> int:
+        totals = [base + gained for base, gained in zip(self.base_points, points)]
+        club_counts = [base + gained for base, gained in zip(self.base_clubs, clubs)]
+        if last_collector >= 0:
+            totals[last_collector] += mask_points(board)
+            club_counts[last_collector] += bin(board & _CLUBS_MASK).count('1')
+        clubs_rank = sorted(range(self.seat_count), key=lambda seat: club_counts[seat], reverse=True)
+        if club_counts[clubs_rank[0]] != club_counts[clubs_rank[1]]:
+            totals[clubs_rank[0]] += CLUBS_WIN_POINT
+        return totals[self.root] - max(total for seat, total in enumerate(totals) if seat != self.root)
+
+    def _key(self, hands: Tuple[int, ...], board: int, turn: int, last_collector: int,
+             points: Tuple[int, ...], clubs: Tuple[int, ...]) -> int:
+        key = board
+        for hand in hands:
+            key = key << 52 | hand
+        key = key << 3 | turn
+        key = key << 3 | last_collector + 1
+        for seat_points, seat_clubs in zip(points, clubs):
+            key = (key << 6 | seat_points) << 4 | seat_clubs
+        return key
+
+    def _search(self, hands: Tuple[int, ...], board: int, turn: int, last_collector: int,
+                points: Tuple[int, ...], clubs: Tuple[int, ...], alpha: int, beta: int) -> int:
+        self.last_node_count += 1
+        if not any(hands):
+            return self._value(board, last_collector, points, clubs)
+
+        key = self._key(hands, board, turn, last_collector, points, clubs)
+        entry: Optional[Tuple[int, int]] = self.table.get(key)
+        if entry is not None:
+            flag, value = entry
+            if flag == _EXACT or (flag == _LOWER and value >= beta) or (flag == _UPPER and value <= alpha):
+                return value
+
+        original_alpha, original_beta = alpha, beta
+        maximizing = turn == self.root
+        best = None
+        for _, child in self._children(hands, board, turn, last_collector, points, clubs):
+            value = self._search(*child, alpha=alpha, beta=beta)
+            if maximizing:
+                best = value if best is None else max(best, value)
+                alpha = max(alpha, value)
+            else:
+                best = value if best is None else min(best, value)
+                beta = min(beta, value)
+            if alpha >= beta:
+                break
+
+        if best <= original_alpha:
+            flag = _UPPER
+        elif best >= original_beta:
+            flag = _LOWER
+        else:
+            flag = _EXACT
+        if len(self.table) >= self.max_table_entries:
+            self.table.clear()  # Keeps the memory bounded, the search only gets slower
+        self.table[key] = (flag, best)
+        return best
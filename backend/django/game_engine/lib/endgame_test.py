@@ -0,0 +1,93 @@
+import pytest
+
+from game_engine.lib.ai import IsmctsPolicy, find_move, move_key
+from game_engine.lib.card_holders import Player
+from game_engine.lib.endgame import EndgameSolver, is_perfect_information
+from game_engine.lib.pasur import Pasur
+from game_engine.lib.policies import RandomPolicy
+
+
+def last_round(seed, player_count=2, played_count=0) -> Pasur:
+    """A game after the last deal, with `played_count` cards played at random"""
+    pasur = Pasur.create_new_game(seed=seed)
+    for index in range(player_count):
+        pasur.add_player(Player(str(index)))
+    policy = RandomPolicy(seed=seed)
+    while pasur.deck.card_count > 0 or pasur.no_player_has_cards_on_hand:
+        if pasur.no_player_has_cards_on_hand:
+            pasur.deal_cards()
+        else:
+            player = pasur.player_in_turn
+            pasur.play_card(player, *policy.choose_move(pasur=pasur, player=player))
+    for _ in range(played_count):
+        player = pasur.player_in_turn
+        pasur.play_card(player, *policy.choose_move(pasur=pasur, player=player))
+    return pasur
+
+
+def point_difference(pasur: Pasur, player_identifier):
+    points = pasur.count_points()
+    return points[player_identifier] - max(p for name, p in points.items() if name != player_identifier)
+
+
+def minimax(pasur: Pasur, player_identifier):
+    """Value of the game for the player by playing out every move on copies"""
+    if pasur.no_player_has_cards_on_hand:
+        return point_difference(pasur, player_identifier)
+    values = []
+    for move in pasur.legal_moves():
+        state = Pasur.load_binary(pasur.dump_binary())
+        state.play_card(state.player_in_turn, *find_move(state, move_key(move)))
+        values.append(minimax(state, player_identifier))
+    return max(values) if pasur.player_in_turn.identifier == player_identifier else min(values)
+
+
+@pytest.mark.parametrize('player_count,played_count', [(2, 2), (3, 6), (4, 10)])
+def test_solve_matches_minimax(player_count, played_count):
+    for seed in range(3):
+        pasur = last_round(seed=seed, player_count=player_count, played_count=played_count)
+        key, value = EndgameSolver().solve(pasur)
+        assert value == minimax(pasur, pasur.player_in_turn.identifier)
+        assert key in [move_key(move) for move in pasur.legal_moves()]
+
+
+def test_solved_play_reaches_value():
+    pasur = last_round(seed=1)
+    player_identifier = pasur.player_in_turn.identifier
+    _, value = EndgameSolver().solve(pasur)
+    solver = EndgameSolver()
+    while not pasur.no_player_has_cards_on_hand:
+        key, _ = solver.solve(pasur)
+        pasur.play_card(pasur.player_in_turn, *find_move(pasur, key))
+    assert point_difference(pasur, player_identifier) == value
+
+
+def test_table_is_bounded():
+    pasur = last_round(seed=0, player_count=3)
+    solver = EndgameSolver(max_table_entries=50)
+    _, value = solver.solve(pasur)
+    assert 0 < len(solver.table) <= 50
+    assert value == EndgameSolver().solve(pasur)[1]
+
+
+def test_is_perfect_information():
+    pasur = last_round(seed=0, player_count=3)
+    observer = pasur.player_in_turn
+    assert not is_perfect_information(pasur, observer_identifier=observer.identifier)
+    for _ in range(pasur.players[0].cards_count_hand() * 3 - 2):
+        pasur.play_card(pasur.player_in_turn, *RandomPolicy(seed=0).choose_move(pasur, pasur.player_in_turn))
+    assert is_perfect_information(pasur, observer_identifier=pasur.player_in_turn.identifier)
+
+    pasur = Pasur.create_new_game(seed=0)
+    for identifier in ['1', '2']:
+        pasur.add_player(Player(identifier))
+    pasur.deal_cards()
+    assert not is_perfect_information(pasur, observer_identifier='1')
+
+
+def test_ismcts_solves_last_round():
+    pasur = last_round(seed=2)
+    policy = IsmctsPolicy(seed=1, budget_seconds=60)
+    move = policy.choose_move(pasur=pasur, player=pasur.player_in_turn)
+    assert policy.last_iteration_count == 0
+    assert move_key(move) == EndgameSolver().solve(pasur)[0]
@@ -0,0 +1,152 @@
+"""
+What each seat of a Pasur game knows about where the cards are, kept up to date action by action.
+
+Card locations are either public, known to every seat (the board, the piles of collected cards, the knights put back
+at the bottom of the deck and who they are dealt to), or private to a seat (its own hand). Every other card is unknown
+to the seat, somewhere in the opponent hands or the deck. The tracker listens to its game through `Pasur.listeners`,
+so dealing and playing a card only update a few masks and counters instead of walking the card holders.
+
+A tracker created for a game already in progress starts from what the state shows, it cannot tell a knight put back
+in the deck from the others, unless it is given the public masks of a tracker that followed the game, or it is
+`replayed` from the logged actions of the game.
+"""
+import random
+from typing import Dict, Iterable, List, Tuple
+
+from game_engine.lib.card_holders import ALL_CARDS_MASK, COLORS, Board, Card, CardHolder, Deck, Player, mask_card_ids
+from game_engine.lib.pasur import Pasur, PasurIllegalAction
+
+DECK = Deck.__name__
+BOARD = Board.__name__
+
+
+class KnowledgeTracker:
+    """
+    Per seat knowledge of the card locations, listening to `pasur` from its creation. `public_masks` are those of a
+    tracker that followed the game, by default they are taken from the state.
+    """
+
+    def __init__(self, pasur: Pasur, public_masks: Dict[str, int] = None):
+        self.seats = [player.identifier for player in pasur.players]
+        if public_masks is not None:
+            self.public_masks: Dict[str, int] = dict(public_masks)
+        else:
+            self.public_masks = {identifier: 0 for identifier in [DECK, BOARD] + self.seats}
+            self.public_masks[BOARD] = pasur.board.cards_mask
+            for player in pasur.players:
+                self.public_masks[player.identifier] = player.collected_mask
+        self.public_mask = 0
+        for mask in self.public_masks.values():
+            self.public_mask |= mask
+        self.hand_masks = {player.identifier: player.in_hand_mask for player in pasur.players}
+        self.hand_counts = {player.identifier: player.cards_count_hand() for player in pasur.players}
+
+        # Counts of the cards unknown to each seat, by suit index of COLORS and by card number
+        self.unknown_suit_counts: Dict[str, List[int]] = {}
+        self.unknown_number_counts: Dict[str, List[int]] = {}
+        for identifier in self.seats:
+            self.unknown_suit_counts[identifier] = [0] * len(COLORS)
+            self.unknown_number_counts[identifier] = [0] * 14
+            for card_id in mask_card_ids(self.unknown_mask(identifier)):
+                self.unknown_suit_counts[identifier][card_id // 13] += 1
+                self.unknown_number_counts[identifier][card_id % 13 + 1] += 1
+        pasur.listeners.append(self)
+
+    @staticmethod
+    def replayed(pasur: Pasur, actions: Iterable[Tuple[str, dict]]) -> "KnowledgeTracker":
+        """
+        Tracker listening to `pasur`, fed by replaying the recorded `actions` that led to it from a new game with the
+        same players, starter and seed. Falls back to the state of `pasur` if the replay does not lead to it.
+        """
+        replay = Pasur.create_new_game(seed=pasur.seed)
+        for player in pasur.players:
+            replay.add_player(Player(player.identifier))
+        if pasur.starter is not None:
+            replay.starter = replay.players.get(pasur.starter.identifier)
+        tracker = KnowledgeTracker(replay)
+        try:
+            for action, payload in actions:
+                replay.apply_action(action=action, payload=payload)
+        except PasurIllegalAction:
+            return KnowledgeTracker(pasur)
+        replay.listeners.remove(tracker)
+        if (tracker.public_masks[BOARD] != pasur.board.cards_mask or
+                tracker.hand_masks != {player.identifier: player.in_hand_mask for player in pasur.players}):
+            return KnowledgeTracker(pasur)
+        pasur.listeners.append(tracker)
+        return tracker
+
+    def known_mask(self, identifier) -> int:
+        """Cards seen by the seat, whose location it knows"""
+        return self.public_mask | self.hand_masks[identifier]
+
+    def unknown_mask(self, identifier) -> int:
+        return ALL_CARDS_MASK & ~self.known_mask(identifier)
+
+    def locations(self, identifier) -> Dict[str, int]:
+        """Masks of the cards known by the seat to be at each holder"""
+        locations = dict(self.public_masks)
+        locations[identifier] |= self.hand_masks[identifier]
+        return locations
+
+    def sample(self, identifier, rng: random.Random) -> Tuple[Dict[str, List[int]], List[int]]:
+        """
+        A random deal of the cards unknown to the seat that is consistent with its knowledge: the card ids in each
+        opponent's hand and the cards of the deck, bottom first.
+        """
+        unknown_ids = mask_card_ids(self.unknown_mask(identifier))
+        rng.shuffle(unknown_ids)
+        hands = {}
+        start = 0
+        for opponent in self.seats:
+            if opponent == identifier:
+                continue
+            known_ids = mask_card_ids(self.public_masks[opponent] & self.hand_masks[opponent])
+            end = start + self.hand_counts[opponent] - len(known_ids)
+            hands[opponent] = known_ids + unknown_ids[start:end]
+            start = end
+        return hands, mask_card_ids(self.public_masks[DECK]) + unknown_ids[start:]
+
+    def _move(self, card_id, public_holder=None, hand_holder=None):
+        """Records the new location of a card: public at `public_holder`, and/or in the hand of `hand_holder`"""
+        bit = 1 << card_id
+        known_before = [bool(self.known_mask(identifier) & bit) for identifier in self.seats]
+        for identifier in self.public_masks:
+            self.public_masks[identifier] &= ~bit
+        for identifier in self.seats:
+            self.hand_masks[identifier] &= ~bit
+        if public_holder is not None:
+            self.public_masks[public_holder] |= bit
+            self.public_mask |= bit
+        else:
+            self.public_mask &= ~bit
+        if hand_holder is not None:
+            self.hand_masks[hand_holder] |= bit
+        for identifier, was_known in zip(self.seats, known_before):
+            is_known = bool(self.known_mask(identifier) & bit)
+            if is_known != was_known:
+                change = -1 if is_known else 1
+                self.unknown_suit_counts[identifier][card_id // 13] += change
+                self.unknown_number_counts[identifier][card_id % 13 + 1] += change
+
+    # Listener hooks, called by `Pasur`
+
+    def card_dealt(self, to_card_holder: CardHolder, card: Card):
+        if isinstance(to_card_holder, Player):
+            # Everybody knows who gets a card known to be in the deck
+            public_holder = to_card_holder.identifier if self.public_masks[DECK] & card.bit else None
+            self._move(card.id, public_holder=public_holder, hand_holder=to_card_holder.identifier)
+            self.hand_counts[to_card_holder.identifier] += 1
+        else:
+            self._move(card.id, public_holder=BOARD)
+
+    def knight_returned(self, card: Card):
+        self._move(card.id, public_holder=DECK)
+
+    def card_played(self, player: Player, card: Card, collect_cards: List[Card]):
+        self.hand_counts[player.identifier] -= 1
+        if collect_cards:
+            for c in [card] + collect_cards:
+                self._move(c.id, public_holder=player.identifier)
+        else:
+            self._move(card.id, public_holder=BOARD)
@@ -0,0 +1,140 @@
+import random
+from unittest import mock
+
+import pytest
+
+from game_engine.lib.card_holders import COLORS, Player, mask_card_ids, mask_count
+from game_engine.lib.knowledge import BOARD, DECK, KnowledgeTracker
+from game_engine.lib.pasur import Pasur, STATUS
+from game_engine.lib.policies import RandomPolicy
+
+
+def new_game(seed, player_count=2) -> Pasur:
+    pasur = Pasur.create_new_game(seed=seed)
+    for index in range(player_count):
+        pasur.add_player(Player(str(index)))
+    return pasur
+
+
+def play_random(pasur: Pasur, until_last_deal=False, step=lambda: None):
+    """Plays random moves until every card is played or just dealt, calling `step` after every action"""
+    policy = RandomPolicy(seed=0)
+    while pasur.status in [STATUS.pending, STATUS.ongoing]:
+        if until_last_deal and pasur.deck.remaining_cards() == 0:
+            return
+        if pasur.no_player_has_cards_on_hand:
+            if pasur.deck.remaining_cards() == 0:
+                return
+            pasur.deal_cards()
+        else:
+            player = pasur.player_in_turn
+            pasur.play_card(player, *policy.choose_move(pasur=pasur, player=player))
+        step()
+
+
+def assert_counts_match(tracker: KnowledgeTracker):
+    for identifier in tracker.seats:
+        unknown_ids = mask_card_ids(tracker.unknown_mask(identifier))
+        assert tracker.unknown_suit_counts[identifier] == [
+            sum(1 for card_id in unknown_ids if card_id // 13 == suit) for suit in range(len(COLORS))]
+        assert tracker.unknown_number_counts[identifier][1:] == [
+            sum(1 for card_id in unknown_ids if card_id % 13 + 1 == number) for number in range(1, 14)]
+
+
+@pytest.mark.parametrize('player_count', [2, 4])
+def test_tracker_follows_game(player_count):
+    pasur = new_game(seed=3, player_count=player_count)
+    tracker = KnowledgeTracker(pasur)
+
+    def step():
+        fresh = KnowledgeTracker(Pasur.load_binary(pasur.dump_binary()))
+        assert tracker.hand_masks == fresh.hand_masks
+        assert tracker.hand_counts == fresh.hand_counts
+        assert tracker.public_mask & fresh.public_mask == fresh.public_mask
+        assert tracker.public_masks[BOARD] == pasur.board.cards_mask
+        assert_counts_match(tracker)
+        for player in pasur.players:
+            assert tracker.unknown_mask(player.identifier) & (pasur.board.cards_mask | player.cards_mask) == 0
+
+    play_random(pasur, step=step)
+
+
+def test_knight_put_back_is_known():
+    pasur = new_game(seed=0)
+    tracker = KnowledgeTracker(pasur)
+    deck_ids = [card.id for card in pasur.deck.list_all_cards()]
+    first = [card_id for card_id in reversed(deck_ids) if card_id not in [10, 2]][:11]
+    pasur.deal_cards(order=first + [10, 2])  # The jack of spades dealt last to the board, replaced by card 2
+
+    assert tracker.locations('0')[DECK] == 1 << 10
+    assert not tracker.unknown_mask('0') & 1 << 10
+    hands, deck_order = tracker.sample('0', random.Random(0))
+    assert deck_order[0] == 10
+    assert_counts_match(tracker)
+
+    play_random(pasur, until_last_deal=True)  # The knight is dealt last, in everybody's sight
+    holder = next(player for player in pasur.players if player.in_hand_mask & 1 << 10)
+    observer = next(player.identifier for player in pasur.players if player != holder)
+    assert tracker.locations(observer)[holder.identifier] & 1 << 10
+    hands, _ = tracker.sample(observer, random.Random(0))
+    assert 10 in hands[holder.identifier]
+    assert_counts_match(tracker)
+
+
+def test_sample_is_consistent():
+    pasur = new_game(seed=5, player_count=3)
+    pasur.deal_cards()
+    tracker = KnowledgeTracker(pasur)
+    observer = pasur.players[0]
+    rng = random.Random(0)
+    for _ in range(10):
+        hands, deck_order = tracker.sample(observer.identifier, rng)
+        assert sorted(hands) == ['1', '2']
+        assert [len(card_ids) for card_ids in hands.values()] == [4, 4]
+        sampled = [card_id for card_ids in hands.values() for card_id in card_ids] + deck_order
+        assert sorted(sampled) == mask_card_ids(tracker.unknown_mask(observer.identifier))
+    assert mask_count(tracker.unknown_mask(observer.identifier)) == 52 - 4 - 4
+
+
+def test_replayed_tracker_knows_knight_put_back():
+    pasur = new_game(seed=0)
+    deck_ids = [card.id for card in pasur.deck.list_all_cards()]
+    first = [card_id for card_id in reversed(deck_ids) if card_id not in [10, 2]][:11]
+    pasur.deal_cards(order=first + [10, 2])
+    actions = [pasur.last_action]
+
+    loaded = Pasur.load_binary(pasur.dump_binary())
+    assert not KnowledgeTracker(loaded).public_masks[DECK]
+    tracker = KnowledgeTracker.replayed(loaded, actions)
+    assert tracker.public_masks[DECK] == 1 << 10
+    assert tracker in loaded.listeners
+    assert KnowledgeTracker(loaded, public_masks=tracker.public_masks).unknown_mask('0') == tracker.unknown_mask('0')
+
+    play_random(loaded, until_last_deal=True)  # The replayed tracker follows the game from there
+    holder = next(player for player in loaded.players if player.in_hand_mask & 1 << 10)
+    observer = next(player.identifier for player in loaded.players if player != holder)
+    assert tracker.locations(observer)[holder.identifier] & 1 << 10
+    assert_counts_match(tracker)
+
+    assert not KnowledgeTracker.replayed(Pasur.load_binary(loaded.dump_binary()), actions).public_masks[DECK]
+
+
+@pytest.mark.parametrize('starter', ['0', '1'])
+def test_replayed_tracker_follows_starter(starter):
+    pasur = new_game(seed=4, player_count=3)
+    pasur.starter = pasur.players.get(starter)
+    deck_ids = [card.id for card in pasur.deck.list_all_cards()]
+    first = [card_id for card_id in reversed(deck_ids) if card_id not in [10, 2]][:15]
+    pasur.deal_cards(order=first + [10, 2])
+    actions = [pasur.last_action]
+    for _ in range(5):
+        player = pasur.player_in_turn
+        pasur.play_card(player, *RandomPolicy(seed=0).choose_move(pasur=pasur, player=player))
+        actions.append(pasur.last_action)
+
+    loaded = Pasur.load_binary(pasur.dump_binary())
+    with mock.patch.object(KnowledgeTracker, '__init__', autospec=True, side_effect=KnowledgeTracker.__init__) as init:
+        tracker = KnowledgeTracker.replayed(loaded, actions)
+    assert init.call_count == 1  # Not created again from the state
+    assert tracker.public_masks[DECK] == 1 << 10
+    assert tracker.hand_masks == {player.identifier: player.in_hand_mask for player in loaded.players}
@@ -1,9 +1,14 @@
+import base64
 import json
-from typing import Union, List
+import random
+import struct
+from functools import lru_cache
+from typing import Union, List, Tuple
 
 from djchoices import DjangoChoices, ChoiceItem
 
-from game_engine.lib.card_holders import Deck, Card, Board, Player, CardHolder, CardHolderList, CLUBS, DIAMONDS
+from game_engine.lib.card_holders import Deck, Card, Board, Player, CardHolder, CardHolderList, CLUBS, DIAMONDS, \
+    NUMBER_MASKS, mask_card_ids
 
 
 class STATUS(DjangoChoices):
@@ -13,6 +18,12 @@ class STATUS(DjangoChoices):
     cancelled = ChoiceItem()
 
 
+class ACTION(DjangoChoices):
+    deal_cards = ChoiceItem()
+    play_card = ChoiceItem()
+    count_points = ChoiceItem()
+
+
 MAX_PLAYER_COUNT = 4
 WINNING_POINT_COUNT = 62
 
@@ -23,6 +34,24 @@ ACE_POINT = 1
 JACK_POINT = 1
 SUR_POINT = 5
 
+CODEC_JSON = 'json'
+CODEC_BINARY = 'binary'
+
+# Binary state layout, all integers unsigned big-endian:
+#   B version, B status, B starter, B last collector, B last played card, B holder count,
+#   B has seed flag, I seed (since version 2),
+#   per holder other than Deck and Board: B is-player flag, H name length, utf-8 name
+#   B sur count, B holder per sur, B last collected count, B card id per last collected card,
+#   B card count, per card in holder order: B card id (+ 0x80 if collected), B holder
+# Holders are indexed 0 = Deck, 1 = Board and 2.. the rest in `card_holders` order. NONE marks a missing value.
+BINARY_VERSION = 2
+BINARY_NONE = 0xFF
+BINARY_COLLECTED_FLAG = 0x80
+_BINARY_STATUSES = [STATUS.pending, STATUS.ongoing, STATUS.finished, STATUS.cancelled]
+
+NUMERAL_MASK = sum(NUMBER_MASKS[number] for number in range(1, 11))
+JACK_COLLECTABLE_MASK = NUMERAL_MASK | NUMBER_MASKS[11]
+
 
 class PasurIllegalAction(Exception):
     pass
@@ -39,21 +68,28 @@ class Pasur:
             last_played_card: Card=None,
             last_collected_cards: List[Card]=None,
             status=None,
+            seed=None,
     ):
         self.card_holders = card_holders
+        self.seed = seed  # Seed the deck was shuffled with, None for games created before decks were seeded
         self.starter = starter
         self.surs = surs or []
         self.status = status or STATUS.pending
         self.last_collector: Player = last_collector
         self.last_played_card = last_played_card
         self.last_collected_cards = last_collected_cards or []
+        self.last_action: Tuple[str, dict] = None  # (ACTION, payload) of the latest action, see `apply_action`
+        # Notified of every card dealt, knight put back and card played, see `game_engine.lib.knowledge`
+        self.listeners: List = []
         if not (Board in card_holders and Deck in card_holders):
             raise SyntaxError('There has to be a Deck and a Board in the player set')
 
     @staticmethod
-    def create_new_game() -> "Pasur":
-        deck = Deck.generate_fresh_set_of_cards()
-        return Pasur(card_holders=CardHolderList(deck, Board()))
+    def create_new_game(seed=None) -> "Pasur":
+        if seed is None:
+            seed = random.getrandbits(32)
+        deck = Deck.generate_fresh_set_of_cards(seed=seed)
+        return Pasur(card_holders=CardHolderList(deck, Board()), seed=seed)
 
     @staticmethod
     def load_json(data: Union[str, dict]) -> "Pasur":
@@ -94,7 +130,8 @@ class Pasur:
 
         status = data.get('status')
 
-        return Pasur(
+        pasur = Pasur(
+            seed=data.get('seed'),
             card_holders=players,
             starter=starter,
             surs=surs,
@@ -103,6 +140,8 @@ class Pasur:
             last_collected_cards=last_collected_cards,
             status=status,
         )
+        pasur.seed_unseeded_deck()
+        return pasur
 
     def dump_json(self):
         cards = []
@@ -123,9 +162,116 @@ class Pasur:
             'last_collected_cards': [c.id for c in self.last_collected_cards],
             'status': self.status,
             'starter': self.starter.identifier if self.starter else None,
+            'seed': self.seed,
         }
         return json.dumps(output)
 
+    def dump_binary(self) -> bytes:
+        holders = [self.deck, self.board] + [ch for ch in self.card_holders if ch != Deck and ch != Board]
+        holder_indexes = {ch.identifier: index for index, ch in enumerate(holders)}
+
+        def holder_index(card_holder):
+            return holder_indexes[card_holder.identifier] if card_holder else BINARY_NONE
+
+        output = bytearray(struct.pack(
+            '>BBBBBB',
+            BINARY_VERSION,
+            _BINARY_STATUSES.index(self.status),
+            holder_index(self.starter),
+            holder_index(self.last_collector),
+            self.last_played_card.id if self.last_played_card else BINARY_NONE,
+            len(holders) - 2,
+        ))
+        output += struct.pack('>BI', self.seed is not None, self.seed or 0)
+        for card_holder in holders[2:]:
+            name = str(card_holder.identifier).encode('utf-8')
+            output += struct.pack('>BH', isinstance(card_holder, Player), len(name)) + name
+        output.append(len(self.surs))
+        output += bytes(holder_index(p) for p in self.surs)
+        output.append(len(self.last_collected_cards))
+        output += bytes(c.id for c in self.last_collected_cards)
+
+        cards = bytearray()
+        for index, card_holder in enumerate(holders):
+            for card in card_holder.list_all_cards():
+                cards.append(card.id | (BINARY_COLLECTED_FLAG if card.collected else 0))
+                cards.append(index)
+        output.append(len(cards) // 2)
+        output += cards
+        return bytes(output)
+
+    @staticmethod
+    def load_binary(data: bytes) -> "Pasur":
+        data = bytes(data)
+        version, status, starter, last_collector, last_played_card, holder_count = struct.unpack_from('>BBBBBB', data)
+        if version not in [1, BINARY_VERSION]:
+            raise ValueError('Unsupported binary Pasur version: {}'.format(version))
+        offset = 6
+        seed = None
+        if version >= 2:
+            has_seed, seed = struct.unpack_from('>BI', data, offset)
+            seed = seed if has_seed else None
+            offset += 5
+
+        holders = CardHolderList(Deck(), Board())
+        for _ in range(holder_count):
+            is_player, name_length = struct.unpack_from('>BH', data, offset)
+            offset += 3
+            name = data[offset:offset + name_length].decode('utf-8')
+            offset += name_length
+            holders.append(Player(player_id=name) if is_player else CardHolder(identifier=name))
+
+        sur_count = data[offset]
+        surs = [holders[index] for index in data[offset + 1:offset + 1 + sur_count]]
+        offset += 1 + sur_count
+        last_collected_count = data[offset]
+        last_collected_ids = data[offset + 1:offset + 1 + last_collected_count]
+        offset += 1 + last_collected_count
+
+        card_count = data[offset]
+        offset += 1
+        for card_byte, index in zip(data[offset:offset + 2 * card_count:2], data[offset + 1:offset + 2 * card_count:2]):
+            holders[index].add_card(Card(
+                card_id=card_byte & ~BINARY_COLLECTED_FLAG,
+                collected=bool(card_byte & BINARY_COLLECTED_FLAG),
+            ))
+
+        pasur = Pasur(
+            card_holders=holders,
+            starter=holders[starter] if starter != BINARY_NONE else None,
+            surs=surs,
+            last_collector=holders[last_collector] if last_collector != BINARY_NONE else None,
+            last_played_card=holders.get_card(last_played_card) if last_played_card != BINARY_NONE else None,
+            last_collected_cards=[holders.get_card(card_id=c) for c in last_collected_ids],
+            status=_BINARY_STATUSES[status],
+            seed=seed,
+        )
+        pasur.seed_unseeded_deck()
+        return pasur
+
+    def seed_unseeded_deck(self):
+        """
+        States saved before decks were seeded keep their deck in card id order, which `Deck.pop_card` would deal in
+        that order. Gives them a seed and shuffles the remaining deck with it once.
+        """
+        if self.seed is None:
+            self.seed = random.getrandbits(32)
+            self.deck.shuffle(random.Random(self.seed))
+
+    def dump(self, codec=CODEC_JSON) -> Union[str, bytes]:
+        if codec == CODEC_BINARY:
+            return self.dump_binary()
+        return self.dump_json()
+
+    @staticmethod
+    def load(data: Union[str, bytes, dict]) -> "Pasur":
+        """Loads either codec: bytes are binary, text is json or base64 encoded binary"""
+        if isinstance(data, (bytes, bytearray, memoryview)):
+            return Pasur.load_binary(data)
+        if isinstance(data, str) and not data.lstrip().startswith('{'):
+            return Pasur.load_binary(base64.b64decode(data))
+        return Pasur.load_json(data)
+
     @property
     def deck(self) -> Deck:
         # noinspection PyTypeChecker
@@ -174,11 +320,14 @@ class Pasur:
         if player not in self.card_holders:
             self.card_holders.append(player)
 
-    def give_card_from_deck(self, to_card_holder: Union[Player, Board]):
-        self.deck.pop_card(to_card_holder=to_card_holder)
+    def give_card_from_deck(self, to_card_holder: Union[Player, Board], card_id=None) -> Card:
+        return self.deck.pop_card(to_card_holder=to_card_holder, card_id=card_id)
 
-    def deal_cards(self):
+    def deal_cards(self, order: List[int]=None):
+        """Deals from the deck, or in the recorded `order` of a previous deal when replaying it"""
         deal_to = self.players
+        draw_order = iter(order) if order is not None else None
+        dealt_order = []
 
         if not (2 <= len(deal_to) <= 4):
             raise PasurIllegalAction('Need to be 2-4 players to play')
@@ -187,6 +336,8 @@ class Pasur:
             if player.cards_count_hand() > 0:
                 raise PasurIllegalAction('Not allowed to deal cards while a player still has cards in hand')
 
+        self.last_action = (ACTION.deal_cards, {'order': dealt_order})
+
         if self.deck.remaining_cards() == 0:
             self.status = STATUS.finished
             return
@@ -195,14 +346,26 @@ class Pasur:
             deal_to.append(self.board)
             self.status = STATUS.ongoing
 
+        def draw(to_card_holder):
+            card = self.give_card_from_deck(
+                to_card_holder=to_card_holder,
+                card_id=next(draw_order) if draw_order else None,
+            )
+            dealt_order.append(card.id)
+            for listener in self.listeners:
+                listener.card_dealt(to_card_holder, card)
+
         for ch in deal_to:
             for _ in range(4):
-                self.give_card_from_deck(to_card_holder=ch)
+                draw(to_card_holder=ch)
             if isinstance(ch, Board):
                 if self.board.has_knight():
                     knight = [c for c in self.board.list_all_cards() if c.number == 11][0]
                     self.board.move_card(card=knight, to_card_holder=self.deck)
-                    self.give_card_from_deck(to_card_holder=self.board)
+                    self.deck.put_card_at_bottom(card=knight)
+                    for listener in self.listeners:
+                        listener.knight_returned(knight)
+                    draw(to_card_holder=self.board)
                     if self.board.has_knight():
                         self.terminate_game()
 
@@ -213,6 +376,11 @@ class Pasur:
             raise PasurIllegalAction('Move not allowed')
         player.move_card(card=card, to_card_holder=self.board)
         self.last_played_card = card
+        self.last_action = (ACTION.play_card, {
+            'player': player.identifier,
+            'card': card.id,
+            'collect_cards': [c.id for c in collect_cards or []],
+        })
         if collect_cards:
             self.board.move_card(card=card, to_card_holder=player)
             card.set_collected()
@@ -226,47 +394,48 @@ class Pasur:
                 self.surs.append(player)
         else:
             self.last_collected_cards = []
+        for listener in self.listeners:
+            listener.card_played(player, card, collect_cards or [])
 
     def terminate_game(self):
         self.status = STATUS.cancelled
 
+    def apply_action(self, action, payload: dict):
+        """Replays an action recorded from `last_action`"""
+        if action == ACTION.deal_cards:
+            return self.deal_cards(order=payload['order'])
+        if action == ACTION.play_card:
+            return self.play_card(
+                player=self.card_holders.get(payload['player']),
+                card=self.card_holders.get_card(card_id=payload['card']),
+                collect_cards=[self.board.get(card_id) for card_id in payload['collect_cards']],
+            )
+        if action == ACTION.count_points:
+            return self.count_points()
+        raise PasurIllegalAction('Unknown action: {}'.format(action))
+
+    def legal_moves(self, player: Player=None) -> List[Tuple[Card, List[Card]]]:
+        """All legal (card, collect_cards) moves of the player in turn, empty if `player` is not in turn"""
+        player_in_turn = self.player_in_turn
+        if player is not None and player != player_in_turn:
+            return []
+        moves = []
+        for card in player_in_turn.list_in_hand_cards():
+            for collect_mask in legal_collect_masks(board_mask=self.board.cards_mask, number=card.number):
+                moves.append((card, [self.board.get(card_id) for card_id in mask_card_ids(collect_mask)]))
+        return moves
+
     def validate_move(self, card: Card, collect_cards: List[Card]=None):
-        if collect_cards:
-            if card.number <= 10:
-                card_sum = card.number
-                for cc in collect_cards:
-                    if cc not in self.board.list_all_cards():
-                        raise PasurIllegalAction('Not allowed collect card that is not on the board')
-                    if cc.number > 10:
-                        return False
-                    card_sum += cc.number
-                return card_sum == 11
-            if card.number == 11:
-                for c in self.board.list_all_cards():
-                    if c.number > 11:
-                        if c in collect_cards:
-                            return False
-                    elif c not in collect_cards:
-                        return False
-                return True
-            if card.number >= 12:
-                return len(collect_cards) == 1 and collect_cards[0].number == card.number
-        else:
-            # Player tried to not collect any cards, see if can find a possible way to collect cards.
-            if card.number <= 10:
-                if _find_possible_11(current_sum=card.number, cards=self.board.list_all_cards()):
-                    return False
-            if card.number == 11:
-                for c in self.board.list_all_cards():
-                    if c.number <= 10:
-                        return False
-            if card.number >= 12:
-                for c in self.board.list_all_cards():
-                    if c.number == card.number:
-                        return False
-        return True
+        collect_mask = 0
+        for cc in collect_cards or []:
+            if not self.board.has_card(cc):
+                raise PasurIllegalAction('Not allowed collect card that is not on the board')
+            collect_mask |= cc.bit
+        return collect_mask in legal_collect_masks(board_mask=self.board.cards_mask, number=card.number)
 
     def count_points(self):
+        if self.status in [STATUS.finished, STATUS.cancelled]:
+            raise PasurIllegalAction('Cannot count points, the game is {}.'.format(self.status))
         if self.deck.remaining_cards() > 0:
             raise PasurIllegalAction('Cannot count points, deck has cards left.')
         for player in self.players:
@@ -280,6 +449,14 @@ class Pasur:
             for card in self.board.list_all_cards():
                 self.board.move_card(card=card, to_card_holder=self.last_collector)
 
+        player_points = self.player_points()
+        self.status = STATUS.finished
+        self.last_action = (ACTION.count_points, {})
+
+        return player_points
+
+    def player_points(self):
+        """Points of the cards each player holds and of the surs, the result of a counted game"""
         player_points = {player.identifier: 0 for player in self.players}
         clubs_rank = sorted(self.players, key=lambda p: p.clubs_count(), reverse=True)
         if clubs_rank[0].clubs_count() != clubs_rank[1].clubs_count():  # Two top clubs owners has different clubs count
@@ -305,22 +482,49 @@ class Pasur:
             for player_identifier, sur_count in surs_per_player.items():
                 player_points[player_identifier] += (sur_count - lowest_sur_count) * SUR_POINT
 
-        self.status = STATUS.finished
-
         return player_points
 
 
+@lru_cache(maxsize=8192)
+def legal_collect_masks(board_mask: int, number: int) -> Tuple[int, ...]:
+    """
+    Masks of the board cards that may be collected by playing a card of `number`, 0 meaning no collect.
+    Memoized on the board composition, so repeated lookups for the same board are free.
+    """
+    if number <= 10:
+        numeral_cards = sorted(
+            ((card_id % 13 + 1, card_id) for card_id in mask_card_ids(board_mask & NUMERAL_MASK)),
+        )
+        collect_masks = tuple(_subset_sum_masks(cards=numeral_cards, start=0, remaining=11 - number, mask=0))
+        return collect_masks or (0, )
+    if number == 11:
+        collect_masks = ()
+        if board_mask & JACK_COLLECTABLE_MASK:
+            collect_masks += (board_mask & JACK_COLLECTABLE_MASK, )
+        if not board_mask & NUMERAL_MASK:
+            collect_masks += (0, )
+        return collect_masks
+    same_number_ids = mask_card_ids(board_mask & NUMBER_MASKS[number])
+    return tuple(1 << card_id for card_id in same_number_ids) or (0, )
+
+
+def _subset_sum_masks(cards: List[Tuple[int, int]], start: int, remaining: int, mask: int):
+    """Yields masks of every subset of `cards[start:]` (sorted (number, card_id) pairs) summing to `remaining`"""
+    for index in range(start, len(cards)):
+        number, card_id = cards[index]
+        if number > remaining:
+            break
+        if number == remaining:
+            yield mask | (1 << card_id)
+        else:
+            yield from _subset_sum_masks(cards=cards, start=index + 1, remaining=remaining - number,
+                                         mask=mask | (1 << card_id))
+
+
 def _find_possible_11(current_sum, cards: List[Card]):
     if current_sum == 11:
         return True
-    elif current_sum > 11:
-        return False
-    elif cards:
-        for c in cards:
-            if _find_possible_11(
-                    current_sum=current_sum + c.number,
-                    cards=[c2 for c2 in cards if c2 != c]
-            ):
-                return True
+    if current_sum > 11:
         return False
-    return False
+    numeral_cards = sorted((c.number, c.id) for c in cards if c.number <= 10)
+    return next(_subset_sum_masks(cards=numeral_cards, start=0, remaining=11 - current_sum, mask=0), None) is not None
@@ -0,0 +1,224 @@
+"""
+Lockstep engine playing many Pasur games at once on NumPy arrays, for bulk simulation.
+
+It follows the rules of `game_engine.lib.pasur.Pasur` exactly, see `pasur_batch_test.py` for the cross-check. All games
+in a batch have the same number of players and the first player starts, so every game deals and plays its turns at the
+same time. Cards are drawn from the start of each game's deck order, a knight put back from the board is drawn last,
+which is the object engine's `Deck` order reversed.
+"""
+from typing import List, Tuple
+
+import numpy as np
+
+from game_engine.lib.card_holders import COLORS, CLUBS, mask_card_ids
+from game_engine.lib.pasur import legal_collect_masks, MAX_PLAYER_COUNT, CLUBS_WIN_POINT, CLUBS_TWO_POINT, \
+    DIAMONDS_TEN_POINT, ACE_POINT, JACK_POINT, SUR_POINT, DIAMONDS, PasurIllegalAction
+
+# Owners, same indexes as the binary Pasur codec
+DECK_OWNER = 0
+BOARD_OWNER = 1
+FIRST_PLAYER_OWNER = 2
+
+PENDING = 0
+ONGOING = 1
+FINISHED = 2
+CANCELLED = 3
+
+CARD_IDS = np.arange(52)
+CARD_NUMBERS = CARD_IDS % 13 + 1
+CARD_BITS = np.left_shift(np.int64(1), CARD_IDS.astype(np.int64))
+IS_KNIGHT = CARD_NUMBERS == 11
+IS_CLUBS = CARD_IDS // 13 == COLORS.index(CLUBS)
+CARD_POINTS = (
+    (CARD_NUMBERS == 1) * ACE_POINT +
+    IS_KNIGHT * JACK_POINT +
+    ((CARD_NUMBERS == 2) & IS_CLUBS) * CLUBS_TWO_POINT +
+    ((CARD_NUMBERS == 10) & (CARD_IDS // 13 == COLORS.index(DIAMONDS))) * DIAMONDS_TEN_POINT
+)
+
+
+def masks_to_cards(masks: np.ndarray) -> np.ndarray:
+    """(N,) card masks to a (N, 52) boolean array"""
+    return (np.right_shift(masks[:, None], CARD_IDS.astype(np.int64)) & 1).astype(bool)
+
+
+def cards_to_masks(cards: np.ndarray) -> np.ndarray:
+    """(N, 52) boolean array to (N,) card masks"""
+    return cards.astype(np.int64) @ CARD_BITS
+
+
+def legal_moves_for_masks(board_mask: int, hand_mask: int) -> List[Tuple[int, int]]:
+    """Legal (card id, collect mask) moves for a hand, ordered by card id and mask"""
+    return [
+        (card_id, collect_mask)
+        for card_id in mask_card_ids(hand_mask)
+        for collect_mask in sorted(legal_collect_masks(board_mask=board_mask, number=card_id % 13 + 1))
+    ]
+
+
+class PasurBatch:
+
+    def __init__(self, game_count, player_count, deck_orders: np.ndarray=None, seed=None):
+        if not (2 <= player_count <= MAX_PLAYER_COUNT):
+            raise PasurIllegalAction('Need to be 2-4 players to play')
+        if deck_orders is None:
+            deck_orders = np.random.default_rng(seed).permuted(np.tile(CARD_IDS, (game_count, 1)), axis=1)
+        self.game_count = game_count
+        self.player_count = player_count
+
+        # One spare slot at the end of the deck for a knight put back during the first deal
+        self.deck = np.zeros((game_count, 53), dtype=np.int8)
+        self.deck[:, :52] = deck_orders
+        self.deck_top = np.zeros(game_count, dtype=np.int8)
+        self.deck_end = np.full(game_count, 52, dtype=np.int8)
+
+        self.owner = np.full((game_count, 52), DECK_OWNER, dtype=np.int8)
+        self.collected = np.zeros((game_count, 52), dtype=bool)
+        self.turn = np.zeros(game_count, dtype=np.int8)  # Seat in turn
+        self.surs = np.zeros((game_count, player_count), dtype=np.int16)
+        self.last_collector = np.full(game_count, -1, dtype=np.int8)
+        self.status = np.full(game_count, PENDING, dtype=np.int8)
+
+    @property
+    def active(self) -> np.ndarray:
+        return (self.status == PENDING) | (self.status == ONGOING)
+
+    def deck_remaining(self) -> np.ndarray:
+        return self.deck_end - self.deck_top
+
+    def board_masks(self) -> np.ndarray:
+        return cards_to_masks(self.owner == BOARD_OWNER)
+
+    def hand_masks(self) -> np.ndarray:
+        """(N, player_count) masks of the cards in hand"""
+        in_hand = ~self.collected
+        return np.stack([
+            cards_to_masks((self.owner == FIRST_PLAYER_OWNER + seat) & in_hand) for seat in range(self.player_count)
+        ], axis=1)
+
+    def _draw(self, games: np.ndarray, to_owner: np.ndarray) -> np.ndarray:
+        cards = self.deck[games, self.deck_top[games]]
+        self.deck_top[games] += 1
+        self.owner[games, cards] = to_owner
+        return cards
+
+    def deal(self):
+        """Deals to every active game, which all must have empty hands and cards left in the deck"""
+        games = np.flatnonzero(self.active)
+        if np.any(self.deck_remaining()[games] == 0):
+            raise PasurIllegalAction('Deck is empty, count points instead')
+        first_deal = games[self.status[games] == PENDING]
+
+        for seat in range(self.player_count):
+            for _ in range(4):
+                self._draw(games, FIRST_PLAYER_OWNER + seat)
+
+        board_cards = np.stack([self._draw(first_deal, BOARD_OWNER) for _ in range(4)], axis=1)
+        knights = IS_KNIGHT[board_cards]
+        with_knight = knights.any(axis=1)
+        games_with_knight = first_deal[with_knight]
+        knight = board_cards[with_knight, knights[with_knight].argmax(axis=1)]  # First knight dealt to the board
+        self.owner[games_with_knight, knight] = DECK_OWNER
+        self.deck[games_with_knight, self.deck_end[games_with_knight]] = knight
+        self.deck_end[games_with_knight] += 1
+        self._draw(games_with_knight, BOARD_OWNER)
+        still_knight = ((self.owner[games_with_knight] == BOARD_OWNER) & IS_KNIGHT).any(axis=1)
+
+        self.status[first_deal] = ONGOING
+        self.status[games_with_knight[still_knight]] = CANCELLED
+        self.turn[games] = 0
+
+    def legal_moves(self, game) -> List[Tuple[int, int]]:
+        """Legal (card id, collect mask) moves of the seat in turn, ordered by card id and mask"""
+        owner = self.owner[game:game + 1]
+        hand = (owner == FIRST_PLAYER_OWNER + self.turn[game]) & ~self.collected[game:game + 1]
+        return legal_moves_for_masks(
+            board_mask=int(cards_to_masks(owner == BOARD_OWNER)[0]),
+            hand_mask=int(cards_to_masks(hand)[0]),
+        )
+
+    def seat_in_turn_hand_masks(self) -> np.ndarray:
+        return self.hand_masks()[np.arange(self.game_count), self.turn]
+
+    def random_moves(self, rng: np.random.Generator) -> Tuple[np.ndarray, np.ndarray]:
+        """A uniformly random legal move per game, -1 card for games that are not active"""
+        cards = np.full(self.game_count, -1, dtype=np.int64)
+        collect_masks = np.zeros(self.game_count, dtype=np.int64)
+        board_masks = self.board_masks().tolist()
+        hand_masks = self.seat_in_turn_hand_masks().tolist()
+        games = np.flatnonzero(self.active)
+        choices = rng.random(len(games))
+        for game, choice in zip(games.tolist(), choices.tolist()):
+            moves = legal_moves_for_masks(board_mask=board_masks[game], hand_mask=hand_masks[game])
+            cards[game], collect_masks[game] = moves[int(choice * len(moves))]
+        return cards, collect_masks
+
+    def play(self, cards: np.ndarray, collect_masks: np.ndarray, validate=True):
+        """Plays `cards[game]` collecting `collect_masks[game]` for the seat in turn of each active game"""
+        games = np.flatnonzero(self.active)
+        if validate:
+            for game in games:
+                if (int(cards[game]), int(collect_masks[game])) not in self.legal_moves(game):
+                    raise PasurIllegalAction('Move not allowed in game {}'.format(game))
+        cards = cards[games]
+        collect_masks = collect_masks[games]
+        players = FIRST_PLAYER_OWNER + self.turn[games]
+
+        collecting = collect_masks != 0
+        self.owner[games, cards] = np.where(collecting, players, BOARD_OWNER)
+        self.collected[games[collecting], cards[collecting]] = True
+        collect_cards = masks_to_cards(collect_masks[collecting])
+        collecting_games = games[collecting]
+        self.owner[collecting_games] = np.where(
+            collect_cards, players[collecting][:, None], self.owner[collecting_games])
+        self.collected[collecting_games] |= collect_cards
+        self.last_collector[collecting_games] = self.turn[collecting_games]
+
+        board_empty = ~(self.owner[collecting_games] == BOARD_OWNER).any(axis=1)
+        sur = board_empty & ~IS_KNIGHT[cards[collecting]] & (self.deck_remaining()[collecting_games] > 0)
+        self.surs[collecting_games[sur], self.turn[collecting_games[sur]]] += 1
+
+        self.turn[games] = (self.turn[games] + 1) % self.player_count
+
+    def count_points(self) -> np.ndarray:
+        """Finishes the active games, returns (N, player_count) points, zero for games that were not active"""
+        games = np.flatnonzero(self.active)
+        if np.any(self.deck_remaining()[games] > 0) or np.any(self.hand_masks()[games]):
+            raise PasurIllegalAction('Cannot count points, there are cards left to play')
+
+        with_collector = games[self.last_collector[games] >= 0]
+        on_board = self.owner[with_collector] == BOARD_OWNER
+        collector = FIRST_PLAYER_OWNER + self.last_collector[with_collector]
+        self.owner[with_collector] = np.where(on_board, collector[:, None], self.owner[with_collector])
+        self.collected[with_collector] |= on_board
+
+        points = np.zeros((self.game_count, self.player_count), dtype=np.int64)
+        owned = np.stack([self.owner[games] == FIRST_PLAYER_OWNER + seat for seat in range(self.player_count)], axis=1)
+        points[games] = owned.astype(np.int64) @ CARD_POINTS
+
+        clubs = (owned & IS_CLUBS).sum(axis=2)
+        sorted_clubs = np.sort(clubs, axis=1)
+        clubs_winner = sorted_clubs[:, -1] != sorted_clubs[:, -2]
+        points[games[clubs_winner], clubs.argmax(axis=1)[clubs_winner]] += CLUBS_WIN_POINT
+
+        surs = self.surs[games]
+        points[games] += (surs - surs.min(axis=1, keepdims=True)) * SUR_POINT
+
+        self.status[games] = FINISHED
+        return points
+
+    def play_random(self, rng: np.random.Generator) -> np.ndarray:
+        """Plays all games to the end with random moves, returns the points as `count_points`"""
+        hand_size = 4
+        while np.any(self.active) and np.any(self.deck_remaining()[self.active] > 0):
+            self.deal()
+            for _ in range(hand_size * self.player_count):
+                if not np.any(self.active):
+                    break
+                self.play(*self.random_moves(rng), validate=False)
+        return self.count_points()
+
+    def owner_masks(self, game) -> List[int]:
+        """Masks of the cards owned by each owner index of `game`, for comparison with other engines"""
+        return [sum(1 << card_id for card_id in np.flatnonzero(self.owner[game] == owner).tolist())
+                for owner in range(FIRST_PLAYER_OWNER + self.player_count)]
@@ -0,0 +1,77 @@
+import numpy as np
+import pytest
+
+from game_engine.lib.card_holders import Board, Card, CardHolderList, Deck, Player
+from game_engine.lib.pasur import Pasur, STATUS
+from game_engine.lib.pasur_batch import PasurBatch, CANCELLED, FINISHED, BOARD_OWNER, DECK_OWNER, \
+    FIRST_PLAYER_OWNER
+
+
+def create_object_game(deck_order, player_count) -> Pasur:
+    deck = Deck()
+    for card_id in reversed(deck_order):  # The object engine draws from the end of the deck
+        deck.add_card(Card(card_id=int(card_id)))
+    pasur = Pasur(card_holders=CardHolderList(deck, Board()))
+    for seat in range(player_count):
+        pasur.add_player(Player(str(seat)))
+    return pasur
+
+
+def assert_same_cards(batch: PasurBatch, game, pasur: Pasur):
+    holders = [pasur.deck, pasur.board] + list(pasur.players)
+    assert batch.owner_masks(game) == [holder.cards_mask for holder in holders]
+    assert int(batch.hand_masks()[game, batch.turn[game]]) == pasur.player_in_turn.in_hand_mask
+
+
+@pytest.mark.parametrize('player_count', [2, 3, 4])
+def test_batch_matches_object_engine(player_count):
+    """Plays the same random games in both engines and compares every state and the final points"""
+    game_count = 40
+    batch = PasurBatch(game_count=game_count, player_count=player_count, seed=player_count)
+    games = [create_object_game(batch.deck[game, :52], player_count) for game in range(game_count)]
+    rng = np.random.default_rng(player_count)
+
+    while np.any(batch.active) and np.any(batch.deck_remaining()[batch.active] > 0):
+        batch.deal()
+        for game, pasur in enumerate(games):
+            if pasur.status in [STATUS.pending, STATUS.ongoing]:
+                pasur.deal_cards()
+            assert (pasur.status == STATUS.cancelled) == (batch.status[game] == CANCELLED)
+
+        for _ in range(4 * player_count):
+            cards, collect_masks = batch.random_moves(rng)
+            for game in np.flatnonzero(batch.active):
+                pasur = games[game]
+                object_moves = sorted(
+                    (card.id, sum(c.bit for c in collect_cards)) for card, collect_cards in pasur.legal_moves()
+                )
+                assert object_moves == batch.legal_moves(game)
+                card = pasur.player_in_turn.get(int(cards[game]))
+                pasur.play_card(
+                    player=pasur.player_in_turn,
+                    card=card,
+                    collect_cards=[pasur.board.get(int(card_id)) for card_id in np.flatnonzero(
+                        (int(collect_masks[game]) >> np.arange(52)) & 1)],
+                )
+            batch.play(cards, collect_masks)
+            for game in np.flatnonzero(batch.active):
+                assert_same_cards(batch, game, games[game])
+
+    active = np.flatnonzero(batch.active)
+    points = batch.count_points()
+    for game in active:
+        object_points = games[game].count_points()
+        assert [object_points[str(seat)] for seat in range(player_count)] == points[game].tolist()
+        assert batch.status[game] == FINISHED
+
+
+def test_play_random():
+    batch = PasurBatch(game_count=200, player_count=2, seed=1)
+    points = batch.play_random(rng=np.random.default_rng(1))
+    finished = batch.status == FINISHED
+    assert np.all(finished | (batch.status == CANCELLED))
+    assert np.all(points[~finished] == 0)
+    assert np.all(points[finished].sum(axis=1) >= 13)
+    assert not np.any(batch.owner[finished] == DECK_OWNER)
+    assert not np.any((batch.owner[finished] >= FIRST_PLAYER_OWNER) & ~batch.collected[finished])
+    assert not np.any(batch.owner[finished] == BOARD_OWNER)
@@ -1,11 +1,13 @@
+import json
+import random
+from contextlib import contextmanager
 from typing import List
 
 import pytest
-from mock import patch
 
-from game_engine.lib.card_holders import Player, Card
-from game_engine.lib.pasur import Pasur, _find_possible_11, CLUBS_WIN_POINT, SUR_POINT, JACK_POINT, ACE_POINT, \
-    DIAMONDS_TEN_POINT, CLUBS_TWO_POINT
+from game_engine.lib.card_holders import Player, Card, CardHolder
+from game_engine.lib.pasur import Pasur, PasurIllegalAction, STATUS, _find_possible_11, legal_collect_masks, \
+    CLUBS_WIN_POINT, SUR_POINT, JACK_POINT, ACE_POINT, DIAMONDS_TEN_POINT, CLUBS_TWO_POINT
 
 
 @pytest.fixture()
@@ -22,7 +24,7 @@ def pasur_with_two_players(pasur: Pasur):
 
 @pytest.fixture()
 def pasur_with_two_players_all_cards_played(pasur_with_two_players: Pasur):
-    for card in pasur_with_two_players.deck.list_all_cards():
+    for card in sorted(pasur_with_two_players.deck.list_all_cards(), key=lambda c: c.id):
         card.set_collected()
         pasur_with_two_players.deck.move_card(
             card=card,
@@ -71,6 +73,50 @@ def test_find_possible_11(card_value_on_hand, expected: bool):
     ]) is expected
 
 
+@pytest.mark.parametrize('board_card_ids, number, expected_collect_ids', [
+    ([0, 4, 11, 10, 7], 2, [{0, 7}]),  # A, 5, Q, J, 8
+    ([0, 4, 11, 10, 7], 7, []),
+    ([0, 13, 4, 17], 5, [{0, 4}, {13, 4}, {0, 17}, {13, 17}]),  # A, A, 5, 5
+    ([0, 13, 26, 1, 2], 5, [{0, 13, 26, 2}, {0, 1, 2}, {13, 1, 2}, {26, 1, 2}]),  # A, A, A, 2, 3
+    ([0, 11, 12], 11, [{0}]),  # Jack collects everything but queens and kings
+    ([10, 11], 11, [{10}, set()]),  # Jack on a board without numerals may also be played without collecting
+    ([11, 12], 11, [set()]),
+    ([11, 24, 12], 12, [{11}, {24}]),
+    ([12], 12, [set()]),
+])
+def test_legal_collect_masks(board_card_ids, number, expected_collect_ids):
+    board_mask = sum(1 << card_id for card_id in board_card_ids)
+    expected = sorted(sum(1 << card_id for card_id in collect_ids) for collect_ids in expected_collect_ids) or [0]
+    assert sorted(legal_collect_masks(board_mask=board_mask, number=number)) == expected
+
+
+def test_legal_moves_only_for_player_in_turn(pasur_with_two_players: Pasur):
+    with patch_card_pop_sequence(pasur=pasur_with_two_players,
+                                 sequence=[
+                                     7, 1, 9, 3,  # player 1
+                                     4, 5, 6, 8,  # player 2
+                                     2, 14, 27, 40,  # board
+                                 ]):
+        pasur_with_two_players.deal_cards()
+    player_1, player_2 = pasur_with_two_players.players
+    assert pasur_with_two_players.legal_moves(player=player_2) == []
+    moves = {
+        (card.id, frozenset(c.id for c in collect_cards))
+        for card, collect_cards in pasur_with_two_players.legal_moves(player=player_1)
+    }
+    # Hand is 8, 2, 10, 4 and board is 3, 2, 2, 2
+    assert moves == {
+        (7, frozenset({2})),
+        (1, frozenset({2, 14, 27, 40})),
+        (9, frozenset()),
+        (3, frozenset({2, 14, 27})),
+        (3, frozenset({2, 14, 40})),
+        (3, frozenset({2, 27, 40})),
+    }
+    for card, collect_cards in pasur_with_two_players.legal_moves():
+        assert pasur_with_two_players.validate_move(card=card, collect_cards=collect_cards)
+
+
 def test_play_card_no_collect(pasur_with_two_players: Pasur):
     player = pasur_with_two_players.players[0]
     with patch_card_pop_sequence(pasur=pasur_with_two_players,
@@ -160,15 +206,126 @@ def test_count_points(pasur_with_two_players_all_cards_played: Pasur):
     )
 
 
-def patch_card_pop_sequence(pasur: Pasur, sequence: List[int]):
-    sq = sequence.copy()
-
-    def return_numbers(*_, **__):
-        card_to_fake = sq.pop(0)
-        for index, card in enumerate(pasur.deck.list_all_cards()):
-            if card.id == card_to_fake:
-                return index
-    return patch(
-        target='game_engine.lib.card_holders.random.randint',
-        side_effect=return_numbers,
+def test_count_points_only_once(pasur_with_two_players_all_cards_played: Pasur):
+    pasur_with_two_players_all_cards_played.count_points()
+    with pytest.raises(PasurIllegalAction):
+        pasur_with_two_players_all_cards_played.count_points()
+
+
+def test_replay_actions(pasur_with_two_players: Pasur):
+    actions = []
+    pasur_with_two_players.deal_cards()
+    actions.append(pasur_with_two_players.last_action)
+    while pasur_with_two_players.status == STATUS.ongoing and not pasur_with_two_players.no_player_has_cards_on_hand:
+        card, collect_cards = pasur_with_two_players.legal_moves()[0]
+        pasur_with_two_players.play_card(
+            player=pasur_with_two_players.player_in_turn,
+            card=card,
+            collect_cards=collect_cards,
+        )
+        actions.append(pasur_with_two_players.last_action)
+
+    replayed = Pasur.create_new_game(seed=pasur_with_two_players.seed)
+    replayed.add_player(Player('1'))
+    replayed.add_player(Player('2'))
+    for action, payload in actions:
+        replayed.apply_action(action=action, payload=payload)
+    assert replayed.dump_json() == pasur_with_two_players.dump_json()
+
+
+def test_seeded_deck_is_reproducible():
+    first, second = Pasur.create_new_game(seed=42), Pasur.create_new_game(seed=42)
+    for pasur in [first, second]:
+        pasur.add_player(Player('1'))
+        pasur.add_player(Player('2'))
+        pasur.deal_cards()
+    assert first.seed == 42
+    assert first.dump_json() == second.dump_json()
+    assert Pasur.load_binary(first.dump_binary()).seed == 42
+    assert Pasur.load_json(first.dump_json()).seed == 42
+
+
+def test_knight_redrawn_from_board_goes_to_bottom(pasur_with_two_players: Pasur):
+    with patch_card_pop_sequence(pasur=pasur_with_two_players,
+                                 sequence=[
+                                     7, 1, 9, 3,  # player 1
+                                     4, 5, 6, 8,  # player 2
+                                     10, 14, 27, 40,  # board, with the jack of spades
+                                     2,
+                                 ]):
+        pasur_with_two_players.deal_cards()
+    assert not pasur_with_two_players.board.has_knight()
+    assert pasur_with_two_players.board.has_card(2)
+    assert pasur_with_two_players.deck.list_all_cards()[0] == Card(10)
+
+
+def test_load_binary_version_1(pasur_with_two_players: Pasur):
+    data = bytearray(pasur_with_two_players.dump_binary())
+    data[0] = 1
+    del data[6:11]  # Seed
+    loaded = Pasur.load_binary(bytes(data))
+    assert loaded.seed is not None
+    card_ids = [c.id for c in pasur_with_two_players.deck.list_all_cards()]
+    random.Random(loaded.seed).shuffle(card_ids)
+    assert [c.id for c in loaded.deck.list_all_cards()] == card_ids
+
+
+def test_unseeded_state_is_shuffled_on_load(pasur_with_two_players: Pasur):
+    data = json.loads(pasur_with_two_players.dump_json())
+    data['seed'] = None
+    data['cards'].sort(key=lambda card: card['card_id'])  # Decks were stored in card id order before seeds
+    loaded = Pasur.load_json(data)
+    assert loaded.seed is not None
+    loaded.deal_cards()
+    card_ids = list(range(52))
+    random.Random(loaded.seed).shuffle(card_ids)
+    assert [c.id for c in loaded.players[0].list_all_cards()] == card_ids[:-5:-1]
+    assert Pasur.load_json(loaded.dump_json()).seed == loaded.seed
+
+
+@pytest.mark.parametrize('dump, load', [
+    (Pasur.dump_json, Pasur.load_json),
+    (Pasur.dump_binary, Pasur.load_binary),
+    (Pasur.dump_binary, Pasur.load),
+    (Pasur.dump_json, Pasur.load),
+])
+def test_dump_and_load_round_trip(pasur_with_two_players: Pasur, dump, load):
+    player = pasur_with_two_players.players[0]
+    with patch_card_pop_sequence(pasur=pasur_with_two_players,
+                                 sequence=[
+                                     7, 1, 9, 3,  # player 1
+                                     4, 5, 6, 8,  # player 2
+                                     2, 14, 27, 40,  # board
+                                 ]):
+        pasur_with_two_players.deal_cards()
+    pasur_with_two_players.play_card(
+        player=player,
+        card=player.get(7),
+        collect_cards=[pasur_with_two_players.board.get(2)],
     )
+    pasur_with_two_players.surs.append(player)
+
+    loaded = load(dump(pasur_with_two_players))
+    assert loaded.dump_json() == pasur_with_two_players.dump_json()
+    assert loaded.last_played_card == Card(7)
+    assert loaded.last_collected_cards == [Card(2)]
+    assert loaded.last_collector == player
+    assert loaded.surs == [player]
+    assert loaded.players[0].card_count_collected() == 2
+
+
+def test_binary_state_is_compact(pasur_with_two_players: Pasur):
+    pasur_with_two_players.deal_cards()
+    assert len(pasur_with_two_players.dump_binary()) * 10 < len(pasur_with_two_players.dump_json())
+
+
+@contextmanager
+def patch_card_pop_sequence(pasur: Pasur, sequence: List[int]):
+    """Stacks the deck so that the next cards drawn are `sequence`"""
+    staging = CardHolder(identifier='staging')
+    cards = pasur.deck.list_all_cards()
+    for card in cards:
+        pasur.deck.move_card(card=card, to_card_holder=staging)
+    for card in [c for c in cards if c.id not in sequence] + [staging.get(card_id) for card_id in reversed(sequence)]:
+        staging.move_card(card=card, to_card_holder=pasur.deck)
+    yield
@@ -0,0 +1,64 @@
+import random
+from typing import List, Tuple
+
+from game_engine.lib.card_holders import Card, Player, CLUBS
+from game_engine.lib.pasur import Pasur, ACE_POINT, JACK_POINT, CLUBS_TWO_POINT, DIAMONDS_TEN_POINT, SUR_POINT, \
+    DIAMONDS
+
+Move = Tuple[Card, List[Card]]
+
+
+def card_points(card: Card) -> int:
+    """Points the card is worth when counting points, clubs majority and surs excluded"""
+    if card.number == 1:
+        return ACE_POINT
+    if card.number == 11:
+        return JACK_POINT
+    if card.number == 2 and card.color == CLUBS:
+        return CLUBS_TWO_POINT
+    if card.number == 10 and card.color == DIAMONDS:
+        return DIAMONDS_TEN_POINT
+    return 0
+
+
+class Policy:
+    """Chooses the move of a player in turn, one instance is used per seat"""
+    name = None
+
+    def __init__(self, seed=None):
+        self.random = random.Random(seed)
+
+    def choose_move(self, pasur: Pasur, player: Player) -> Move:
+        raise NotImplementedError
+
+
+class RandomPolicy(Policy):
+    name = 'random'
+
+    def choose_move(self, pasur: Pasur, player: Player) -> Move:
+        return self.random.choice(pasur.legal_moves(player=player))
+
+
+class GreedyPolicy(Policy):
+    """Plays the move with the most immediate value: points, surs, clubs and card count collected"""
+    name = 'greedy'
+
+    def choose_move(self, pasur: Pasur, player: Player) -> Move:
+        moves = pasur.legal_moves(player=player)
+        self.random.shuffle(moves)  # Random tie breaks
+        return max(moves, key=lambda move: self.move_value(pasur=pasur, move=move))
+
+    @staticmethod
+    def move_value(pasur: Pasur, move: Move) -> float:
+        card, collect_cards = move
+        if not collect_cards:
+            return -card_points(card)  # Prefer throwing away cards that are not worth anything
+        collected = [card] + collect_cards
+        value = sum(card_points(c) for c in collected)
+        value += 0.5 * len([c for c in collected if c.color == CLUBS]) + 0.1 * len(collected)
+        if len(collect_cards) == pasur.board.card_count and card.number != 11 and pasur.deck.card_count > 0:
+            value += SUR_POINT
+        return value
+
+
+POLICIES = {policy.name: policy for policy in [RandomPolicy, GreedyPolicy]}
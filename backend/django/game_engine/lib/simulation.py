@@ -0,0 +1,38 @@
+from typing import Dict, List, NamedTuple
+
+from game_engine.lib.card_holders import Player
+from game_engine.lib.pasur import Pasur, STATUS
+from game_engine.lib.policies import Policy
+
+
+class GameResult(NamedTuple):
+    status: str
+    action_count: int
+    points: Dict[str, int]  # Empty if the game was cancelled
+
+
+def play_game(policies: List[Policy], pasur: Pasur=None) -> GameResult:
+    """
+    Plays a full game without any database, seat `index` is played by `policies[index]` as player `str(index)`.
+    """
+    if pasur is None:
+        pasur = Pasur.create_new_game()
+        for index in range(len(policies)):
+            pasur.add_player(Player(player_id=str(index)))
+    seat_policies = {player.identifier: policy for player, policy in zip(pasur.players, policies)}
+
+    action_count = 0
+    points = {}
+    while pasur.status in [STATUS.pending, STATUS.ongoing]:
+        if pasur.no_player_has_cards_on_hand:
+            if pasur.deck.remaining_cards() == 0:
+                points = pasur.count_points()
+            else:
+                pasur.deal_cards()
+        else:
+            player = pasur.player_in_turn
+            card, collect_cards = seat_policies[player.identifier].choose_move(pasur=pasur, player=player)
+            pasur.play_card(player=player, card=card, collect_cards=collect_cards)
+        action_count += 1
+
+    return GameResult(status=pasur.status, action_count=action_count, points=points)
@@ -0,0 +1,23 @@
+import random
+
+import pytest
+
+from game_engine.lib.pasur import STATUS, ACE_POINT, JACK_POINT, CLUBS_TWO_POINT, DIAMONDS_TEN_POINT
+from game_engine.lib.policies import POLICIES
+from game_engine.lib.simulation import play_game
+
+
+@pytest.mark.parametrize('policy_names', [
+    ['random', 'random'],
+    ['greedy', 'random', 'greedy'],
+    ['greedy', 'greedy', 'greedy', 'greedy'],
+])
+def test_play_game(policy_names):
+    random.seed(0)
+    for seed in range(5):
+        result = play_game(policies=[POLICIES[name](seed=seed) for name in policy_names])
+        assert result.status in [STATUS.finished, STATUS.cancelled]
+        if result.status == STATUS.finished:
+            assert sorted(result.points) == [str(seat) for seat in range(len(policy_names))]
+            assert sum(result.points.values()) >= 4 * ACE_POINT + 4 * JACK_POINT + CLUBS_TWO_POINT + DIAMONDS_TEN_POINT
+            assert result.action_count > 52 // len(policy_names)
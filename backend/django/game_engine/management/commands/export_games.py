@@ -0,0 +1,38 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from game_engine.export import DEFAULT_BATCH_SIZE, DEFAULT_CHUNK_SIZE, NEW_CHECKPOINT, WRITERS, checkpoint_position, \
+    export_games, finished_games, read_checkpoint
+
+
+class Command(BaseCommand):
+    help = ('Exports the finished games in chunks of gzip NDJSON or NumPy .npz files, see game_engine.export. Runs '
+            'continue after the last game exported, in order of the time the games finished.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('output_dir')
+        parser.add_argument('--format', choices=list(WRITERS), default='ndjson')
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help='Games per file')
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                            help='Rows fetched from the database cursor at a time')
+        parser.add_argument('--restart', action='store_true',
+                            help='Export from the first game instead of continuing from the checkpoint')
+
+    def handle(self, *args, **options):
+        output_dir = options['output_dir']
+        os.makedirs(output_dir, exist_ok=True)
+        checkpoint = dict(NEW_CHECKPOINT) if options['restart'] else read_checkpoint(output_dir)
+        if checkpoint['last_game_id']:
+            self.stdout.write('Continuing after game {} finished at {}'.format(
+                checkpoint['last_game_id'], checkpoint.get('last_modified')))
+
+        records = finished_games(batch_size=options['batch_size'], **checkpoint_position(checkpoint))
+        try:
+            result = export_games(records=records, output_dir=output_dir, file_format=options['format'],
+                                  checkpoint=checkpoint, chunk_size=options['chunk_size'])
+        except ValueError as e:
+            raise CommandError(e)
+        self.stdout.write(self.style.SUCCESS('Exported {} games in {} chunks to {}'.format(
+            result['game_count'] - checkpoint['game_count'], result['chunk_count'] - checkpoint['chunk_count'],
+            output_dir)))
@@ -0,0 +1,40 @@
+# Generated by Django 2.2.28 on 2026-10-18 17:21
+
+import django.contrib.postgres.fields.jsonb
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game_engine', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='game',
+            name='action_sequence',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='game',
+            name='snapshot_sequence',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='GameAction',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('modified', models.DateTimeField(auto_now=True)),
+                ('sequence', models.PositiveIntegerField()),
+                ('action', models.CharField(choices=[('deal cards', 'deal cards'), ('play card', 'play card'), ('count points', 'count points')], max_length=30)),
+                ('payload', django.contrib.postgres.fields.jsonb.JSONField(default=dict)),
+                ('game', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='actions', to='game_engine.Game')),
+            ],
+            options={
+                'unique_together': {('game', 'sequence')},
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 2.2.28 on 2026-10-18 17:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game_engine', '0002_game_action_log'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='player',
+            name='is_bot',
+            field=models.BooleanField(default=False),
+        ),
+    ]
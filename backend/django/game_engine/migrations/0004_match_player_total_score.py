@@ -0,0 +1,32 @@
+# Generated by Django 2.2.28 on 2026-10-18 17:40
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Sum
+
+
+def sum_total_scores(apps, schema_editor):
+    MatchPlayer = apps.get_model('game_engine', 'MatchPlayer')
+    for match_player in MatchPlayer.objects.annotate(score_sum=Sum('scores__score')).filter(score_sum__isnull=False):
+        MatchPlayer.objects.filter(pk=match_player.pk).update(total_score=match_player.score_sum)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game_engine', '0003_player_is_bot'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='matchplayer',
+            name='total_score',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='gamematchplayerscore',
+            name='match_player',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='scores', to='game_engine.MatchPlayer'),
+        ),
+        migrations.RunPython(sum_total_scores, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 2.2.28 on 2026-10-18 17:45
+
+from django.db import migrations, models
+import django.utils.timezone
+from django.db.models import Count, Max
+
+MAX_PLAYER_COUNT = 4  # As in game_engine.lib.pasur when this migration was written
+
+
+def fill_match_status(apps, schema_editor):
+    """Same rules as Match.status()"""
+    Match = apps.get_model('game_engine', 'Match')
+    matches = Match.objects.annotate(
+        game_total=Count('games', distinct=True),
+        player_total=Count('game_players', distinct=True),
+        top_score=Max('game_players__total_score'),
+        latest_modified=Max('games__modified'),
+    )
+    for match in matches:
+        latest_status = match.games.order_by('-modified').values_list('status', flat=True).first()
+        if match.game_total <= 1 and latest_status == 'pending' and match.player_total <= MAX_PLAYER_COUNT:
+            current_status = 'joinable'
+        elif (match.top_score or 0) >= MAX_PLAYER_COUNT:
+            current_status = 'finished'
+        else:
+            current_status = 'ongoing'
+        Match.objects.filter(pk=match.pk).update(
+            current_status=current_status,
+            player_count=match.player_total,
+            last_activity=match.latest_modified or match.modified,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game_engine', '0004_match_player_total_score'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='match',
+            name='current_status',
+            field=models.CharField(choices=[('joinable', 'joinable'), ('ongoing', 'ongoing'), ('finished', 'finished')], db_index=True, default='joinable', max_length=30),
+        ),
+        migrations.AddField(
+            model_name='match',
+            name='last_activity',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now),
+        ),
+        migrations.AddField(
+            model_name='match',
+            name='player_count',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='match',
+            index=models.Index(fields=['current_status', '-created'], name='match_status_created_idx'),
+        ),
+        migrations.RunPython(fill_match_status, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 2.2.28 on 2026-10-18 17:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game_engine', '0005_match_current_status'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='match',
+            index=models.Index(fields=['-created', '-id'], name='match_created_id_idx'),
+        ),
+    ]
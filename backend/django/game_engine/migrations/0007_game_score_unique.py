@@ -0,0 +1,17 @@
+# Generated by Django 2.2.28 on 2026-10-18 18:16
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game_engine', '0006_match_created_id_index'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='gamematchplayerscore',
+            unique_together={('game', 'match_player')},
+        ),
+    ]
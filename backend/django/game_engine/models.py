@@ -1,10 +1,19 @@
+import base64
+import uuid
+from typing import Dict, List, Optional
+
+from django.conf import settings
 from django.contrib.postgres.fields import JSONField
-from django.db import models
-from django.db.models import Sum
+from django.db import models, transaction
+from django.db.models import Case, F, FilteredRelation, Prefetch, Q, Sum, Value, When
+from django.utils import timezone
 from djchoices import DjangoChoices, ChoiceItem
 
+from elva import metrics
+
 from game_engine.lib.card_holders import Deck, Player as PasurPlayer
-from game_engine.lib.pasur import Pasur, STATUS, MAX_PLAYER_COUNT
+from game_engine.lib.knowledge import KnowledgeTracker
+from game_engine.lib.pasur import Pasur, PasurIllegalAction, STATUS, MAX_PLAYER_COUNT, CODEC_BINARY, ACTION
 
 
 class GameModel(models.Model):
@@ -16,6 +25,16 @@ class GameModel(models.Model):
     modified = models.DateTimeField(auto_now=True)
 
 
+class StaleGameVersion(PasurIllegalAction):
+    """An action on a version of a game that another action has replaced, `version` is the current one"""
+
+    def __init__(self, game_id, version):
+        super(StaleGameVersion, self).__init__(
+            'The game has changed, it is now game {} at version {}'.format(game_id, version))
+        self.game_id = game_id
+        self.version = version
+
+
 # noinspection PyPep8Naming
 class MATCH_STATUS(DjangoChoices):
     joinable = ChoiceItem()
@@ -24,6 +43,19 @@ class MATCH_STATUS(DjangoChoices):
 
 
 class Match(GameModel):
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['current_status', '-created'], name='match_status_created_idx'),
+            models.Index(fields=['-created', '-id'], name='match_created_id_idx'),
+        ]
+
+    # Stored by `refresh_status` so the lobby can filter and sort matches in SQL
+    current_status = models.CharField(max_length=30, choices=MATCH_STATUS.choices, default=MATCH_STATUS.joinable,
+                                      db_index=True)
+    player_count = models.PositiveSmallIntegerField(default=0)
+    last_activity = models.DateTimeField(default=timezone.now, db_index=True)
+
     def get_latest_game(self, select_for_update=False) -> "Game":
         if select_for_update:
             query = self.games.select_for_update()
@@ -32,35 +64,62 @@ class Match(GameModel):
         return query.latest('created')
 
     def status(self):
-        games = self.games.order_by('-modified')
-        if len(games) <= 1 and games[0].status == STATUS.pending and self.game_players.count() <= MAX_PLAYER_COUNT:
+        """The status computed from the games and players, `current_status` holds it as of the last refresh"""
+        game_statuses = list(self.games.order_by('-modified').values_list('status', flat=True)[:2])
+        if (len(game_statuses) <= 1 and game_statuses[0] == STATUS.pending and
+                self.game_players.count() <= MAX_PLAYER_COUNT):
             return MATCH_STATUS.joinable
-        elif self.has_a_player_reached_goal(current_game=games[0]):
+        elif self.has_a_player_reached_goal():
             return MATCH_STATUS.finished
         else:
             return MATCH_STATUS.ongoing
 
+    def refresh_status(self):
+        """
+        Stores the status, player count and activity time, call when a game is created or ends or a player joins.
+        The lobby snapshot is rebuilt once the transaction commits.
+        """
+        from ws.lobby import request_lobby_update  # ws depends on the models
+
+        self.current_status = self.status()
+        self.player_count = self.game_players.count()
+        self.last_activity = timezone.now()
+        Match.objects.filter(pk=self.pk).update(
+            current_status=self.current_status, player_count=self.player_count, last_activity=self.last_activity)
+        transaction.on_commit(request_lobby_update)
+
     def has_a_player_reached_goal(self, current_game=None):
-        for player, values in self.count_player_points(current_game=current_game or self.get_latest_game()).items():
-            try:
-                if values['total'] >= MAX_PLAYER_COUNT:
-                    return True
-            except Exception as e:
-                print(e)
-        return False
+        return self.game_players.filter(total_score__gte=MAX_PLAYER_COUNT).exists()
 
     def count_player_points(self, current_game: "Game"=None):
-        current_game = current_game or self.get_latest_game()
-        points = {}
-        for player in self.game_players.all():
-            pms = GameMatchPlayerScore.objects \
-                .filter(match_player__player__name=player.player.name) \
-                .filter(match_player__match=self)
-            points[player.player.name] = {
-                'total': pms.aggregate(Sum('score')).get('score__sum') or 0,
-                'current_game': pms.filter(game_id=current_game.id).aggregate(Sum('score')).get('score__sum') or 0
+        """Total and current game points by player name, in one query"""
+        with metrics.span('count_player_points'):
+            current_game = current_game or self.get_latest_game()
+            match_players = self.game_players.annotate(
+                current_game_scores=FilteredRelation('scores', condition=Q(scores__game=current_game)),
+            ).values_list('player__name', 'total_score').annotate(current_game_score=Sum('current_game_scores__score'))
+            return {
+                name: {'total': total, 'current_game': current_game_score or 0}
+                for name, total, current_game_score in match_players
+            }
+
+    def record_game_scores(self, game: "Game", player_points: Dict[str, int]):
+        """Saves the points of a finished game and adds them to the players' totals"""
+        with transaction.atomic():
+            match_players = {
+                match_player.player.name: match_player
+                for match_player in self.game_players.select_related('player').select_for_update()
             }
-        return points
+            GameMatchPlayerScore.objects.bulk_create([
+                GameMatchPlayerScore(game=game, match_player=match_players[name], score=score)
+                for name, score in player_points.items()
+            ])
+            self.game_players.filter(pk__in=[match_players[name].pk for name in player_points]).update(
+                total_score=F('total_score') + Case(
+                    *[When(pk=match_players[name].pk, then=Value(score)) for name, score in player_points.items()],
+                    output_field=models.IntegerField(),
+                ),
+            )
 
 
 class GameField(JSONField):
@@ -74,41 +133,174 @@ class GameField(JSONField):
         if value is None:
             return value
 
-        return Pasur.load_json(value)
+        return Pasur.load(value)
 
     def get_prep_value(self, value: Pasur):
+        if settings.PASUR_STATE_CODEC == CODEC_BINARY:
+            # jsonb column, so the binary state is stored as a base64 string
+            return super(GameField, self).get_prep_value(base64.b64encode(value.dump_binary()).decode('ascii'))
         return super(GameField, self).get_prep_value(value.dump_json())
 
     def from_db_value(self, value, *_):
-        return self.to_python(value)
+        return value  # Deserialized on first access, by GameFieldDescriptor
+
+    def contribute_to_class(self, cls, name, **kwargs):
+        super(GameField, self).contribute_to_class(cls, name, **kwargs)
+        setattr(cls, self.attname, GameFieldDescriptor(self))
 
     def formfield(self, **kwargs):
         raise NotImplementedError('This is not yet supported')
 
 
+class GameFieldDescriptor:
+    """
+    Deserializes the game state on first access and hands it to the model's `bind_pasur(pasur, from_db)`, so that
+    loading rows only costs anything for the games that are actually used.
+    """
+
+    def __init__(self, field: GameField):
+        self.field = field
+        self.bound_name = '_{}_bound'.format(field.attname)
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+        data = instance.__dict__
+        if self.field.attname not in data:  # Deferred field
+            data[self.field.attname] = type(instance)._base_manager.filter(pk=instance.pk).values_list(
+                self.field.attname, flat=True).get()
+        value = data[self.field.attname]
+        if value is None or data.get(self.bound_name) is not value:
+            from_db = value is not None and not isinstance(value, Pasur)
+            if from_db:
+                with metrics.span('deserialize'):
+                    value = self.field.to_python(value)
+            value = instance.bind_pasur(value, from_db=from_db)
+            data[self.field.attname] = data[self.bound_name] = value
+        return value
+
+    def __set__(self, instance, value):
+        instance.__dict__[self.field.attname] = value
+
+
+class GameQuerySet(models.QuerySet):
+
+    def with_players(self):
+        """Fetches the match and its players along with the games, in two queries however many games there are"""
+        return self.select_related('match').prefetch_related(Prefetch(
+            'match__game_players',
+            queryset=MatchPlayer.objects.select_related('player').order_by('created'),
+        ))
+
+
 class Game(GameModel):
 
+    objects = GameQuerySet.as_manager()
+
     status = models.CharField(max_length=30, choices=STATUS.choices, default=STATUS.pending)
     pasur: Pasur = GameField()
     match = models.ForeignKey(to=Match, on_delete=models.CASCADE, related_name='games')
+    action_sequence = models.PositiveIntegerField(default=0)  # Sequence of the latest GameAction
+    snapshot_sequence = models.PositiveIntegerField(default=0)  # Latest GameAction included in `pasur`
+
+    def bind_pasur(self, pasur: Optional[Pasur], from_db: bool) -> Pasur:
+        """
+        Called on the first access of `pasur`: starts a new game if there is none, adds the match players, and brings
+        a snapshot from the database up to date with the actions logged after it.
+        """
+        if pasur is None:
+            pasur = Pasur.create_new_game()
+
+        for player in self.match_players():
+            pasur.add_player(player=player.player.get_pasur_player())
+
+        pasur.status = self.status
+
+        if from_db and self.action_sequence > self.snapshot_sequence:
+            self.replay_actions(pasur)
+        return pasur
+
+    def match_players(self) -> List["MatchPlayer"]:
+        prefetched = getattr(self.match, '_prefetched_objects_cache', {}).get('game_players')
+        if prefetched is not None:  # See GameQuerySet.with_players
+            return list(prefetched)
+        return list(self.match.game_players.select_related('player').order_by('created'))
+
+    def replay_actions(self, pasur: Pasur):
+        """Applies the actions logged after the snapshot"""
+        for game_action in self.actions.filter(sequence__gt=self.snapshot_sequence).order_by('sequence'):
+            pasur.apply_action(action=game_action.action, payload=game_action.payload)
+
+    def knowledge_tracker(self) -> KnowledgeTracker:
+        """Tracker listening to `pasur`, fed by replaying every logged action so it knows the knights put back"""
+        return KnowledgeTracker.replayed(self.pasur, self.actions.order_by('sequence').values_list('action', 'payload'))
+
+    def record_action(self):
+        """
+        Appends the latest `pasur` action to the action log. The full state is only written as a new snapshot every
+        GAME_SNAPSHOT_INTERVAL actions and when the game ends.
+
+        The game row is compared and swapped on its version, `action_sequence`: if another action was recorded since
+        this game was loaded, nothing is written and StaleGameVersion is raised, the caller's transaction should then
+        be rolled back.
+        """
+        action, payload = self.pasur.last_action
+        loaded_sequence = self.action_sequence
+        status_changed = self.status != self.pasur.status
+        fields = {'status': self.pasur.status, 'action_sequence': loaded_sequence + 1, 'modified': timezone.now()}
+        if (self.pasur.status in [STATUS.finished, STATUS.cancelled] or
+                fields['action_sequence'] - self.snapshot_sequence >= settings.GAME_SNAPSHOT_INTERVAL):
+            fields.update(pasur=self.pasur, snapshot_sequence=fields['action_sequence'])
+        with metrics.span('save'):
+            if not Game.objects.filter(pk=self.pk, action_sequence=loaded_sequence).update(**fields):
+                raise StaleGameVersion(game_id=self.pk, version=self.current_version())
+            GameAction.objects.create(game=self, sequence=fields['action_sequence'], action=action, payload=payload)
+        for name, value in fields.items():
+            setattr(self, name, value)
+        if status_changed:
+            self.match.refresh_status()
+
+    def lock(self):
+        """
+        Locks the game row, for the actions writing other rows than the game's. Raises StaleGameVersion if another
+        action was recorded or a newer game was started since this game was loaded.
+        """
+        locked = Game.objects.select_for_update().filter(pk=self.pk, action_sequence=self.action_sequence)
+        if not list(locked.values_list('pk', flat=True)) or self.match.games.filter(created__gt=self.created).exists():
+            latest_game = self.match.get_latest_game()
+            raise StaleGameVersion(game_id=latest_game.pk, version=latest_game.action_sequence)
+
+    def current_version(self) -> int:
+        return Game.objects.values_list('action_sequence', flat=True).get(pk=self.pk)
 
-    def __init__(self, *args, **kwargs):
-        super(Game, self).__init__(*args, **kwargs)
-        if self.id is None and self.pasur is None:
-            self.pasur: Pasur = Pasur.create_new_game()
+    def save(self, *args, **kwargs):
+        status_changed = self._state.adding or self.status != self.pasur.status
+        self.status = self.pasur.status
+        if not kwargs.get('update_fields'):
+            self.snapshot_sequence = self.action_sequence
+        with metrics.span('save'):
+            super(Game, self).save(*args, **kwargs)
+            if status_changed:
+                self.match.refresh_status()
 
-        for player in self.match.game_players.order_by('created'):  # type: MatchPlayer
-            self.pasur.add_player(player=player.player.get_pasur_player())
 
-        self.pasur.status = self.status
+class GameAction(GameModel):
+    game = models.ForeignKey(to=Game, on_delete=models.CASCADE, related_name='actions')
+    sequence = models.PositiveIntegerField()
+    action = models.CharField(max_length=30, choices=ACTION.choices)
+    payload = JSONField(default=dict)
 
-    def save(self, *args, **kwargs):
-        self.status = self.pasur.status
-        super(Game, self).save(*args, **kwargs)
+    class Meta:
+        unique_together = ('game', 'sequence')
 
 
 class Player(GameModel):
     name = models.CharField(max_length=120, unique=True, blank=False)
+    is_bot = models.BooleanField(default=False)
+
+    @staticmethod
+    def create_bot() -> "Player":
+        return Player.objects.create(name='Bot {}'.format(uuid.uuid4().hex[:6]), is_bot=True)
 
     def get_pasur_player(self):
         return PasurPlayer(player_id=self.name)
@@ -117,9 +309,14 @@ class Player(GameModel):
 class MatchPlayer(GameModel):
     match = models.ForeignKey(Match, on_delete=models.CASCADE, related_name='game_players')
     player = models.ForeignKey(Player, on_delete=models.CASCADE)
+    total_score = models.IntegerField(default=0)  # Sum of the player's GameMatchPlayerScores in the match
 
 
 class GameMatchPlayerScore(GameModel):
+
+    class Meta:
+        unique_together = [('game', 'match_player')]  # A game is scored once
+
     game = models.ForeignKey(to=Game, on_delete=models.CASCADE)
-    match_player = models.ForeignKey(to=MatchPlayer, on_delete=models.CASCADE)
+    match_player = models.ForeignKey(to=MatchPlayer, on_delete=models.CASCADE, related_name='scores')
     score = models.IntegerField(default=0)
@@ -1,4 +1,5 @@
 import pytest
+from django.db import IntegrityError, transaction
 
 from game_engine import models
 from game_engine.lib.pasur import STATUS
@@ -75,3 +76,73 @@ def test_get_card_in_game_and_then_another(game_with_players: models.Game):
     assert game_with_players.pasur.deck.remaining_cards() == 49
     assert game_with_players.pasur.players[0].card_count == 2
     assert game_with_players.pasur.players[1].card_count == 1
+
+
+def test_game_rebuilt_from_snapshot_and_actions(game_with_players: models.Game, settings):
+    settings.GAME_SNAPSHOT_INTERVAL = 10
+    game_with_players.pasur.deal_cards()
+    game_with_players.record_action()
+    player = game_with_players.pasur.player_in_turn
+    card, collect_cards = game_with_players.pasur.legal_moves()[0]
+    game_with_players.pasur.play_card(player=player, card=card, collect_cards=collect_cards)
+    game_with_players.record_action()
+
+    game_from_db = models.Game.objects.get(pk=game_with_players.pk)
+    assert game_from_db.action_sequence == 2
+    assert game_from_db.snapshot_sequence == 0
+    assert game_from_db.actions.count() == 2
+    assert game_from_db.pasur.dump_json() == game_with_players.pasur.dump_json()
+
+
+def test_record_game_scores(game_with_players: models.Game):
+    match = game_with_players.match
+    match.record_game_scores(game=game_with_players, player_points={'Player 0': 3, 'Player 1': 1})
+    next_game = models.Game(match=match)
+    next_game.save()
+    match.record_game_scores(game=next_game, player_points={'Player 0': 2, 'Player 1': 5})
+
+    assert match.count_player_points(current_game=next_game) == {
+        'Player 0': {'total': 5, 'current_game': 2},
+        'Player 1': {'total': 6, 'current_game': 5},
+    }
+    assert match.count_player_points(current_game=game_with_players)['Player 1'] == {'total': 6, 'current_game': 1}
+    assert match.has_a_player_reached_goal()
+
+
+def test_games_with_players_load_in_fixed_queries(game_with_players: models.Game, django_assert_num_queries):
+    for _ in range(3):
+        models.Game(match=game_with_players.match).save()
+    with django_assert_num_queries(2):
+        games = list(models.Game.objects.with_players())
+        assert [len(game.pasur.players) for game in games] == [2] * 4
+
+
+def test_match_status_is_stored_on_refresh_and_game_status_change(game_with_players: models.Game):
+    match = game_with_players.match
+    match.refresh_status()
+    assert models.Match.objects.filter(current_status=models.MATCH_STATUS.joinable, player_count=2).exists()
+
+    game_with_players.pasur.deal_cards()
+    game_with_players.record_action()
+    match.refresh_from_db()
+    assert match.current_status == models.MATCH_STATUS.ongoing
+
+
+def test_record_action_rejects_stale_version(game_with_players: models.Game):
+    stale_game = models.Game.objects.get(pk=game_with_players.pk)
+    game_with_players.pasur.deal_cards()
+    game_with_players.record_action()
+
+    stale_game.pasur.deal_cards()
+    with pytest.raises(models.StaleGameVersion) as error:
+        stale_game.record_action()
+    assert error.value.version == 1
+    assert game_with_players.actions.count() == 1
+
+
+def test_game_scores_are_recorded_once(game_with_players: models.Game):
+    match = game_with_players.match
+    match.record_game_scores(game=game_with_players, player_points={'Player 0': 3, 'Player 1': 1})
+    with pytest.raises(IntegrityError), transaction.atomic():
+        match.record_game_scores(game=game_with_players, player_points={'Player 0': 3, 'Player 1': 1})
+    assert match.count_player_points(current_game=game_with_players)['Player 0'] == {'total': 3, 'current_game': 3}
@@ -0,0 +1,118 @@
+"""
+Plays complete Pasur games without any database and reports engine throughput and the score distribution.
+
+    python -m game_engine.simulate --games 10000 --policies greedy,random --workers 4
+"""
+import argparse
+import math
+import random
+import time
+from collections import Counter
+from multiprocessing import Pool
+
+import numpy as np
+
+from game_engine.lib.pasur import STATUS
+from game_engine.lib.policies import POLICIES
+from game_engine.lib.simulation import play_game
+
+CHUNK_SIZE = 250
+
+
+def simulate_chunk(args):
+    """
+    Plays `game_count` games seeded by the `seed_sequence` of the chunk, returns (action count, cancelled count, score
+    counter per seat)
+    """
+    seed_sequence, game_count, policy_names = args
+    deck_seed, *policy_seeds = (int(seed) for seed in seed_sequence.generate_state(1 + len(policy_names)))
+    random.seed(deck_seed)  # New games draw their deck seed from the global random module
+    policies = [POLICIES[name](seed=policy_seed) for name, policy_seed in zip(policy_names, policy_seeds)]
+    action_count = 0
+    cancelled_count = 0
+    seat_scores = [Counter() for _ in policy_names]
+    seat_wins = Counter()
+    for _ in range(game_count):
+        result = play_game(policies=policies)
+        action_count += result.action_count
+        if result.status == STATUS.cancelled:
+            cancelled_count += 1
+            continue
+        for seat in range(len(policy_names)):
+            seat_scores[seat][result.points[str(seat)]] += 1
+        best = max(result.points.values())
+        seat_wins.update(int(seat) for seat, points in result.points.items() if points == best)
+    return action_count, cancelled_count, seat_scores, seat_wins
+
+
+def _chunks(game_count, seed, policy_names):
+    """Chunk arguments, each seeded independently so that runs with nearby seeds share no games"""
+    starts = range(0, game_count, CHUNK_SIZE)
+    for seed_sequence, start in zip(np.random.SeedSequence(seed).spawn(len(starts)), starts):
+        yield seed_sequence, min(CHUNK_SIZE, game_count - start), policy_names
+
+
+def simulate(game_count, policy_names, workers=None, seed=0):
+    action_count = 0
+    cancelled_count = 0
+    seat_scores = [Counter() for _ in policy_names]
+    seat_wins = Counter()
+
+    start = time.perf_counter()
+    with Pool(processes=workers) as pool:
+        for chunk_result in pool.imap_unordered(simulate_chunk, _chunks(game_count, seed, policy_names)):
+            action_count += chunk_result[0]
+            cancelled_count += chunk_result[1]
+            for total, chunk_scores in zip(seat_scores, chunk_result[2]):
+                total.update(chunk_scores)
+            seat_wins.update(chunk_result[3])
+    elapsed = time.perf_counter() - start
+
+    return {
+        'games': game_count,
+        'cancelled': cancelled_count,
+        'actions': action_count,
+        'seconds': elapsed,
+        'games_per_second': game_count / elapsed,
+        'actions_per_second': action_count / elapsed,
+        'seats': [
+            dict(policy=name, wins=seat_wins[seat], **_distribution(scores))
+            for seat, (name, scores) in enumerate(zip(policy_names, seat_scores))
+        ],
+    }
+
+
+def _distribution(scores: Counter):
+    count = sum(scores.values())
+    if not count:
+        return {'mean': None, 'stdev': None, 'min': None, 'max': None}
+    mean = sum(score * n for score, n in scores.items()) / count
+    variance = sum((score - mean) ** 2 * n for score, n in scores.items()) / count
+    return {'mean': mean, 'stdev': math.sqrt(variance), 'min': min(scores), 'max': max(scores)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Simulate Pasur games')
+    parser.add_argument('--games', type=int, default=1000)
+    parser.add_argument('--policies', default='random,random',
+                        help='Comma separated policy per seat, one of: {}'.format(', '.join(POLICIES)))
+    parser.add_argument('--workers', type=int, default=None, help='Worker processes, defaults to the cpu count')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    policy_names = args.policies.split(',')
+    if not (2 <= len(policy_names) <= 4) or any(name not in POLICIES for name in policy_names):
+        parser.error('Need 2-4 policies among: {}'.format(', '.join(POLICIES)))
+
+    report = simulate(game_count=args.games, policy_names=policy_names, workers=args.workers, seed=args.seed)
+    print('{games} games ({cancelled} cancelled), {actions} actions in {seconds:.2f}s'.format(**report))
+    print('{games_per_second:.1f} games/s, {actions_per_second:.1f} actions/s'.format(**report))
+    for seat, seat_report in enumerate(report['seats']):
+        if seat_report['mean'] is None:
+            continue
+        print('Seat {seat} ({policy}): mean {mean:.2f} stdev {stdev:.2f} min {min} max {max}, {wins} wins'.format(
+            seat=seat, **seat_report))
+
+
+if __name__ == '__main__':
+    main()
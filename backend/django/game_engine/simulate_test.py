@@ -0,0 +1,16 @@
+from game_engine.simulate import _chunks, simulate_chunk
+
+
+def chunk_states(seed, game_count=1000):
+    return [tuple(seed_sequence.generate_state(4)) for seed_sequence, _, _ in _chunks(game_count, seed, ['random'] * 2)]
+
+
+def test_nearby_seeds_share_no_chunk():
+    assert len(chunk_states(seed=1)) == 4
+    assert not set(chunk_states(seed=1)) & set(chunk_states(seed=2))
+    assert chunk_states(seed=1) == chunk_states(seed=1)
+
+
+def test_chunk_is_reproducible():
+    chunk = next(_chunks(5, 1, ['random', 'greedy']))
+    assert simulate_chunk(chunk) == simulate_chunk(chunk)
@@ -0,0 +1,135 @@
+import asyncio
+import logging
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
+
+from channels.consumer import AsyncConsumer
+from channels.db import database_sync_to_async
+from django.conf import settings
+from django.db import transaction
+
+from game_engine import models
+from game_engine.lib.ai import compute_bot_move, find_move, move_key
+from game_engine.lib.card_holders import mask_card_ids
+from game_engine.lib.pasur import Pasur, PasurIllegalAction, STATUS
+from ws.pasur_actions import MATCH_ACTOR_CHANNEL_NAME, PlayerActions, game_status_before, perform_action, \
+    push_game_status, request_bot_turn
+
+logger = logging.getLogger(__name__)
+
+# Extra seconds to wait for the process pool before falling back to the first legal move
+BOT_MOVE_TIMEOUT_MARGIN = 0.5
+
+
+class BotWorker(AsyncConsumer):
+    """
+    Plays bot turns for `bot.move` messages on the BOT_CHANNEL_NAME channel, run with `manage.py runworker pasur-bot`.
+    Moves are searched in a process pool, at most ELVA_BOT_WORKER_CONCURRENCY at a time, and then submitted through
+    the same action path as a human player.
+    """
+    executor: ProcessPoolExecutor = None
+    semaphore: asyncio.Semaphore = None
+    queue_depth = 0  # Bot turns received but not yet played
+
+    async def bot_move(self, event):
+        if BotWorker.executor is None:
+            BotWorker.executor = ProcessPoolExecutor(max_workers=settings.ELVA_BOT_WORKER_CONCURRENCY)
+            BotWorker.semaphore = asyncio.Semaphore(settings.ELVA_BOT_WORKER_CONCURRENCY)
+        BotWorker.queue_depth += 1
+        logger.info('Bot turn queued for match %s, queue depth %s', event['match_id'], BotWorker.queue_depth)
+        asyncio.ensure_future(self.play_bot_turn(event))
+
+    async def play_bot_turn(self, event):
+        try:
+            async with BotWorker.semaphore:
+                if 'state' in event:  # Sent by a match actor, its state is ahead of the database
+                    state, player_name, public_masks = event['state'], event['player'], event.get('public_masks')
+                else:
+                    turn = await database_sync_to_async(self.load_bot_turn)(event)
+                    if turn is None:
+                        return
+                    state, player_name, public_masks = turn
+                try:
+                    move = await asyncio.wait_for(
+                        asyncio.get_event_loop().run_in_executor(
+                            BotWorker.executor, partial(compute_bot_move, public_masks=public_masks), state,
+                            player_name, settings.ELVA_BOT_MOVE_BUDGET,
+                        ),
+                        timeout=settings.ELVA_BOT_MOVE_BUDGET + BOT_MOVE_TIMEOUT_MARGIN,
+                    )
+                except asyncio.TimeoutError:
+                    logger.warning('Bot move timed out in match %s, playing the first legal move', event['match_id'])
+                    move = None
+                if 'state' in event:
+                    await self.submit_bot_move_to_actor(event, player_name, state, move)
+                else:
+                    await database_sync_to_async(self.submit_bot_move)(event, player_name, move)
+        except Exception:
+            logger.exception('Bot turn failed in match %s', event['match_id'])
+        finally:
+            BotWorker.queue_depth -= 1
+
+    @staticmethod
+    def load_bot_turn(event):
+        """
+        Binary state, bot name and public masks of the game's knowledge tracker, or None if the game has moved on since
+        the turn was requested
+        """
+        game = models.Game.objects.get(pk=event['game_id'])
+        if game.action_sequence != event['action_sequence'] or game.pasur.status != STATUS.ongoing:
+            return None
+        return game.pasur.dump_binary(), game.pasur.player_in_turn.identifier, game.knowledge_tracker().public_masks
+
+    async def submit_bot_move_to_actor(self, event, player_name, state, move):
+        if move is None:
+            move = move_key(Pasur.load_binary(state).legal_moves()[0])
+        card_id, collect_mask = move
+        await self.channel_layer.send(MATCH_ACTOR_CHANNEL_NAME, {
+            'type': 'match.action',
+            'match_id': event['match_id'],
+            'player': player_name,
+            'action_sequence': event['action_sequence'],
+            'action_data': {
+                'player_action': PlayerActions.play_card,
+                'played_card': card_id,
+                'collect_cards': mask_card_ids(collect_mask),
+                'game_id': event['game_id'],
+                'version': event['action_sequence'],
+            },
+        })
+
+    @staticmethod
+    def submit_bot_move(event, player_name, move):
+        match = models.Match.objects.get(pk=event['match_id'])
+        with transaction.atomic():
+            game = match.get_latest_game()
+            if game.pk != event['game_id'] or game.action_sequence != event['action_sequence']:
+                return
+            if move is None:
+                card, collect_cards = game.pasur.legal_moves()[0]
+                move = card.id, sum(c.bit for c in collect_cards)
+            else:
+                find_move(game.pasur, move)  # Raises if the move is not legal anymore
+            card_id, collect_mask = move
+            action_data = {
+                'player_action': PlayerActions.play_card,
+                'played_card': card_id,
+                'collect_cards': mask_card_ids(collect_mask),
+                'game_id': event['game_id'],
+                'version': event['action_sequence'],
+            }
+            before = game_status_before(game=game, action_data=action_data)
+            try:
+                game, message = perform_action(
+                    match=match,
+                    game=game,
+                    player=models.Player.objects.get(name=player_name),
+                    action_data=action_data,
+                )
+            except models.StaleGameVersion:
+                return  # The game moved on while the move was submitted
+            except PasurIllegalAction as e:
+                logger.warning('Bot %s made an illegal move in match %s: %s', player_name, match.pk, e)
+                return
+            push_game_status(match=match, game=game, message=message, before=before)
+            transaction.on_commit(lambda: request_bot_turn(match=match, game=game))
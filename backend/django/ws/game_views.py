@@ -0,0 +1,187 @@
+"""
+Projections of a game for the websocket clients, computed once per action by the sender.
+
+Every seated player gets the view of their seat in the seat group, which only their own sockets join. Everybody else
+watching the match gets the public view in the match group, without any cards in hand, built once per action.
+
+Dealing and playing cards are sent as deltas of the views, `game_delta`, against the `visible_state` taken before the
+action. A delta message has the `version` it leads to and the `base_version` it applies to; a client whose version is
+not the base has missed a message and asks for a full `game_status` with a resync request. Full views are also sent on
+connect and after the other actions.
+"""
+import hashlib
+import json
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.utils.html import escape
+
+from game_engine.lib.card_holders import Card, Player
+from game_engine.lib.pasur import Pasur
+
+
+def match_group_id(match_id):
+    return 'game_%s' % match_id
+
+
+def seat_group_id(match_id, player_identifier):
+    """Group of the sockets of one player in a match, player names are hashed to fit the group name rules"""
+    return 'game_{}_seat_{}'.format(match_id, hashlib.sha1(player_identifier.encode()).hexdigest()[:16])
+
+
+def card_json(card: Card):
+    return {
+        'suit': card.suit,
+        'rank': card.rank,
+        'id': card.id,
+    }
+
+
+def game_status(pasur: Pasur, player_points, player_identifier=None) -> dict:
+    """The game as seen from the seat of `player_identifier`, or the public view for anybody else"""
+    player_ch: Player = pasur.card_holders.get(player_identifier) if player_identifier else None
+
+    return {
+        'game_phase': pasur.status,
+        'player_in_turn': pasur.player_in_turn.identifier,
+        'no_player_has_cards_on_hand': pasur.no_player_has_cards_on_hand,
+        'cards_on_board': [card_json(card) for card in pasur.board.list_all_cards()],
+        'number_of_cards_in_deck': pasur.deck.card_count,
+        'player': {
+            'cards_in_hand': [card_json(card) for card in player_ch.list_in_hand_cards()],
+            'number_of_cards_in_pile': player_ch.card_count_collected(),
+        } if player_ch else {},
+        'opponents': [
+            {
+                'name': opponent.identifier,
+                'card_count_in_hand': opponent.cards_count_hand(),
+                'card_count_in_pile': opponent.card_count_collected(),
+            } for opponent in pasur.card_holders.get_players(exclude_player=player_ch)
+        ],
+        'last_played_card': card_json(pasur.last_played_card) if pasur.last_played_card else None,
+        'last_collected_cards': [card_json(c) for c in pasur.last_collected_cards],
+        'player_points': player_points,
+    }
+
+
+def visible_state(pasur: Pasur) -> dict:
+    """The parts of the game that the views show, by card id, to take before an action and diff against after it"""
+    return {
+        'game_phase': pasur.status,
+        'player_in_turn': pasur.player_in_turn.identifier,
+        'no_player_has_cards_on_hand': pasur.no_player_has_cards_on_hand,
+        'number_of_cards_in_deck': pasur.deck.card_count,
+        'cards_on_board': [card.id for card in pasur.board.list_all_cards()],
+        'hands': {player.identifier: [card.id for card in player.list_in_hand_cards()] for player in pasur.players},
+        'piles': {player.identifier: player.card_count_collected() for player in pasur.players},
+        'last_played_card': pasur.last_played_card.id if pasur.last_played_card else None,
+        'last_collected_cards': [card.id for card in pasur.last_collected_cards],
+    }
+
+
+DELTA_VALUE_KEYS = ['game_phase', 'player_in_turn', 'no_player_has_cards_on_hand', 'number_of_cards_in_deck']
+
+
+def _card_changes(before_ids: List[int], cards: Iterable[Card]) -> Optional[dict]:
+    before_ids = set(before_ids)
+    card_ids = set()
+    added = []
+    for card in cards:
+        card_ids.add(card.id)
+        if card.id not in before_ids:
+            added.append(card_json(card))
+    removed = sorted(before_ids - card_ids)
+    return {'add': added, 'remove': removed} if added or removed else None
+
+
+def game_delta(before: dict, after: dict, pasur: Pasur, player_points, player_identifier=None) -> dict:
+    """
+    Changes of the view of `player_identifier`, or of the public view, from the visible state `before` to `after`,
+    the visible state of `pasur`. Only the keys of `game_status` that changed are included, with the cards on board
+    and in hand as {'add': cards, 'remove': card ids} and the opponents as counts by name.
+    """
+    delta = {key: after[key] for key in DELTA_VALUE_KEYS if after[key] != before[key]}
+    board_changes = _card_changes(before['cards_on_board'], pasur.board.list_all_cards())
+    if board_changes:
+        delta['cards_on_board'] = board_changes
+    player_ch: Player = pasur.card_holders.get(player_identifier) if player_identifier else None
+    if player_ch:
+        hand_changes = _card_changes(before['hands'].get(player_identifier, []), player_ch.list_in_hand_cards())
+        if hand_changes:
+            delta['cards_in_hand'] = hand_changes
+        if after['piles'][player_identifier] != before['piles'].get(player_identifier):
+            delta['number_of_cards_in_pile'] = after['piles'][player_identifier]
+    opponents = {
+        name: {'card_count_in_hand': len(hand), 'card_count_in_pile': after['piles'][name]}
+        for name, hand in after['hands'].items()
+        if name != player_identifier and (
+            len(hand) != len(before['hands'].get(name, [])) or after['piles'][name] != before['piles'].get(name))
+    }
+    if opponents:
+        delta['opponents'] = opponents
+    if after['last_played_card'] != before['last_played_card']:
+        delta['last_played_card'] = card_json(pasur.last_played_card) if pasur.last_played_card else None
+    if after['last_collected_cards'] != before['last_collected_cards']:
+        delta['last_collected_cards'] = [card_json(c) for c in pasur.last_collected_cards]
+    if player_points:
+        delta['player_points'] = player_points
+    return delta
+
+
+def game_status_text(pasur: Pasur, player_points, message, game_id=None, version=None, player_identifier=None) -> str:
+    """
+    Websocket text of the full view of `player_identifier`, or of the public view. Clients send the `game_id` and
+    `version` back with their actions, see `ws.pasur_actions.check_version`.
+    """
+    return json.dumps({
+        'game_status': game_status(pasur=pasur, player_points=player_points, player_identifier=player_identifier),
+        'message': escape(message),
+        'game_id': game_id,
+        'version': version,
+    })
+
+
+def game_status_texts(pasur: Pasur, player_points, message, game_id=None, version=None) -> Tuple[str, Dict[str, str]]:
+    """Websocket text of the public view and of each seat's view by player identifier"""
+    def text(player_identifier=None):
+        return game_status_text(pasur=pasur, player_points=player_points, message=message, game_id=game_id,
+                                version=version, player_identifier=player_identifier)
+    return text(), {player.identifier: text(player.identifier) for player in pasur.players}
+
+
+def game_delta_texts(before: dict, pasur: Pasur, player_points, message, game_id,
+                     version) -> Tuple[str, Dict[str, str]]:
+    """Websocket text of the delta of the public view and of each seat's view, from the visible state `before`"""
+    after = visible_state(pasur)
+
+    def text(player_identifier=None):
+        return json.dumps({
+            'game_delta': game_delta(before=before, after=after, pasur=pasur, player_points=player_points,
+                                     player_identifier=player_identifier),
+            'message': escape(message),
+            'game_id': game_id,
+            'version': version,
+            'base_version': version - 1,
+        })
+    return text(), {player.identifier: text(player.identifier) for player in pasur.players}
+
+
+def game_status_messages(match_id, pasur: Pasur, player_points, message, game_id=None, version=None,
+                         before: dict = None) -> List[Tuple[str, dict]]:
+    """
+    (group, message) pairs delivering the game status to everybody watching the match, as deltas from the visible
+    state `before` of the previous version if given. The public message also has the full public view as `snapshot`,
+    see `ws.spectators`.
+    """
+    if before is None:
+        public_text, seat_texts = game_status_texts(pasur=pasur, player_points=player_points, message=message,
+                                                    game_id=game_id, version=version)
+        snapshot = public_text
+    else:
+        public_text, seat_texts = game_delta_texts(before=before, pasur=pasur, player_points=player_points,
+                                                   message=message, game_id=game_id, version=version)
+        snapshot = game_status_text(pasur=pasur, player_points=player_points, message=message, game_id=game_id,
+                                    version=version)
+    return [(match_group_id(match_id), {'type': 'game_status', 'text': public_text, 'snapshot': snapshot})] + [
+        (seat_group_id(match_id, player_identifier), {'type': 'game_status', 'text': seat_text})
+        for player_identifier, seat_text in seat_texts.items()
+    ]
@@ -0,0 +1,104 @@
+import json
+
+from game_engine.lib.card_holders import Player
+from game_engine.lib.pasur import Pasur, STATUS
+from game_engine.lib.policies import RandomPolicy
+from ws.game_views import DELTA_VALUE_KEYS, game_status, game_status_messages, match_group_id, seat_group_id, \
+    visible_state
+
+
+def test_game_status_messages():
+    pasur = Pasur.create_new_game(seed=1)
+    for name in ['Anna', 'Bob <3']:
+        pasur.add_player(Player(player_id=name))
+    pasur.deal_cards()
+
+    messages = dict(game_status_messages(match_id='m', pasur=pasur, player_points={}, message='Cards <dealed>'))
+    assert sorted(messages) == sorted([match_group_id('m'), seat_group_id('m', 'Anna'), seat_group_id('m', 'Bob <3')])
+    assert len(set(messages)) == 3
+
+    public = json.loads(messages[match_group_id('m')]['text'])
+    assert public['message'] == 'Cards &lt;dealed&gt;'
+    assert public['game_status']['player'] == {}
+    assert [opponent['name'] for opponent in public['game_status']['opponents']] == ['Anna', 'Bob <3']
+
+    for player in pasur.players:
+        seat = json.loads(messages[seat_group_id('m', player.identifier)]['text'])['game_status']
+        assert [card['id'] for card in seat['player']['cards_in_hand']] == [
+            card.id for card in player.list_in_hand_cards()]
+        assert [opponent['name'] for opponent in seat['opponents']] == [
+            p.identifier for p in pasur.players if p is not player]
+        assert seat['cards_on_board'] == public['game_status']['cards_on_board']
+
+
+def apply_card_changes(cards, changes):
+    return [card for card in cards if card['id'] not in changes['remove']] + changes['add']
+
+
+def apply_delta(view: dict, delta: dict) -> dict:
+    """What the client does with a delta"""
+    view = dict(view, player=dict(view['player']))
+    for key in DELTA_VALUE_KEYS + ['last_played_card', 'last_collected_cards', 'player_points']:
+        if key in delta:
+            view[key] = delta[key]
+    if 'cards_on_board' in delta:
+        view['cards_on_board'] = apply_card_changes(view['cards_on_board'], delta['cards_on_board'])
+    if 'cards_in_hand' in delta:
+        view['player']['cards_in_hand'] = apply_card_changes(view['player']['cards_in_hand'], delta['cards_in_hand'])
+    if 'number_of_cards_in_pile' in delta:
+        view['player']['number_of_cards_in_pile'] = delta['number_of_cards_in_pile']
+    view['opponents'] = [dict(opponent, **delta.get('opponents', {}).get(opponent['name'], {}))
+                         for opponent in view['opponents']]
+    return view
+
+
+def sorted_cards(view: dict) -> dict:
+    view = dict(view, cards_on_board=sorted(view['cards_on_board'], key=lambda card: card['id']))
+    if view['player']:
+        view['player'] = dict(view['player'], cards_in_hand=sorted(view['player']['cards_in_hand'],
+                                                                   key=lambda card: card['id']))
+    return view
+
+
+def test_game_deltas_lead_to_the_full_views():
+    pasur = Pasur.create_new_game(seed=3)
+    for name in ['Anna', 'Bob']:
+        pasur.add_player(Player(player_id=name))
+    policy = RandomPolicy(seed=3)
+    viewers = [None, 'Anna', 'Bob']
+    views = {viewer: game_status(pasur=pasur, player_points={}, player_identifier=viewer) for viewer in viewers}
+    version = 0
+    while pasur.status in [STATUS.pending, STATUS.ongoing]:
+        before = visible_state(pasur)
+        if pasur.no_player_has_cards_on_hand:
+            pasur.deal_cards()
+        else:
+            player = pasur.player_in_turn
+            pasur.play_card(player, *policy.choose_move(pasur=pasur, player=player))
+        version += 1
+        messages = dict(game_status_messages(match_id='m', pasur=pasur, player_points={}, message='', game_id=1,
+                                             version=version, before=before))
+        for viewer in viewers:
+            group = seat_group_id('m', viewer) if viewer else match_group_id('m')
+            message = json.loads(messages[group]['text'])
+            assert message['base_version'] == version - 1
+            views[viewer] = apply_delta(views[viewer], message['game_delta'])
+            if viewer is None:
+                assert 'cards_in_hand' not in message['game_delta']
+            assert sorted_cards(views[viewer]) == sorted_cards(
+                game_status(pasur=pasur, player_points={}, player_identifier=viewer))
+
+
+def test_public_message_has_full_snapshot_for_spectators():
+    pasur = Pasur.create_new_game(seed=1)
+    for name in ['Anna', 'Bob']:
+        pasur.add_player(Player(player_id=name))
+    before = visible_state(pasur)
+    pasur.deal_cards()
+
+    messages = dict(game_status_messages(match_id='m', pasur=pasur, player_points={}, message='', game_id=1, version=1,
+                                         before=before))
+    snapshot = json.loads(messages[match_group_id('m')]['snapshot'])
+    assert snapshot['version'] == 1
+    assert snapshot['game_status'] == game_status(pasur=pasur, player_points={})
+    assert all('snapshot' not in messages[seat_group_id('m', name)] for name in ['Anna', 'Bob'])
@@ -0,0 +1,165 @@
+"""
+The lobby snapshot, the list of matches shown in the menu.
+
+The snapshot is kept in the cache shared by all processes. Changes to the matches only request an update from the
+lobby worker, run with `manage.py runworker pasur-lobby`, which rebuilds the snapshot at most once per
+ELVA_LOBBY_DEBOUNCE_SECONDS and broadcasts it once to the menu group.
+
+Browsing beyond the snapshot goes through `query_matches`, served by the lobby view and the `lobby.query` request of
+the menu socket. Its pages are keyed on (created, id) of the last row instead of an offset, so every page costs the
+same however deep it is.
+"""
+import asyncio
+import base64
+from datetime import datetime
+from typing import List, Tuple
+
+from asgiref.sync import async_to_sync
+from channels.consumer import AsyncConsumer
+from channels.db import database_sync_to_async
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+from django.urls import reverse
+from django.utils.dateparse import parse_datetime
+from django.utils.text import capfirst
+
+from game_engine import models
+
+LOBBY_CHANNEL_NAME = 'pasur-lobby'
+MENU_CHANNEL_NAME = 'pasur_menu_group'
+LOBBY_CACHE_KEY = 'lobby_snapshot'
+LOBBY_SIZE = 10
+LOBBY_PAGE_MAX_SIZE = 50
+LOBBY_COLUMNS = ['id', 'status', 'players', 'created', 'last_activity']
+
+
+def build_lobby_snapshot():
+    """The newest joinable matches, then the recently active other matches, each list is one index scan"""
+    matches = models.Match.objects.prefetch_related('game_players__player')
+    joinable = list(matches.filter(current_status=models.MATCH_STATUS.joinable).order_by('-created')[:LOBBY_SIZE])
+    others = matches.exclude(current_status=models.MATCH_STATUS.joinable).order_by('-last_activity')
+    return [{
+        'id': match.pk,
+        'game_url': reverse('pasur_match', args=[match.id]),
+        'players': [player.player.name for player in match.game_players.all()],
+        'status': capfirst(match.current_status),
+        'last_activity': match.last_activity.isoformat(),  # Formatted by the client, as the snapshot is cached
+    } for match in joinable + list(others[:LOBBY_SIZE - len(joinable)])]
+
+
+class LobbyQueryError(ValueError):
+    pass
+
+
+def encode_cursor(created: datetime, match_id: int) -> str:
+    return base64.urlsafe_b64encode('{}|{}'.format(created.isoformat(), match_id).encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        created, match_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        created, match_id = parse_datetime(created), int(match_id)
+    except ValueError:
+        raise LobbyQueryError('Invalid cursor')
+    if created is None:
+        raise LobbyQueryError('Invalid cursor')
+    return created, match_id
+
+
+def parse_lobby_query(params) -> dict:
+    """Keyword arguments of `query_matches` from request parameters, a QueryDict or the socket request's dict"""
+    statuses = params.get('status') or []
+    if isinstance(statuses, str):
+        statuses = statuses.split(',')
+    if any(status not in models.MATCH_STATUS.values for status in statuses):
+        raise LobbyQueryError('Status must be among: {}'.format(', '.join(models.MATCH_STATUS.values)))
+    active_since = params.get('active_since')
+    if active_since:
+        try:
+            active_since = parse_datetime(active_since)
+        except ValueError:
+            active_since = None
+        if active_since is None:
+            raise LobbyQueryError('active_since must be an ISO 8601 date and time')
+    try:
+        limit = min(int(params.get('limit', LOBBY_SIZE)), LOBBY_PAGE_MAX_SIZE)
+    except (TypeError, ValueError):
+        raise LobbyQueryError('limit must be a number')
+    if limit < 1:
+        raise LobbyQueryError('limit must be positive')
+    return {
+        'statuses': statuses,
+        'player': params.get('player') or None,
+        'active_since': active_since or None,
+        'cursor': params.get('cursor') or None,
+        'limit': limit,
+    }
+
+
+def query_matches(statuses: List[str] = None, player: str = None, active_since: datetime = None,
+                  cursor: str = None, limit=LOBBY_SIZE) -> dict:
+    """
+    A page of matches, newest first, as rows of LOBBY_COLUMNS. `next` is the cursor of the following page, None on the
+    last page.
+    """
+    matches = models.Match.objects.all()
+    if statuses:
+        matches = matches.filter(current_status__in=statuses)
+    if player:
+        matches = matches.filter(game_players__player__name=player)
+    if active_since:
+        matches = matches.filter(last_activity__gte=active_since)
+    if cursor:
+        created, match_id = decode_cursor(cursor)
+        matches = matches.filter(Q(created__lt=created) | Q(created=created, id__lt=match_id))
+    page = list(matches.order_by('-created', '-id').values_list(
+        'id', 'current_status', 'created', 'last_activity')[:limit + 1])
+
+    players = {match_id: [] for match_id, *_ in page[:limit]}
+    match_players = models.MatchPlayer.objects.filter(match_id__in=players).order_by('created')
+    for match_id, name in match_players.values_list('match_id', 'player__name'):
+        players[match_id].append(name)
+    return {
+        'columns': LOBBY_COLUMNS,
+        'rows': [
+            [match_id, status, players[match_id], created.isoformat(), last_activity.isoformat()]
+            for match_id, status, created, last_activity in page[:limit]
+        ],
+        'next': encode_cursor(page[limit - 1][2], page[limit - 1][0]) if len(page) > limit else None,
+    }
+
+
+def rebuild_lobby_snapshot():
+    matches = build_lobby_snapshot()
+    cache.set(LOBBY_CACHE_KEY, matches, timeout=None)
+    return matches
+
+
+def get_lobby_snapshot():
+    matches = cache.get(LOBBY_CACHE_KEY)
+    if matches is None:
+        matches = rebuild_lobby_snapshot()
+    return matches
+
+
+def request_lobby_update():
+    """Asks the lobby worker to rebuild and broadcast the snapshot, call after the matches have changed"""
+    async_to_sync(get_channel_layer().send)(LOBBY_CHANNEL_NAME, {'type': 'lobby.update'})
+
+
+class LobbyWorker(AsyncConsumer):
+    update_scheduled = False
+
+    async def lobby_update(self, _):
+        if LobbyWorker.update_scheduled:
+            return  # Covered by the update that is already scheduled
+        LobbyWorker.update_scheduled = True
+        asyncio.ensure_future(self.update_after_debounce())
+
+    async def update_after_debounce(self):
+        await asyncio.sleep(settings.ELVA_LOBBY_DEBOUNCE_SECONDS)
+        LobbyWorker.update_scheduled = False  # Changes made during the rebuild schedule a new update
+        matches = await database_sync_to_async(rebuild_lobby_snapshot)()
+        await self.channel_layer.group_send(MENU_CHANNEL_NAME, {'type': 'menu_update', 'matches': matches})
@@ -0,0 +1,40 @@
+import datetime
+
+import pytest
+from django.http import QueryDict
+from django.utils import timezone
+
+from ws.lobby import LOBBY_PAGE_MAX_SIZE, LOBBY_SIZE, LobbyQueryError, decode_cursor, encode_cursor, \
+    parse_lobby_query
+
+
+def test_cursor_round_trip():
+    created = datetime.datetime(2020, 5, 17, 12, 30, 15, 123456, tzinfo=timezone.utc)
+    assert decode_cursor(encode_cursor(created, 42)) == (created, 42)
+
+
+@pytest.mark.parametrize('cursor', ['', 'not base64!', encode_cursor(timezone.now(), 1)[:-4]])
+def test_decode_cursor_rejects_invalid_cursors(cursor):
+    with pytest.raises(LobbyQueryError):
+        decode_cursor(cursor)
+
+
+def test_parse_lobby_query_from_query_dict():
+    query = parse_lobby_query(QueryDict('status=joinable,ongoing&player=Alice&active_since=2020-05-17T12:00:00Z'))
+    assert query == {
+        'statuses': ['joinable', 'ongoing'],
+        'player': 'Alice',
+        'active_since': datetime.datetime(2020, 5, 17, 12, tzinfo=timezone.utc),
+        'cursor': None,
+        'limit': LOBBY_SIZE,
+    }
+
+
+def test_parse_lobby_query_caps_limit():
+    assert parse_lobby_query({'status': ['finished'], 'limit': 1000})['limit'] == LOBBY_PAGE_MAX_SIZE
+
+
+@pytest.mark.parametrize('params', [{'status': 'lost'}, {'limit': 'ten'}, {'limit': 0}, {'active_since': 'today'}])
+def test_parse_lobby_query_rejects_invalid_parameters(params):
+    with pytest.raises(LobbyQueryError):
+        parse_lobby_query(params)
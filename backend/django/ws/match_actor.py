@@ -0,0 +1,242 @@
+"""
+Optional match actors, enabled with ELVA_MATCH_ACTOR and run with `manage.py runworker pasur-match`.
+
+Each live match is owned by one `MatchActor` in the worker, holding the live `Game` and handling the match's messages
+one at a time from an asyncio queue, which replaces the row lock of `select_for_update`. Dealing and playing cards
+only change the game in memory, the logged actions and a snapshot are written behind, at most ELVA_MATCH_FLUSH_SECONDS
+later and right away when a game starts or ends. The other actions write other models too, they flush the pending
+writes first and then take the usual database path.
+
+An actor loads its match from the database when it gets its first message, so after a restart it continues from the
+last flush. Actions not yet flushed when the worker dies are lost. Only one worker process may run the actors, as the
+actor of a match must be the only writer of its games.
+"""
+import asyncio
+import logging
+from typing import Dict, List, Optional, Set
+
+from channels.consumer import AsyncConsumer
+from channels.db import database_sync_to_async
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.html import escape
+
+from elva import metrics
+from game_engine import models
+from game_engine.lib.knowledge import KnowledgeTracker
+from game_engine.lib.pasur import Pasur, PasurIllegalAction, STATUS
+from ws.game_views import game_status_messages, game_status_text, visible_state
+from ws.pasur_actions import BOT_CHANNEL_NAME, GAME_STATE_ACTIONS, action_label, apply_game_action, check_version, \
+    game_status_events, perform_action, stale_version_reply
+from ws.spectators import send_game_status_messages
+
+logger = logging.getLogger(__name__)
+
+
+class MatchActor:
+
+    def __init__(self, match_id, actors: Dict[str, "MatchActor"]):
+        self.match_id = match_id
+        self.actors = actors
+        self.queue = asyncio.Queue()
+        self.channel_layer = get_channel_layer()
+        self.match: models.Match = None
+        self.game: models.Game = None
+        self.knowledge: KnowledgeTracker = None  # Listening to the live game, for the bot turns
+        self.bot_names: Set[str] = set()
+        self.pending_actions: List[models.GameAction] = []
+        self.status_changed = False  # Whether a pending action started or ended the game
+        self.flush_lock = asyncio.Lock()
+        self.flush_handle: asyncio.Handle = None
+        asyncio.ensure_future(self.run())
+
+    async def run(self):
+        try:
+            await database_sync_to_async(self.load)()
+            while True:
+                try:
+                    event = await asyncio.wait_for(self.queue.get(), timeout=settings.ELVA_MATCH_ACTOR_IDLE_SECONDS)
+                except asyncio.TimeoutError:
+                    await self.flush()
+                    if self.queue.empty():
+                        break
+                    continue
+                try:
+                    await self.handle(event)
+                except Exception:
+                    logger.exception('Match actor %s failed to handle %s', self.match_id, event)
+        except Exception:
+            logger.exception('Match actor %s stopped', self.match_id)
+        finally:
+            del self.actors[self.match_id]
+
+    def load(self):
+        self.match = models.Match.objects.get(pk=self.match_id)
+        self.game = self.match.get_latest_game()
+        self.knowledge = self.game.knowledge_tracker()
+        self.bot_names = self.load_bot_names()
+
+    def load_bot_names(self) -> Set[str]:
+        return set(self.match.game_players.filter(player__is_bot=True).values_list('player__name', flat=True))
+
+    async def handle(self, event):
+        if event['type'] == 'match.resync':
+            player_points = await self.player_points()
+            await self.channel_layer.send(event['reply_channel'], {
+                'type': 'game_status',
+                'text': game_status_text(pasur=self.game.pasur, player_points=player_points, message='',
+                                         game_id=self.game.pk, version=self.game.action_sequence,
+                                         player_identifier=event['player']),
+            })
+            return
+        if event['type'] == 'match.join':
+            if self.game.status == STATUS.pending:
+                await self.flush()
+                await database_sync_to_async(self.load)()  # Players may have joined through the match view
+            await self.send_game_status(message=event['message'])
+            await self.request_bot_turn()
+            return
+
+        action_data = event['action_data']
+        if event.get('action_sequence', self.game.action_sequence) != self.game.action_sequence:
+            return  # A bot move for a turn that has been played already
+        with metrics.action_timer(action=action_label(action_data), match_id=self.match_id):
+            try:
+                check_version(game=self.game, action_data=action_data)
+                if action_data['player_action'] in GAME_STATE_ACTIONS:
+                    with metrics.span('engine'):
+                        before = visible_state(self.game.pasur)
+                        message = self.apply_in_memory(player_identifier=event['player'], action_data=action_data)
+                    await self.send_game_status(message=message, before=before)
+                else:
+                    await self.flush()
+                    with metrics.span('transaction'):
+                        events = await database_sync_to_async(self.perform_in_database)(event['player'], action_data)
+                    with metrics.span('group_send'):
+                        await send_game_status_messages(self.channel_layer, events)
+            except PasurIllegalAction as e:
+                if event.get('reply_channel'):
+                    await self.channel_layer.send(event['reply_channel'], {
+                        'type': 'action.error',
+                        'reply': stale_version_reply(e) if isinstance(e, models.StaleGameVersion) else {
+                            'message': escape('ERROR ({}): {}'.format(event['player'], e)),
+                        },
+                    })
+                return
+        await self.request_bot_turn()
+
+    def apply_in_memory(self, player_identifier, action_data) -> str:
+        previous_status = self.game.pasur.status
+        message = apply_game_action(pasur=self.game.pasur, player_identifier=player_identifier, action_data=action_data)
+        action, payload = self.game.pasur.last_action
+        self.game.action_sequence += 1
+        self.game.status = self.game.pasur.status
+        self.pending_actions.append(models.GameAction(
+            game_id=self.game.pk, sequence=self.game.action_sequence, action=action, payload=payload))
+        if self.game.status != previous_status:
+            self.status_changed = True
+            asyncio.ensure_future(self.flush())
+        elif self.flush_handle is None:
+            self.flush_handle = asyncio.get_event_loop().call_later(
+                settings.ELVA_MATCH_FLUSH_SECONDS, lambda: asyncio.ensure_future(self.flush()))
+        return message
+
+    def perform_in_database(self, player_identifier, action_data):
+        """The usual action path, for the actions writing more than the game, returns the game status messages"""
+        with transaction.atomic():
+            game = self.match.get_latest_game(select_for_update=True)
+            game, message = perform_action(match=self.match, game=game,
+                                           player=models.Player.objects.get(name=player_identifier),
+                                           action_data=action_data)
+            events = game_status_events(match=self.match, game=game, message=message)
+        self.game = game
+        self.knowledge = game.knowledge_tracker()
+        self.bot_names = self.load_bot_names()
+        return events
+
+    async def player_points(self) -> dict:
+        """Points of the match players once the game is finished, as in the full status sent by the consumer"""
+        if self.game.pasur.status != STATUS.finished:
+            return {}
+        return await database_sync_to_async(self.match.count_player_points)(self.game)
+
+    async def send_game_status(self, message, before: dict = None):
+        player_points = await self.player_points()
+        with metrics.span('serialize'):
+            events = game_status_messages(match_id=self.match_id, pasur=self.game.pasur, player_points=player_points,
+                                          message=message, game_id=self.game.pk, version=self.game.action_sequence,
+                                          before=before)
+        with metrics.span('group_send'):
+            await send_game_status_messages(self.channel_layer, events)
+
+    async def request_bot_turn(self):
+        pasur = self.game.pasur
+        if pasur.status != STATUS.ongoing or pasur.no_player_has_cards_on_hand:
+            return
+        if pasur.player_in_turn.identifier not in self.bot_names:
+            return
+        await self.channel_layer.send(BOT_CHANNEL_NAME, {
+            'type': 'bot.move',
+            'match_id': self.match_id,
+            'game_id': self.game.pk,
+            'action_sequence': self.game.action_sequence,
+            'player': pasur.player_in_turn.identifier,
+            'state': pasur.dump_binary(),  # The database may be behind, so the bot gets the live state
+            'public_masks': self.knowledge.public_masks,
+        })
+
+    async def flush(self):
+        """Writes the pending actions and a snapshot of the game, in order with the earlier flushes"""
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+            self.flush_handle = None
+        async with self.flush_lock:
+            if not self.pending_actions:
+                return
+            actions, self.pending_actions = self.pending_actions, []
+            status_changed, self.status_changed = self.status_changed, False
+            # A copy, as the live game may change while it is written
+            snapshot = Pasur.load_binary(self.game.pasur.dump_binary())
+            try:
+                await database_sync_to_async(self.write)(self.game.pk, actions, snapshot,
+                                                         self.match if status_changed else None)
+            except Exception:
+                logger.exception('Match actor %s failed to flush, retrying', self.match_id)
+                self.pending_actions[:0] = actions
+                self.status_changed = self.status_changed or status_changed
+                self.flush_handle = asyncio.get_event_loop().call_later(
+                    settings.ELVA_MATCH_FLUSH_SECONDS, lambda: asyncio.ensure_future(self.flush()))
+
+    @staticmethod
+    def write(game_id, actions: List[models.GameAction], snapshot: Pasur, match: Optional[models.Match] = None):
+        """Writes the actions and the snapshot, and refreshes the stored status of `match` if given"""
+        sequence = actions[-1].sequence
+        with transaction.atomic():
+            models.GameAction.objects.bulk_create(actions)
+            models.Game.objects.filter(pk=game_id).update(
+                pasur=snapshot, status=snapshot.status, action_sequence=sequence, snapshot_sequence=sequence,
+                modified=timezone.now(),
+            )
+            if match is not None:
+                match.refresh_status()
+
+
+class MatchActorWorker(AsyncConsumer):
+    """Hands the `match.*` messages on MATCH_ACTOR_CHANNEL_NAME to the actor of their match"""
+    actors: Dict[str, MatchActor] = {}
+
+    def actor(self, match_id) -> MatchActor:
+        if match_id not in MatchActorWorker.actors:
+            MatchActorWorker.actors[match_id] = MatchActor(match_id=match_id, actors=MatchActorWorker.actors)
+        return MatchActorWorker.actors[match_id]
+
+    async def match_action(self, event):
+        self.actor(event['match_id']).queue.put_nowait(event)
+
+    async def match_join(self, event):
+        self.actor(event['match_id']).queue.put_nowait(event)
+
+    async def match_resync(self, event):
+        self.actor(event['match_id']).queue.put_nowait(event)
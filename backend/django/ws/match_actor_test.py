@@ -0,0 +1,84 @@
+import asyncio
+import json
+from unittest import mock
+
+import pytest
+from channels.layers import get_channel_layer
+
+from game_engine import models
+from game_engine.lib.pasur import Pasur
+from ws.bot_worker import BotWorker
+from ws.match_actor import MatchActor
+from ws.pasur_actions import MATCH_ACTOR_CHANNEL_NAME, PlayerActions, perform_action
+
+
+@pytest.fixture()
+def bot_in_turn():
+    """A dealt game where the bot is in turn"""
+    match = models.Match.objects.create()
+    for player in [models.Player.objects.create(name='Player 0'), models.Player.create_bot()]:
+        models.MatchPlayer.objects.create(match=match, player=player)
+    game = models.Game(match=match, pasur=Pasur.create_new_game(seed=0))  # Not cancelled by the first deal
+    game.save()
+    game.pasur.deal_cards()
+    game.record_action()
+    if not game.pasur.player_in_turn.identifier.startswith('Bot'):
+        game.pasur.play_card(game.pasur.player_in_turn, *game.pasur.legal_moves()[0])
+        game.record_action()
+    return game
+
+
+@pytest.mark.django_db
+def test_bot_move_is_applied_by_actor(settings, bot_in_turn: models.Game):
+    settings.CHANNEL_LAYERS = {'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}}
+    settings.ELVA_MATCH_FLUSH_SECONDS = 60
+    bot = bot_in_turn.pasur.player_in_turn
+    card, collect_cards = bot_in_turn.pasur.legal_moves()[0]
+
+    async def run():
+        actor = MatchActor(str(bot_in_turn.match_id), actors={})
+        actor.load()
+        worker = BotWorker({'type': 'channel'})
+        worker.channel_layer = get_channel_layer()
+        event = {'match_id': actor.match_id, 'game_id': bot_in_turn.pk, 'action_sequence': bot_in_turn.action_sequence}
+        await worker.submit_bot_move_to_actor(event, bot.identifier, bot_in_turn.pasur.dump_binary(),
+                                              (card.id, sum(c.bit for c in collect_cards)))
+        await actor.handle(await worker.channel_layer.receive(MATCH_ACTOR_CHANNEL_NAME))
+        if actor.flush_handle is not None:
+            actor.flush_handle.cancel()
+        return actor
+
+    with mock.patch.object(MatchActor, 'run', lambda self: asyncio.sleep(0)):
+        actor = asyncio.run(run())
+    assert actor.game.action_sequence == bot_in_turn.action_sequence + 1
+    assert not actor.game.pasur.players.get(bot.identifier).in_hand_mask & card.bit
+
+
+@pytest.mark.django_db(transaction=True)  # The actor reads the points in another thread
+def test_resync_of_finished_game_has_points(settings, bot_in_turn: models.Game):
+    settings.CHANNEL_LAYERS = {'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}}
+    game = bot_in_turn
+    while game.pasur.deck.remaining_cards() > 0 or not game.pasur.no_player_has_cards_on_hand:
+        if game.pasur.no_player_has_cards_on_hand:
+            game.pasur.deal_cards()
+        else:
+            game.pasur.play_card(game.pasur.player_in_turn, *game.pasur.legal_moves()[0])
+        game.record_action()
+    game, _ = perform_action(match=game.match, game=game, player=models.Player.objects.get(name='Player 0'),
+                             action_data={'player_action': PlayerActions.count_points, 'game_id': game.pk,
+                                          'version': game.action_sequence})
+
+    async def run():
+        actor = MatchActor(str(game.match_id), actors={})
+        actor.load()
+        layer = get_channel_layer()
+        reply_channel = await layer.new_channel()
+        await actor.handle({'type': 'match.resync', 'match_id': actor.match_id, 'player': 'Player 0',
+                            'reply_channel': reply_channel})
+        return await layer.receive(reply_channel)
+
+    with mock.patch.object(MatchActor, 'run', lambda self: asyncio.sleep(0)):
+        reply = asyncio.run(run())
+    player_points = json.loads(reply['text'])['game_status']['player_points']
+    assert player_points == json.loads(json.dumps(game.match.count_player_points(game)))
+    assert player_points['Player 0']['total'] is not None
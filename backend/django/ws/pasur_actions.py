@@ -0,0 +1,178 @@
+from typing import List, Optional, Tuple
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.db import transaction
+from django.utils.html import escape
+from djchoices import DjangoChoices, ChoiceItem
+
+from elva import metrics
+
+from game_engine import models
+from game_engine.lib.card_holders import Player as PlayerCardHolder
+from game_engine.lib.pasur import PasurIllegalAction, STATUS, Pasur, MAX_PLAYER_COUNT
+from game_engine.models import Game
+from ws.game_views import game_status_messages, visible_state
+from ws.spectators import send_game_status_messages
+
+BOT_CHANNEL_NAME = 'pasur-bot'
+MATCH_ACTOR_CHANNEL_NAME = 'pasur-match'
+
+
+class PlayerActions(DjangoChoices):
+    deal_cards = ChoiceItem()
+    play_card = ChoiceItem()
+    count_points = ChoiceItem()
+    next_game = ChoiceItem()
+    add_bot = ChoiceItem()
+    start_new_match = ChoiceItem()
+    # undo_last_action = ChoiceItem()
+
+
+# Actions that only change the game state, the others also write other models
+GAME_STATE_ACTIONS = [PlayerActions.deal_cards, PlayerActions.play_card]
+
+
+def action_label(action_data: dict) -> str:
+    """Metrics label of the action sent by a client, one of PlayerActions so clients cannot add label series"""
+    player_action = action_data.get('player_action')
+    return player_action if isinstance(player_action, str) and player_action in PlayerActions.values else 'unknown'
+
+
+def apply_game_action(pasur: Pasur, player_identifier, action_data: dict) -> str:
+    """Performs one of the GAME_STATE_ACTIONS on the game state only, returns a message describing the action"""
+    player_action_name = action_data['player_action']
+    if player_action_name == PlayerActions.deal_cards:
+        pasur.deal_cards()
+        return 'Cards dealed'
+    elif player_action_name == PlayerActions.play_card:
+        player_ch: PlayerCardHolder = pasur.card_holders.get(player_identifier)
+        if player_ch is None:
+            raise PasurIllegalAction('Only players of the game can play cards')
+        played_card = player_ch.get(card_id=action_data['played_card'])
+        collected_cards = [pasur.board.get(card_id) for card_id in action_data['collect_cards']]
+        pasur.play_card(player=player_ch, card=played_card, collect_cards=collected_cards)
+        return (
+            'Player played card {played_card}'.format(played_card=played_card) +
+            (' and picked up {collected_cards}'.format(
+                collected_cards=', '.join([f"{card}" for card in collected_cards])
+            ) if collected_cards else '')
+        )
+    raise ValueError('Not a game state action: {}'.format(player_action_name))
+
+
+def check_version(game: Game, action_data: dict):
+    """
+    Rejects an action sent for another game or version than the current, or without them, so that a replayed or
+    double-submitted action never applies twice
+    """
+    if action_data.get('game_id') != game.pk or action_data.get('version') != game.action_sequence:
+        raise models.StaleGameVersion(game_id=game.pk, version=game.action_sequence)
+
+
+def stale_version_reply(error: models.StaleGameVersion) -> dict:
+    """Rejection of an action on an outdated version, with the current version to resync to"""
+    return {
+        'message': escape(str(error)),
+        'stale': True,
+        'game_id': error.game_id,
+        'version': error.version,
+    }
+
+
+def perform_action(match: models.Match, game: Game, player: models.Player, action_data: dict) -> Tuple[Game, str]:
+    """
+    Performs a player action on the latest game of the match, in the caller's transaction. This is the single action
+    path for humans and bots, returns the game to broadcast, which is a new one after next_game, and a message
+    describing the action.
+
+    The game need not be locked: recording the action fails with StaleGameVersion if another action got there first.
+    Only the actions writing other rows than the game's lock it.
+    """
+    check_version(game=game, action_data=action_data)
+    player_action_name = action_data['player_action']
+    if player_action_name not in GAME_STATE_ACTIONS + [PlayerActions.count_points]:
+        game.lock()
+    if player_action_name in GAME_STATE_ACTIONS:
+        message = apply_game_action(pasur=game.pasur, player_identifier=player.name, action_data=action_data)
+        game.record_action()
+    elif player_action_name == PlayerActions.count_points:
+        if game.status != STATUS.ongoing:
+            raise PasurIllegalAction('Points can only be counted once, in an ongoing game')
+        player_points = game.pasur.count_points()
+        match.record_game_scores(game=game, player_points=player_points)
+        game.record_action()  # After the scores, as the match status follows from them when the game ends
+
+        message = 'Counted points: {}'.format(player_points)
+    elif player_action_name == PlayerActions.next_game:
+        if game.status not in [STATUS.finished, STATUS.cancelled]:
+            raise PasurIllegalAction('Cannot go to next game before this game is finished or cancelled')
+        new_pasur = Pasur.create_new_game()
+        new_pasur.starter = game.pasur.players_in_play_order[1]
+        game = models.Game(match=match, pasur=new_pasur)
+        game.save()
+        message = 'New game started'
+    elif player_action_name == PlayerActions.add_bot:
+        if game.status != STATUS.pending:
+            raise PasurIllegalAction('Bots can only join before the game has started')
+        if len(game.pasur.players) >= MAX_PLAYER_COUNT:
+            raise PasurIllegalAction('The game is full')
+        bot = models.Player.create_bot()
+        models.MatchPlayer.objects.create(match=match, player=bot)
+        match.refresh_status()
+        game.pasur.add_player(player=bot.get_pasur_player())
+        message = f"Bot joined {bot.name}"
+    else:
+        message = "UNKNOWN ACTION"
+    return game, message
+
+
+def game_status_events(match: models.Match, game: Game, message, before: dict = None) -> List[Tuple[str, dict]]:
+    """
+    (group, message) pairs with the game status for every seat of the match and for the public, as deltas from the
+    `visible_state` taken before a game state action if given
+    """
+    player_points = match.count_player_points(game) if game.pasur.status == STATUS.finished else {}
+    with metrics.span('serialize'):
+        return game_status_messages(match_id=match.pk, pasur=game.pasur, player_points=player_points, message=message,
+                                    game_id=game.pk, version=game.action_sequence, before=before)
+
+
+def game_status_before(game: Game, action_data: dict) -> Optional[dict]:
+    """The visible state to send the action's result as deltas against, None for the actions sent in full"""
+    if action_data.get('player_action') not in GAME_STATE_ACTIONS:
+        return None
+    return visible_state(game.pasur)
+
+
+def push_game_status(match: models.Match, game: Game, message, before: dict = None):
+    """Sends the game status once the current transaction commits, so clients never see a move that is rolled back"""
+    events = game_status_events(match=match, game=game, message=message, before=before)
+
+    def send():
+        with metrics.span('group_send'):
+            async_to_sync(send_game_status_messages)(get_channel_layer(), events)
+    transaction.on_commit(send)
+
+
+def bot_turn_event(match: models.Match, game: Game) -> Optional[dict]:
+    """Message for the bot worker if a bot is in turn, otherwise None"""
+    pasur = game.pasur
+    if pasur.status != STATUS.ongoing or pasur.no_player_has_cards_on_hand:
+        return None
+    player_in_turn = pasur.player_in_turn.identifier
+    if not match.game_players.filter(player__is_bot=True, player__name=player_in_turn).exists():
+        return None
+    return {
+        'type': 'bot.move',
+        'match_id': match.pk,
+        'game_id': game.pk,
+        'action_sequence': game.action_sequence,
+    }
+
+
+def request_bot_turn(match: models.Match, game: Game):
+    """Hands the turn to the bot worker if a bot is in turn, call once the action is committed"""
+    event = bot_turn_event(match=match, game=game)
+    if event is not None:
+        async_to_sync(get_channel_layer().send)(BOT_CHANNEL_NAME, event)
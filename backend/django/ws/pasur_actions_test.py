@@ -0,0 +1,95 @@
+from unittest import mock
+
+import pytest
+from django.db import transaction
+
+from game_engine import models
+from game_engine.lib.pasur import Pasur, PasurIllegalAction
+from ws import lobby, pasur_actions
+from ws.pasur_actions import PlayerActions, action_label, check_version, perform_action, push_game_status
+
+
+@pytest.fixture()
+def game_to_count():
+    """A game where every card is played, ready for counting points"""
+    match = models.Match.objects.create()
+    for name in ['Player 0', 'Player 1']:
+        models.MatchPlayer.objects.create(match=match, player=models.Player.objects.create(name=name))
+    game = models.Game(match=match, pasur=Pasur.create_new_game(seed=0))  # Not cancelled by the first deal
+    game.save()
+    pasur = game.pasur
+    while pasur.deck.remaining_cards() > 0 or not pasur.no_player_has_cards_on_hand:
+        if pasur.no_player_has_cards_on_hand:
+            pasur.deal_cards()
+        else:
+            pasur.play_card(pasur.player_in_turn, *pasur.legal_moves()[0])
+    game.status = pasur.status
+    game.save()
+    return game
+
+
+def count_points_action(game: models.Game) -> dict:
+    return {'player_action': PlayerActions.count_points, 'game_id': game.pk, 'version': game.action_sequence}
+
+
+@pytest.mark.django_db
+def test_points_are_counted_once(game_to_count: models.Game):
+    match = game_to_count.match
+    player = models.Player.objects.get(name='Player 0')
+    game, _ = perform_action(match=match, game=game_to_count, player=player,
+                             action_data=count_points_action(game_to_count))
+    totals = match.count_player_points(current_game=game)
+
+    with pytest.raises(PasurIllegalAction):
+        perform_action(match=match, game=game, player=player, action_data=count_points_action(game))
+    assert match.count_player_points(current_game=game) == totals
+
+
+@pytest.mark.parametrize('action_data', [
+    {'player_action': PlayerActions.count_points},
+    {'player_action': PlayerActions.count_points, 'game_id': 7},
+    {'player_action': PlayerActions.count_points, 'game_id': 7, 'version': 2},
+    {'player_action': PlayerActions.count_points, 'game_id': 6, 'version': 3},
+])
+def test_check_version_rejects_missing_and_other_versions(action_data):
+    game = models.Game(pk=7, action_sequence=3)
+    with pytest.raises(models.StaleGameVersion):
+        check_version(game=game, action_data=action_data)
+    check_version(game=game, action_data=dict(action_data, game_id=7, version=3))
+
+
+@pytest.mark.parametrize('action_data,label', [
+    ({'player_action': PlayerActions.play_card}, PlayerActions.play_card),
+    ({'player_action': 'made up'}, 'unknown'),
+    ({'player_action': ['play_card']}, 'unknown'),
+    ({}, 'unknown'),
+])
+def test_action_label(action_data, label):
+    assert action_label(action_data) == label
+
+
+@pytest.mark.django_db(transaction=True)
+def test_game_status_is_pushed_after_commit(game_to_count: models.Game):
+    with mock.patch.object(pasur_actions, 'async_to_sync') as send:
+        with pytest.raises(ValueError), transaction.atomic():
+            push_game_status(match=game_to_count.match, game=game_to_count, message='')
+            raise ValueError('Rolled back')
+        assert not send.called
+
+        with transaction.atomic():
+            push_game_status(match=game_to_count.match, game=game_to_count, message='')
+            assert not send.called
+        assert send.called
+
+
+@pytest.mark.django_db(transaction=True)
+def test_lobby_update_is_requested_once_per_change():
+    match = models.Match.objects.create()
+    models.MatchPlayer.objects.create(match=match, player=models.Player.objects.create(name='Player 0'))
+    game = models.Game(match=match)
+    game.save()
+    with mock.patch.object(lobby, 'request_lobby_update') as request_lobby_update, transaction.atomic():
+        perform_action(match=match, game=game, player=models.Player.objects.get(name='Player 0'),
+                       action_data={'player_action': PlayerActions.add_bot, 'game_id': game.pk,
+                                    'version': game.action_sequence})
+    assert request_lobby_update.call_count == 1
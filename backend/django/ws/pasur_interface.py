@@ -1,182 +1,147 @@
 import json
 
-from asgiref.sync import async_to_sync
-from channels.generic.websocket import WebsocketConsumer
+from channels.db import database_sync_to_async
+from channels.generic.websocket import AsyncWebsocketConsumer
+from django.conf import settings
 from django.contrib.auth.models import User
 from django.db import transaction
 from django.utils.html import escape
-from djchoices import DjangoChoices, ChoiceItem
 
+from elva import metrics
 from game_engine import models
-from game_engine.lib.card_holders import Player as PlayerCardHolder
-from game_engine.lib.pasur import PasurIllegalAction, STATUS, Pasur
-from game_engine.models import Game
-
-
-class PlayerActions(DjangoChoices):
-    deal_cards = ChoiceItem()
-    play_card = ChoiceItem()
-    count_points = ChoiceItem()
-    next_game = ChoiceItem()
-    start_new_match = ChoiceItem()
-    # undo_last_action = ChoiceItem()
-
-
-class PasurInterface(WebsocketConsumer):
-
-    def get_game_status(self, pasur: Pasur, player_points):
-        player_ch: PlayerCardHolder = pasur.card_holders.get(self.player.name)
-
-        game_status = {
-            'game_phase': pasur.status,
-            'player_in_turn': pasur.player_in_turn.identifier,
-            'no_player_has_cards_on_hand': pasur.no_player_has_cards_on_hand,
-            'cards_on_board': [
-                {
-                    'suit': card.suit,
-                    'rank': card.rank,
-                    'id': card.id,
-                } for card in pasur.board.list_all_cards()
-            ],
-            'number_of_cards_in_deck': pasur.deck.card_count,
-            'player': {
-                'cards_in_hand': [
-                    {
-                        'suit': card.suit,
-                        'rank': card.rank,
-                        'id': card.id,
-                    } for card in player_ch.list_in_hand_cards()
-                ],
-                'number_of_cards_in_pile': player_ch.card_count_collected(),
-            } if player_ch else {},
-            'opponents': [
-                {
-                    'name': opponent.identifier,
-                    'card_count_in_hand': opponent.cards_count_hand(),
-                    'card_count_in_pile': opponent.card_count_collected(),
-                } for opponent in pasur.card_holders.get_players(exclude_player=player_ch)
-            ],
-            'last_played_card': {
-                    'suit': pasur.last_played_card.suit,
-                    'rank': pasur.last_played_card.rank,
-                    'id': pasur.last_played_card.id,
-                } if pasur.last_played_card else None,
-            'last_collected_cards': [
-                {
-                    'suit': c.suit,
-                    'rank': c.rank,
-                    'id': c.id,
-                } for c in pasur.last_collected_cards
-            ],
-            'player_points': player_points,
-        }
-        return game_status
-
-    def push_to_group(self, message, game: Game):
-        async_to_sync(self.channel_layer.group_send)(
-            self.match_group_id,
-            {
-                'type': 'game_status',
-                'message': message,
-                'pasur': game.pasur.dump_json(),
-                'player_points': self.match.count_player_points(game) if game.pasur.status == STATUS.finished else {},
-            }
-        )
+from game_engine.lib.pasur import PasurIllegalAction, STATUS
+from game_engine.models import StaleGameVersion
+from ws.game_views import game_status_text, match_group_id, seat_group_id
+from ws.pasur_actions import BOT_CHANNEL_NAME, MATCH_ACTOR_CHANNEL_NAME, perform_action, game_status_before, \
+    game_status_events, bot_turn_event, stale_version_reply, action_label
+from ws.spectators import send_game_status_messages
+
+
+class PasurInterface(AsyncWebsocketConsumer):
+    """
+    Websocket of a player or spectator of a match. Seated players join the group of their seat, everybody else the
+    public match group, and the game status is computed by the sender once for each of them. With ELVA_MATCH_ACTOR the
+    actions are handed to the match actor, see `ws.match_actor`.
+    """
 
     # noinspection PyAttributeOutsideInit
-    def connect(self):
+    async def connect(self):
         match_id = self.scope['url_route']['kwargs']['match_id']
         self.user: User = self.scope['user']
-        self.match: models.Match = models.Match.objects.get(pk=match_id)
-        self.player = models.Player.objects.get(name=self.user.username)
+        self.match, self.player, is_seated, events, bot_turn = await database_sync_to_async(self.load_connection)(
+            match_id)
 
-        self.match_group_id = 'game_%s' % self.match.pk
+        if is_seated:
+            self.group_id = seat_group_id(self.match.pk, self.player.name)
+        else:
+            self.group_id = match_group_id(self.match.pk)
 
         # Join room group
-        async_to_sync(self.channel_layer.group_add)(
-            self.match_group_id,
+        await self.channel_layer.group_add(
+            self.group_id,
             self.channel_name,
         )
 
-        self.accept()
-        self.push_to_group(
-            message=f"Player joined {self.player.name}",
-            game=self.match.get_latest_game(),
-        )
-
-    def disconnect(self, close_code):
+        await self.accept()
+        if settings.ELVA_MATCH_ACTOR:
+            await self.channel_layer.send(MATCH_ACTOR_CHANNEL_NAME, {
+                'type': 'match.join',
+                'match_id': self.match.pk,
+                'message': f"Player joined {self.player.name}",
+            })
+            return
+        await send_game_status_messages(self.channel_layer, events)
+        if bot_turn is not None:  # In case a bot turn was lost, e.g. by a worker restart
+            await self.channel_layer.send(BOT_CHANNEL_NAME, bot_turn)
+
+    def load_connection(self, match_id):
+        match = models.Match.objects.get(pk=match_id)
+        player = models.Player.objects.get(name=self.user.username)
+        game = match.get_latest_game()
+        is_seated = game.pasur.card_holders.get(player.name) is not None
+        if settings.ELVA_MATCH_ACTOR:
+            return match, player, is_seated, [], None  # The actor has the live game
+        events = game_status_events(match=match, game=game, message=f"Player joined {player.name}")
+        return match, player, is_seated, events, bot_turn_event(match=match, game=game)
+
+    async def disconnect(self, close_code):
         # Leave room group
-        async_to_sync(self.channel_layer.group_discard)(
-            self.match_group_id,
+        await self.channel_layer.group_discard(
+            self.group_id,
             self.channel_name,
         )
 
     # Receive message from WebSocket
-    # noinspection PyMethodOverriding,PyAttributeOutsideInit
-    def receive(self, text_data):
+    # noinspection PyMethodOverriding
+    async def receive(self, text_data):
         text_data_json = json.loads(text_data)
-        # message = text_data_json['message']
-        player_action_name = text_data_json['player_action']
 
-        with transaction.atomic():
-            game = self.match.get_latest_game(select_for_update=True)
+        if text_data_json.get('request') == 'resync':
+            await self.resync()
+            return
+
+        if settings.ELVA_MATCH_ACTOR:
+            await self.channel_layer.send(MATCH_ACTOR_CHANNEL_NAME, {
+                'type': 'match.action',
+                'match_id': self.match.pk,
+                'player': self.player.name,
+                'action_data': text_data_json,
+                'reply_channel': self.channel_name,
+            })
+            return
+
+        with metrics.action_timer(action=action_label(text_data_json), match_id=self.match.pk) as timer:
             try:
-                if player_action_name == PlayerActions.deal_cards:
-                    game.pasur.deal_cards()
-                    game.save()
-                    message = 'Cards dealed'
-                elif player_action_name == PlayerActions.play_card:
-                    player_ch: PlayerCardHolder = game.pasur.card_holders.get(self.player.name)
-                    played_card = player_ch.get(card_id=text_data_json['played_card'])
-                    collected_cards = [game.pasur.board.get(card_id) for card_id in text_data_json['collect_cards']]
-                    game.pasur.play_card(player=player_ch, card=played_card, collect_cards=collected_cards)
-                    game.save()
-                    message = (
-                        'Player played card {played_card}'.format(played_card=played_card) +
-                        (' and picked up {collected_cards}'.format(
-                            collected_cards=', '.join([f"{card}" for card in collected_cards])
-                        ) if collected_cards else '')
-                    )
-                elif player_action_name == PlayerActions.count_points:
-                    player_points = game.pasur.count_points()
-                    game.save()
-                    for player_identifier, score in player_points.items():
-                        models.GameMatchPlayerScore.objects.get_or_create(
-                            game=game,
-                            match_player=models.MatchPlayer.objects.get(
-                                match=self.match,
-                                player__name=player_identifier),
-                            score=score
-                        )
-
-                    message = 'Counted points: {}'.format(player_points)
-                elif player_action_name == PlayerActions.next_game:
-                    if game.status not in [STATUS.finished, STATUS.cancelled]:
-                        raise PasurIllegalAction('Cannot go to next game before this game is finished or cancelled')
-                    new_pasur = Pasur.create_new_game()
-                    new_pasur.starter = game.pasur.players_in_play_order[1]
-                    game = models.Game(match=self.match, pasur=new_pasur)
-                    game.save()
-                    message = 'New game started'
-                else:
-                    message = "UNKNOWN ACTION"
-                # Send message to room group
-                self.push_to_group(
-                    message=message,
-                    game=game,
-                )
+                events, bot_turn = await database_sync_to_async(self.handle_action)(text_data_json, timer)
+            except StaleGameVersion as e:
+                await self.send(text_data=json.dumps(stale_version_reply(e)))
+                return
             except PasurIllegalAction as e:
                 message = 'ERROR ({}): {}'.format(self.player.name, e)
-                self.send(text_data=json.dumps({'message': escape(message)}))
-
-    # Receive message from room group
-    def game_status(self, event):
-        message = event['message']
-        pasur = Pasur.load_json(event['pasur'])
-        player_points = event['player_points']
-
-        # Send message to WebSocket
-        self.send(text_data=json.dumps({
-            'game_status': self.get_game_status(pasur=pasur, player_points=player_points),
-            'message': escape(message),
-        }))
+                await self.send(text_data=json.dumps({'message': escape(message)}))
+                return
+            with metrics.span('group_send'):
+                await send_game_status_messages(self.channel_layer, events)
+        if bot_turn is not None:
+            await self.channel_layer.send(BOT_CHANNEL_NAME, bot_turn)
+
+    def handle_action(self, action_data, timer: metrics.ActionTimer):
+        """
+        Performs the action in its own transaction, returns the game status messages and the bot turn request. Raises
+        StaleGameVersion, rolling the transaction back, if the action lost the race with another one.
+        """
+        with metrics.bind(timer), metrics.span('transaction'), transaction.atomic():
+            with metrics.span('load'):
+                game = self.match.get_latest_game()
+            with metrics.span('engine'):
+                before = game_status_before(game=game, action_data=action_data)
+                game, message = perform_action(match=self.match, game=game, player=self.player,
+                                               action_data=action_data)
+            events = game_status_events(match=self.match, game=game, message=message, before=before)
+        return events, bot_turn_event(match=self.match, game=game)
+
+    async def resync(self):
+        """Sends the full view to this socket only, for a client that missed an update"""
+        if settings.ELVA_MATCH_ACTOR:
+            await self.channel_layer.send(MATCH_ACTOR_CHANNEL_NAME, {
+                'type': 'match.resync',
+                'match_id': self.match.pk,
+                'player': self.player.name,
+                'reply_channel': self.channel_name,
+            })
+            return
+        await self.send(text_data=await database_sync_to_async(self.load_game_status_text)())
+
+    def load_game_status_text(self):
+        game = self.match.get_latest_game()
+        player_points = self.match.count_player_points(game) if game.pasur.status == STATUS.finished else {}
+        return game_status_text(pasur=game.pasur, player_points=player_points, message='', game_id=game.pk,
+                                version=game.action_sequence, player_identifier=self.player.name)
+
+    # Receive message from room group, the text is already the view of this socket's group
+    async def game_status(self, event):
+        await self.send(text_data=event['text'])
+
+    # Receive a rejected action from the match actor
+    async def action_error(self, event):
+        await self.send(text_data=json.dumps(event['reply']))
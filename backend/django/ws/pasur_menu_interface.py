@@ -1,81 +1,52 @@
 import json
 
-from asgiref.sync import async_to_sync
-from channels.generic.websocket import WebsocketConsumer
-from channels.layers import get_channel_layer
+from channels.db import database_sync_to_async
+from channels.generic.websocket import AsyncWebsocketConsumer
 from django.contrib.auth.models import User
-from django.contrib.humanize.templatetags.humanize import naturaltime
-from django.urls import reverse
-from django.utils.text import capfirst
 
 from game_engine import models
+from ws.lobby import MENU_CHANNEL_NAME, LobbyQueryError, get_lobby_snapshot, parse_lobby_query, query_matches
 
-MENU_CHANNEL_NAME = 'pasur_menu_group'
 
-
-class PasurMenuInterface(WebsocketConsumer):
+class PasurMenuInterface(AsyncWebsocketConsumer):
 
     # noinspection PyAttributeOutsideInit
-    def connect(self):
+    async def connect(self):
         self.user: User = self.scope['user']
-        self.player, _ = models.Player.objects.get_or_create(name=self.user.username)
+        self.player = await database_sync_to_async(self.get_player)()
         self.group_name = MENU_CHANNEL_NAME
 
         # Join room group
-        async_to_sync(self.channel_layer.group_add)(
+        await self.channel_layer.group_add(
             self.group_name,
             self.channel_name,
         )
 
-        self.accept()
-        self.push_to_group()
+        await self.accept()
+        await self.send(text_data=json.dumps({'matches': await database_sync_to_async(get_lobby_snapshot)()}))
+
+    def get_player(self) -> models.Player:
+        player, _ = models.Player.objects.get_or_create(name=self.user.username)
+        return player
 
-    def disconnect(self, close_code):
+    async def disconnect(self, close_code):
         # Leave room group
-        async_to_sync(self.channel_layer.group_discard)(
+        await self.channel_layer.group_discard(
             self.group_name,
             self.channel_name,
         )
 
     # Receive message from WebSocket
-    # noinspection PyMethodOverriding,PyAttributeOutsideInit
-    def receive(self, text_data):
-        pass
-
-    def push_to_group(self):
-        async_to_sync(self.channel_layer.group_send)(
-            self.group_name,
-            {
-                'type': 'menu_update',
-                'matches': [{
-                    'id': match.pk,
-                    'game_url': reverse('pasur_match', args=[match.id]),
-                    'players': [player.player.name for player in match.game_players.all()],
-                    'status': capfirst(match.status()),
-                    'last_action': naturaltime(match.get_latest_game().modified)
-                } for match in models.Match.objects.prefetch_related('game_players').order_by('-created')][0:10],
-            }
-        )
-
-    def menu_update(self, event):
+    # noinspection PyMethodOverriding
+    async def receive(self, text_data):
+        data = json.loads(text_data)
+        if data.get('request') == 'lobby.query':
+            try:
+                page = await database_sync_to_async(query_matches)(**parse_lobby_query(data))
+            except LobbyQueryError as e:
+                page = {'error': str(e)}
+            await self.send(text_data=json.dumps({'lobby_page': page, 'request_id': data.get('request_id')}))
+
+    async def menu_update(self, event):
         matches = event['matches']
-        self.send(text_data=json.dumps({'matches': matches}))
-
-    def force_update(self, _):
-        self.push_to_group()
-
-    @staticmethod
-    def notify_new_game_was_created():
-        channel_layer = get_channel_layer()
-        async_to_sync(channel_layer.group_send)(
-            MENU_CHANNEL_NAME,
-            {"type": "force_update"},
-        )
-
-    @staticmethod
-    def notify_new_player_joined_game():
-        channel_layer = get_channel_layer()
-        async_to_sync(channel_layer.group_send)(
-            MENU_CHANNEL_NAME,
-            {"type": "force_update"},
-        )
+        await self.send(text_data=json.dumps({'matches': matches}))
@@ -0,0 +1,55 @@
+import json
+
+from asgiref.sync import sync_to_async
+from channels.generic.websocket import AsyncWebsocketConsumer
+from django.core.cache import cache
+
+from ws.game_views import match_group_id
+from ws.spectators import SPECTATOR_CHANNEL_NAME, spectator_snapshot_key
+
+
+class PasurSpectatorInterface(AsyncWebsocketConsumer):
+    """
+    Websocket of a spectator of a match. Spectators only get the public view, from the spectator relay, and never
+    touch the database: the view to start from, and to resync to, is the relay's cached snapshot.
+    """
+
+    # noinspection PyAttributeOutsideInit
+    async def connect(self):
+        self.match_id = self.scope['url_route']['kwargs']['match_id']
+        self.group_id = match_group_id(self.match_id)
+        await self.channel_layer.group_add(
+            self.group_id,
+            self.channel_name,
+        )
+        await self.accept()
+        await self.send_snapshot()
+
+    async def disconnect(self, close_code):
+        await self.channel_layer.group_discard(
+            self.group_id,
+            self.channel_name,
+        )
+
+    # Spectators can only ask for the full view, their actions are ignored
+    # noinspection PyMethodOverriding
+    async def receive(self, text_data):
+        if json.loads(text_data).get('request') == 'resync':
+            await self.send_snapshot()
+
+    async def send_snapshot(self):
+        snapshot = await sync_to_async(cache.get)(spectator_snapshot_key(self.group_id))
+        if snapshot is not None:
+            await self.send(text_data=snapshot)
+            return
+        # Not cached, the relay builds it and sends it to this socket
+        await self.channel_layer.send(SPECTATOR_CHANNEL_NAME, {
+            'type': 'spectator.refresh',
+            'match_id': self.match_id,
+            'group': self.group_id,
+            'reply_channel': self.channel_name,
+        })
+
+    # Receive message from the spectator relay
+    async def game_status(self, event):
+        await self.send(text_data=event['text'])
@@ -3,6 +3,12 @@ from django.conf.urls import url
 
 from ws.pasur_interface import PasurInterface
 from ws.pasur_menu_interface import PasurMenuInterface
+from ws.pasur_spectator_interface import PasurSpectatorInterface
+
+# Without the auth middleware, so that connecting does not load the session from the database
+spectator_urlpatterns = [
+    url(r'^ws/pasur/(?P<match_id>[^/]+)/watch/$', PasurSpectatorInterface, name='pasur_spectator_ws'),
+]
 
 websocket_urlpatterns = [
     url(r'^ws/pasur/(?P<match_id>[^/]+)/$', PasurInterface, name='pasur_game_ws'),
@@ -0,0 +1,88 @@
+"""
+Delivery of the public view of the matches, to spectators and other sockets in the public match group.
+
+Senders hand the public message of each action to the spectator relay, run with `manage.py runworker pasur-spectate`,
+instead of sending it to the public group themselves, so the fan-out to a large audience is not paid on the players'
+path. The relay stores the full public view of the match in the cache, for spectators to start from without touching
+the database, and broadcasts the message, both ELVA_SPECTATOR_DELAY_SECONDS after the action. Only one process may run
+the relay, to keep the messages of a match in order.
+
+A spectator that finds no snapshot in the cache, as for a match without actions since the cache was cleared or the
+snapshot expired, asks the relay for it. The relay builds it once from the database for all the spectators waiting
+for it, so the spectator sockets themselves never touch the database.
+"""
+import asyncio
+from typing import Dict, List, Optional, Tuple
+
+from asgiref.sync import sync_to_async
+from channels.consumer import AsyncConsumer
+from channels.db import database_sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+
+from game_engine import models
+from game_engine.lib.pasur import STATUS
+from ws.game_views import game_status_text
+
+SPECTATOR_CHANNEL_NAME = 'pasur-spectate'
+
+
+def spectator_snapshot_key(group):
+    return 'spectator_snapshot_%s' % group
+
+
+async def send_game_status_messages(channel_layer, messages: List[Tuple[str, dict]]):
+    """Sends the messages of `ws.game_views.game_status_messages`, the public one through the spectator relay"""
+    for group, event in messages:
+        if 'snapshot' in event:
+            await channel_layer.send(SPECTATOR_CHANNEL_NAME, dict(event, type='spectator.update', group=group))
+        else:
+            await channel_layer.group_send(group, event)
+
+
+def build_public_snapshot(match_id) -> Optional[str]:
+    """The full public view of the latest game of the match from the database, None if there is no such game"""
+    if not str(match_id).isdigit():
+        return None
+    game = models.Game.objects.filter(match_id=match_id).order_by('-created').select_related('match').first()
+    if game is None:
+        return None
+    player_points = game.match.count_player_points(game) if game.pasur.status == STATUS.finished else {}
+    return game_status_text(pasur=game.pasur, player_points=player_points, message='', game_id=game.pk,
+                            version=game.action_sequence)
+
+
+class SpectatorRelay(AsyncConsumer):
+    refresh_waiting: Dict[str, List[str]] = {}  # Reply channels by group of the snapshots being built
+
+    async def spectator_refresh(self, event):
+        waiting = SpectatorRelay.refresh_waiting.setdefault(event['group'], [])
+        waiting.append(event['reply_channel'])
+        if len(waiting) == 1:
+            asyncio.ensure_future(self.refresh_snapshot(match_id=event['match_id'], group=event['group']))
+
+    async def refresh_snapshot(self, match_id, group):
+        try:
+            snapshot = await database_sync_to_async(build_public_snapshot)(match_id)
+            if snapshot is not None:
+                if settings.ELVA_SPECTATOR_DELAY_SECONDS:
+                    await asyncio.sleep(settings.ELVA_SPECTATOR_DELAY_SECONDS)
+                key = spectator_snapshot_key(group)
+                # A snapshot stored by an update meanwhile is newer than the one built here
+                if not await sync_to_async(cache.add)(key, snapshot, timeout=settings.ELVA_SPECTATOR_SNAPSHOT_SECONDS):
+                    snapshot = await sync_to_async(cache.get)(key) or snapshot
+        finally:
+            reply_channels = SpectatorRelay.refresh_waiting.pop(group, [])
+        if snapshot is not None:
+            for reply_channel in reply_channels:
+                await self.channel_layer.send(reply_channel, {'type': 'game_status', 'text': snapshot})
+
+    async def spectator_update(self, event):
+        asyncio.ensure_future(self.update_after_delay(event))
+
+    async def update_after_delay(self, event):
+        if settings.ELVA_SPECTATOR_DELAY_SECONDS:
+            await asyncio.sleep(settings.ELVA_SPECTATOR_DELAY_SECONDS)
+        await sync_to_async(cache.set)(spectator_snapshot_key(event['group']), event['snapshot'],
+                                       timeout=settings.ELVA_SPECTATOR_SNAPSHOT_SECONDS)
+        await self.channel_layer.group_send(event['group'], {'type': 'game_status', 'text': event['text']})
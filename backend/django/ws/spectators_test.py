@@ -0,0 +1,48 @@
+import asyncio
+from unittest import mock
+
+from channels.layers import get_channel_layer
+from channels.testing import WebsocketCommunicator
+from django.core.cache.backends.locmem import LocMemCache
+
+from ws import pasur_spectator_interface, spectators
+from ws.game_views import match_group_id
+from ws.pasur_spectator_interface import PasurSpectatorInterface
+from ws.spectators import SPECTATOR_CHANNEL_NAME, SpectatorRelay, spectator_snapshot_key
+
+
+def test_spectator_gets_snapshot_built_by_relay_on_cold_cache(settings):
+    settings.CHANNEL_LAYERS = {'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}}
+    settings.ELVA_SPECTATOR_DELAY_SECONDS = 0
+    cache = LocMemCache('spectators_test', {})
+    build = mock.Mock(return_value='{"game_status": {}}')
+
+    async def connect():
+        communicator = WebsocketCommunicator(PasurSpectatorInterface, '/ws/pasur/5/watch/')
+        communicator.scope['url_route'] = {'kwargs': {'match_id': '5'}}
+        assert (await communicator.connect())[0]
+        return communicator
+
+    async def run():
+        layer = get_channel_layer()
+        relay = SpectatorRelay({'type': 'channel'})
+        relay.channel_layer = layer
+
+        spectators_waiting = [await connect(), await connect()]
+        for _ in spectators_waiting:
+            request = await layer.receive(SPECTATOR_CHANNEL_NAME)
+            assert request['type'] == 'spectator.refresh'
+            await relay.spectator_refresh(request)
+        for communicator in spectators_waiting:
+            assert await communicator.receive_from(timeout=1) == '{"game_status": {}}'
+        assert build.call_count == 1  # Once for all the spectators waiting
+        assert cache.get(spectator_snapshot_key(match_group_id('5'))) == '{"game_status": {}}'
+
+        late = await connect()  # Served from the cache, without asking the relay
+        assert await late.receive_from(timeout=1) == '{"game_status": {}}'
+        for communicator in spectators_waiting + [late]:
+            await communicator.disconnect()
+
+    with mock.patch.object(spectators, 'cache', cache), mock.patch.object(pasur_spectator_interface, 'cache', cache), \
+            mock.patch.object(spectators, 'build_public_snapshot', build):
+        asyncio.run(run())
@@ -40,9 +40,66 @@ elva.cards_json_to_cards = function(cards_json) {
     }
     return cards_json.map(function (card_json) { return elva.card_json_to_card(card_json)});
 };
+// Actions carry the version of the game they were made on, the server rejects them if the game has changed since
+elva.send_action = function (action) {
+    action.game_id = elva.app.game_id;
+    action.version = elva.app.version;
+    elva.webSocketBridge.send(action);
+};
+elva.apply_card_changes = function (cards, changes) {
+    if (changes === undefined) {
+        return cards;
+    }
+    let removed = new Set(changes.remove);
+    return cards.filter(function (card) { return !removed.has(card.id); }).concat(
+        elva.cards_json_to_cards(changes.add));
+};
+elva.apply_game_delta = function (delta) {
+    let app = elva.app;
+    ['game_phase', 'player_in_turn', 'no_player_has_cards_on_hand', 'number_of_cards_in_deck',
+        'number_of_cards_in_pile', 'player_points'].forEach(function (key) {
+        if (key in delta) {
+            app[key] = delta[key];
+        }
+    });
+    app.cards_on_board = elva.apply_card_changes(app.cards_on_board, delta.cards_on_board);
+    app.cards_in_hand = elva.apply_card_changes(app.cards_in_hand, delta.cards_in_hand);
+    if ('last_played_card' in delta) {
+        app.last_played_card = elva.card_json_to_card(delta.last_played_card);
+    }
+    if ('last_collected_cards' in delta) {
+        app.last_collected_cards = elva.cards_json_to_cards(delta.last_collected_cards);
+    }
+    if (delta.opponents !== undefined) {
+        app.opponents = app.opponents.map(function (opponent) {
+            return Object.assign({}, opponent, delta.opponents[opponent.name] || {});
+        });
+    }
+};
+elva.resync_requested = false;
 elva.webSocketBridge.listen(function(action, stream) {
     console.log(action, stream);
-    console.log(action.game_status);
+    let game_delta = action.game_delta;
+    if (game_delta !== undefined) {
+        if (action.game_id === elva.app.game_id && action.version <= elva.app.version) {
+            return;  // Already applied, or included in a full status received since
+        }
+        if (action.game_id !== elva.app.game_id || action.base_version !== elva.app.version) {
+            // Missed an update, the full status sent back replaces the game
+            if (!elva.resync_requested) {
+                elva.resync_requested = true;
+                elva.webSocketBridge.send({'request': 'resync'});
+            }
+            return;
+        }
+        elva.apply_game_delta(game_delta);
+        elva.app.version = action.version;
+    }
+    if (action.stale && !elva.resync_requested) {
+        // The action was made on an outdated game, the full status sent back shows the current one
+        elva.resync_requested = true;
+        elva.webSocketBridge.send({'request': 'resync'});
+    }
     let game_status = action.game_status;
     if (game_status !== undefined) {
         let player = game_status['player'];
@@ -58,9 +115,13 @@ elva.webSocketBridge.listen(function(action, stream) {
         elva.app.last_played_card = elva.card_json_to_card(game_status.last_played_card);
         elva.app.last_collected_cards = elva.cards_json_to_cards(game_status['last_collected_cards']);
         elva.app.player_points = game_status['player_points'];
+        elva.app.game_id = action.game_id;
+        elva.app.version = action.version;
+        elva.resync_requested = false;
+    }
+    if (action['message']) {
+        $('#message').html(action['message']);
     }
-    let message_box = $('#message');
-    message_box.html(action['message']);
     elva.app.first_message_received = true;
     elva.app.update_status();
 });
@@ -92,6 +153,8 @@ elva.app = new Vue({
     el: '#app',
     data: {
         first_message_received: false,
+        game_id: null,
+        version: null,
         ranks: ['A', '2', '3', '4', '5', '6', '7', '8', '9', '10', 'J', 'Q', 'K'],
         suits: [
             '♠',
@@ -130,25 +193,31 @@ elva.app = new Vue({
             }
         },
         deal_cards: function () {
-            elva.webSocketBridge.send({
+            elva.send_action({
                 'message': 'Player requested deal cards',
                 'player_action': elva_config.player_actions.DEAL_CARDS
             });
         },
         count_points: function () {
-            elva.webSocketBridge.send({
+            elva.send_action({
                 'message': 'Player requested count points',
                 'player_action': elva_config.player_actions.COUNT_POINTS
             });
         },
         next_game: function () {
-            elva.webSocketBridge.send({
+            elva.send_action({
                 'message': 'Player requested go to next game',
                 'player_action': elva_config.player_actions.NEXT_GAME
             });
         },
+        add_bot: function () {
+            elva.send_action({
+                'message': 'Player requested a bot opponent',
+                'player_action': elva_config.player_actions.ADD_BOT
+            });
+        },
         play_card: function (card_id) {
-            elva.webSocketBridge.send({
+            elva.send_action({
                 'message': 'Player played a card',
                 'player_action': elva_config.player_actions.PLAY_CARD,
                 'played_card': card_id,
@@ -216,6 +285,9 @@ elva.app = new Vue({
                 this.number_of_cards_in_deck === 0 &&
                 Object.keys(this.player_points).length === 0;
         },
+        add_bot_action_active: function () {
+            return 'pending' === this.game_phase && this.opponents.length < 3;
+        },
         next_game_action_active: function () {
             return ['finished', 'cancelled'].contains(this.game_phase);
         },
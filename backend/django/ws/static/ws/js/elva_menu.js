@@ -17,13 +17,28 @@ elva_menu.webSocketBridge.socket.addEventListener('close', function() {
 
 elva_menu.webSocketBridge.listen(function(data) {
     console.log('Received data from server', data);
+    if (data.matches === undefined) {
+        return;  // A reply to a lobby.query request
+    }
     elva_menu.app.matches = data.matches;
     elva_menu.app.first_message_received = true;
     elva_menu.app.update_status();
 });
 
+elva_menu.time_ago = function (iso_time, now) {
+    const seconds = Math.max(0, Math.round((now - Date.parse(iso_time)) / 1000));
+    const units = [['day', 86400], ['hour', 3600], ['minute', 60], ['second', 1]];
+    for (let i = 0; i < units.length; i++) {
+        const count = Math.floor(seconds / units[i][1]);
+        if (count >= 1) {
+            return count + ' ' + units[i][0] + (count > 1 ? 's' : '') + ' ago';
+        }
+    }
+    return 'now';
+};
+
 Vue.component('match', {
-    'props': ["match", "set_location"],
+    'props': ["match", "set_location", "now"],
     'template':
         '<div class="box pasur-menu-match-card" v-on:click="set_location(match.game_url)">' +
             '<p>{{match.status}} with players ' +
@@ -33,8 +48,11 @@ Vue.component('match', {
                     '<span class="tag is-info">{{ player }}</span>' +
                 '</span>' +
             '</p>' +
-            '<p><small>Last action {{ match.last_action }}</small></p>' +
-        '</div>'
+            '<p><small>Last action {{ time_ago(match.last_activity, now) }}</small></p>' +
+        '</div>',
+    'methods': {
+        time_ago: elva_menu.time_ago,
+    }
 });
 
 elva_menu.app = new Vue({
@@ -42,6 +60,11 @@ elva_menu.app = new Vue({
     data: {
         matches: [],
         first_message_received: false,
+        now: Date.now(),
+    },
+    mounted: function () {
+        const app = this;
+        setInterval(function () { app.now = Date.now(); }, 30000);  // Keeps the "x minutes ago" texts current
     },
     methods: {
         update_status: function () {
@@ -8,4 +8,6 @@ urlpatterns = [
     url(r'pasur/$', views.NewPasurGameView.as_view(), name='new_pasur_match'),
     url(r'create_user/$', views.CreateUserView.as_view(), name='create_user'),
     url(r'create_user/(?P<match_id>[^/]+)/$', views.CreateUserView.as_view(), name='create_user'),
+    url(r'^lobby/$', views.LobbyView.as_view(), name='lobby'),
+    url(r'^metrics/$', views.MetricsView.as_view(), name='metrics'),
 ]
@@ -2,13 +2,15 @@ import random
 
 from django.contrib.auth import login
 from django.contrib.auth.models import User
+from django.http import HttpResponse, JsonResponse
 from django.shortcuts import render, redirect
 from django.views import View
 
+from elva import metrics
 from game_engine import models
 from game_engine.lib.pasur import STATUS
-from ws.pasur_interface import PlayerActions
-from ws.pasur_menu_interface import PasurMenuInterface
+from ws.lobby import LobbyQueryError, parse_lobby_query, query_matches
+from ws.pasur_actions import PlayerActions
 
 
 class PasurGameView(View):
@@ -28,12 +30,13 @@ class PasurGameView(View):
                 player=player,
             )
             if created:
-                PasurMenuInterface.notify_new_player_joined_game()
+                match.refresh_status()
 
         return render(request, 'ws/elva.html', {
             'match_id': match.pk,
             'PlayerActions': PlayerActions,
             'player': player,
+            'is_spectator': not match.game_players.filter(player=player).exists(),
         })
 
 
@@ -41,8 +44,7 @@ class NewPasurGameView(View):
     def get(self, request):
         match = models.Match()
         match.save()
-        models.Game(match=match).save()
-        PasurMenuInterface.notify_new_game_was_created()
+        models.Game(match=match).save()  # Refreshes the match status, which updates the lobby
         return redirect(to='pasur_match', match_id=match.pk)
 
 
@@ -51,10 +53,19 @@ class PasurMenuView(View):
     def get(self, request):
         if request.user.is_anonymous:
             return redirect('create_user')
-        matches = models.Match.objects.prefetch_related('game_players').order_by('-created')[0:10]
-        return render(request, 'ws/elva_menu.html', context={
-            'matches': matches,
-        })
+        return render(request, 'ws/elva_menu.html')  # The matches come from the menu socket
+
+
+class LobbyView(View):
+    """
+    A page of matches as JSON, filtered by `status` (comma separated), `player` and `active_since`. The `next` cursor
+    of a page is passed back as `cursor` for the following page.
+    """
+    def get(self, request):
+        try:
+            return JsonResponse(query_matches(**parse_lobby_query(request.GET)))
+        except LobbyQueryError as e:
+            return JsonResponse({'error': str(e)}, status=400)
 
 
 class CreateUserView(View):
@@ -70,3 +81,8 @@ class CreateUserView(View):
             return redirect('pasur_match', match_id=match_id)
         else:
             return redirect('index')
+
+
+class MetricsView(View):
+    def get(self, request):
+        return HttpResponse(metrics.expose(), content_type='text/plain; version=0.0.4; charset=utf-8')